@@ -0,0 +1,70 @@
+"""
+Read-model benchmark for the workout generation path.
+
+Per request, generation loads the stretching exercises and the split's candidates and reduces them
+to the options shown to the model (WorkoutGeneratorAgent._format_exercise_options). This compares
+loading full Exercise ORM rows with the lean ExerciseOption read models filtered on the compiled
+catalog, per split: time per request and the memory allocated while building the candidate lists
+(peak and retained).
+
+Run from the server directory: python -m benchmarks.bench_read_models
+"""
+import gc
+import timeit
+import tracemalloc
+from typing import Callable, Tuple
+
+from data.database import SessionLocal
+from data.queries import get_split_exercises, get_stretching_exercises
+from llm.agents.workout_generator_agent import WorkoutGeneratorAgent
+from models import WorkoutSplit
+
+REPEAT = 5
+NUMBER = 20
+
+
+def generation_path(split: WorkoutSplit, lean: bool) -> Callable[[], Tuple[list, list, list]]:
+    agent = WorkoutGeneratorAgent(None)
+
+    def run():
+        # A session per request, as get_db does, so nothing is served from the identity map
+        db = SessionLocal()
+        try:
+            stretching = get_stretching_exercises(db, lean)
+            candidates = get_split_exercises(db, split, lean)
+            return stretching, candidates, agent._format_exercise_options(candidates)
+        finally:
+            db.close()
+
+    return run
+
+
+def measure_memory(run: Callable[[], Tuple[list, list, list]]) -> Tuple[int, int]:
+    """Peak memory allocated during a request and memory retained by its result, in bytes."""
+    gc.collect()
+    tracemalloc.start()
+    result = run()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, retained
+
+
+def main() -> None:
+    print(f"{'split':<10} {'rows':>5} {'full ms':>8} {'lean ms':>8} {'speedup':>8} "
+          f"{'full peak KB':>13} {'lean peak KB':>13} {'full kept KB':>13} {'lean kept KB':>13}")
+    for split in WorkoutSplit:
+        full, lean = generation_path(split, lean=False), generation_path(split, lean=True)
+        rows = len(full()[1]) + len(full()[0])
+        assert [ex.id for ex in full()[1]] == [ex.id for ex in lean()[1]]
+
+        full_ms = min(timeit.repeat(full, number=NUMBER, repeat=REPEAT)) / NUMBER * 1000
+        lean_ms = min(timeit.repeat(lean, number=NUMBER, repeat=REPEAT)) / NUMBER * 1000
+        full_peak, full_kept = measure_memory(full)
+        lean_peak, lean_kept = measure_memory(lean)
+        print(f"{split.value:<10} {rows:>5} {full_ms:>8.2f} {lean_ms:>8.2f} {full_ms / lean_ms:>7.1f}x "
+              f"{full_peak / 1024:>13.0f} {lean_peak / 1024:>13.0f} {full_kept / 1024:>13.0f} {lean_kept / 1024:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Serialization micro-benchmark for ApiResponse payloads.
+
+Compares the default FastAPI path (dump the returned model, validate it again against the
+response_model, dump it to JSON-able data and encode it with the stdlib json module) with
+the fast path in responses.py (model_construct + cached TypeAdapter.dump_json).
+
+Run from the server directory: python -m benchmarks.bench_serialization
+"""
+import json
+import timeit
+from typing import Any, Callable, Dict, List
+
+from fastapi.responses import JSONResponse
+
+from models import (
+    ApiResponse,
+    Exercise,
+    FetchWorkoutData,
+    LogExerciseStatus,
+    LoggedExercise,
+    LoggedSet,
+    LogSetStatus,
+    LogWorkoutRequest,
+    WorkoutRoutine,
+    WorkoutSplit,
+    get_response_adapter,
+)
+from responses import api_response
+
+HISTORY_SESSIONS = 200
+REPEAT = 5
+
+
+def build_workout_payload() -> FetchWorkoutData:
+    exercises = [
+        Exercise(
+            id=f"exercise_{i}",
+            name=f"Exercise {i}",
+            target_sets=4,
+            target_reps="8-10",
+            target_weight_lbs=135,
+            rest_period_seconds=90,
+            tip="Keep your core braced and control the eccentric.",
+            focus_groups=["Chest", "Triceps"],
+        )
+        for i in range(5)
+    ]
+    return FetchWorkoutData(workout=WorkoutRoutine(id="PUSH_20250101", date="2025-01-01", ai_insight="Heavy push day.", routine=exercises))
+
+
+def build_history_payload() -> List[LogWorkoutRequest]:
+    start = 1735689600000
+    history = []
+    for session in range(HISTORY_SESSIONS):
+        session_start = start + session * 86400000
+        logged_exercises = [
+            LoggedExercise(
+                exercise_id=f"exercise_{i}",
+                name=f"Exercise {i}",
+                sets=[
+                    LoggedSet(set_number=s + 1, weight_lbs=135.0, reps=10, rpe=8, startTime=session_start + s * 120000,
+                              elapsedTime_ms=40000, status=LogSetStatus.COMPLETED, endTime=session_start + s * 120000 + 40000)
+                    for s in range(4)
+                ],
+                startTime=session_start,
+                elapsedTime_ms=480000,
+                status=LogExerciseStatus.COMPLETED,
+                activeWorkTime_ms=160000,
+            )
+            for i in range(5)
+        ]
+        history.append(LogWorkoutRequest(workoutRoutineId=f"PUSH_{session}", loggedExercises=logged_exercises,
+                                         startTime=session_start, endTime=session_start + 2700000,
+                                         totalDurationSeconds=2700, split=WorkoutSplit.PUSH))
+    return history
+
+
+def build_catalog_payload() -> List[Dict[str, Any]]:
+    with open("data/exercises.json", "r") as f:
+        return json.load(f)
+
+
+def default_path(data_type: type, data: Any) -> bytes:
+    """What FastAPI does with an ApiResponse returned from an endpoint with a response_model."""
+    response = ApiResponse[data_type](success=True, data=data)
+    adapter = get_response_adapter(ApiResponse[data_type])
+    revalidated = adapter.validate_python(response.model_dump())
+    return JSONResponse(content=adapter.dump_python(revalidated, mode="json")).body
+
+
+def fast_path(data_type: type, data: Any) -> bytes:
+    return api_response(data_type, data=data).body
+
+
+def run(name: str, data_type: type, data: Any, number: int) -> None:
+    assert json.loads(default_path(data_type, data)) == json.loads(fast_path(data_type, data))
+    results = {}
+    for label, path in (("default", default_path), ("fast", fast_path)):
+        timings = timeit.repeat(lambda: path(data_type, data), number=number, repeat=REPEAT)
+        results[label] = min(timings) / number * 1e6
+    size_kb = len(fast_path(data_type, data)) / 1024
+    print(f"{name:<10} {size_kb:>9.1f} {results['default']:>13.1f} {results['fast']:>13.1f} {results['default'] / results['fast']:>8.1f}x")
+
+
+def main() -> None:
+    print(f"{'payload':<10} {'size (KB)':>9} {'default (us)':>13} {'fast (us)':>13} {'speedup':>9}")
+    run("workout", FetchWorkoutData, build_workout_payload(), number=2000)
+    run("history", List[LogWorkoutRequest], build_history_payload(), number=20)
+    run("catalog", List[Dict[str, Any]], build_catalog_payload(), number=20)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Telemetry storage benchmark.
+
+Stores a synthetic 1 Hz heart rate recording of SESSIONS one-hour workouts (about a million samples)
+for one user in 15-minute chunks, as the upload endpoint does, in a scratch SQLite database. Reports
+the stored bytes per sample against raw int64/float64 columns and the time to ingest, to read a
+session and a 5-minute window back into NumPy arrays, and to compute the per-set heart rate of a session.
+
+Run from the server directory: python -m benchmarks.bench_telemetry
+"""
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+from data.database import create_database_engine
+from data.schema import TelemetryChunk
+from data.telemetry import save_telemetry_chunk, read_telemetry, analyze_set_heart_rate
+from models import TelemetryMetric
+
+SESSIONS = 300
+SESSION_SECONDS = 3600
+CHUNK_SECONDS = 900
+SET_SECONDS = 45
+REST_SECONDS = 90
+USER_ID = "bench_user"
+RAW_BYTES_PER_SAMPLE = 16
+
+
+def synthetic_session(start_ms: int, rng: np.random.Generator):
+    """Heart rate rising during each set and falling during the rest, with noise, and the matching logged sets."""
+    seconds = np.arange(SESSION_SECONDS)
+    phase = seconds % (SET_SECONDS + REST_SECONDS)
+    working = phase < SET_SECONDS
+    heart_rate = np.where(working, 110 + phase * 1.2, 164 - (phase - SET_SECONDS) * 0.5) + rng.normal(0, 1.5, len(seconds))
+    set_starts = seconds[phase == 0] * 1000 + start_ms
+    sets = [{"set_number": i + 1, "startTime": int(t), "endTime": int(t) + SET_SECONDS * 1000} for i, t in enumerate(set_starts)]
+    return start_ms + seconds * 1000, np.round(heart_rate, 1), [SimpleNamespace(exercise_id="Barbell_Squat", sets=sets)]
+
+
+def main() -> None:
+    rng = np.random.default_rng(7)
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_database_engine(f"sqlite:///{os.path.join(workdir, 'telemetry.db')}")
+        TelemetryChunk.__table__.create(engine)
+        Session = sessionmaker(bind=engine)
+
+        sessions = []
+        ingest_seconds = 0.0
+        with Session() as db:
+            for i in range(SESSIONS):
+                timestamps, values, logged_exercises = synthetic_session(1_700_000_000_000 + i * 86_400_000, rng)
+                sessions.append((f"log_bench_{i}", timestamps, logged_exercises))
+                start = time.perf_counter()
+                for a in range(0, SESSION_SECONDS, CHUNK_SECONDS):
+                    save_telemetry_chunk(db, USER_ID, f"log_bench_{i}", TelemetryMetric.HEART_RATE,
+                                         timestamps[a:a + CHUNK_SECONDS].tolist(), values[a:a + CHUNK_SECONDS].tolist())
+                ingest_seconds += time.perf_counter() - start
+
+            samples = SESSIONS * SESSION_SECONDS
+            stored = db.query(func.sum(func.length(TelemetryChunk.timestamps) + func.length(TelemetryChunk.values))).scalar()
+            print(f"samples            {samples:>12,}")
+            print(f"stored bytes       {stored:>12,}  ({stored / samples:.2f} B/sample, raw {RAW_BYTES_PER_SAMPLE} B/sample, {samples * RAW_BYTES_PER_SAMPLE / stored:.0f}x smaller)")
+            print(f"ingest             {samples / ingest_seconds:>12,.0f} samples/s")
+
+            session_id, timestamps, logged_exercises = sessions[SESSIONS // 2]
+            runs = 20
+            start = time.perf_counter()
+            for _ in range(runs):
+                times, values = read_telemetry(db, USER_ID, session_id, TelemetryMetric.HEART_RATE)
+            print(f"read session       {(time.perf_counter() - start) / runs * 1000:>12.2f} ms  ({len(times)} samples)")
+
+            window_start = int(timestamps[0]) + 20 * 60 * 1000
+            start = time.perf_counter()
+            for _ in range(runs):
+                window = read_telemetry(db, USER_ID, session_id, TelemetryMetric.HEART_RATE, window_start, window_start + 5 * 60 * 1000)
+            print(f"read 5 min window  {(time.perf_counter() - start) / runs * 1000:>12.2f} ms  ({len(window[0])} samples)")
+
+            start = time.perf_counter()
+            for _ in range(runs):
+                stats = analyze_set_heart_rate(times, values, logged_exercises)
+            print(f"per-set analytics  {(time.perf_counter() - start) / runs * 1000:>12.2f} ms  ({len(stats)} sets)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+In-process load test for workout generation, logging and history.
+
+Simulates N concurrent users who each fetch the day's workout through the LLM path
+(GET /api/workout/today?quick=false), finish it (POST /api/workout/log) and browse their history
+(GET /api/workout/history, and now and then the export) against the FastAPI app through an ASGI
+client. Every simulated user sends its own X-User-Id (the app runs with TRUST_USER_ID_HEADER), so
+with --shards the users spread over the shards. The LLM is replaced by a stub that answers
+instantly, and the run uses a fresh SQLite file and journal directory, so results only reflect
+the server and storage path.
+
+Reports throughput, latency percentiles per endpoint, errors (lock errors counted separately),
+the time to drain the write-behind queue and the growth of the database files.
+
+Run from the server directory, e.g.:
+    python -m benchmarks.load_test --users 50 --sessions 10
+    python -m benchmarks.load_test --users 50 --sessions 10 --sync-writes
+    python -m benchmarks.load_test --users 50 --sessions 10 --shards 8
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+LOCK_ERROR_MARKERS = ("database is locked", "database table is locked", "DB_SAVE_ERROR")
+SPLITS = ["PUSH", "PULL", "LEGS", "ABS", "FULL_BODY"]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the workout logging and history endpoints.")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent simulated users")
+    parser.add_argument("--sessions", type=int, default=5, help="Workouts each user finishes")
+    parser.add_argument("--history-reads", type=int, default=2, help="History pages each user reads after every workout")
+    parser.add_argument("--export-every", type=int, default=5, help="Each user exports the full history every N workouts (0 to disable)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds a user waits between requests")
+    parser.add_argument("--sync-writes", action="store_true", help="Disable write-behind and commit logs in the request")
+    parser.add_argument("--shards", type=int, default=0, help="Store user data in this many SQLite shards (0 for the main database)")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def configure_environment(args: argparse.Namespace, workdir: str) -> None:
+    """Point the app at a scratch database before it is imported."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'load_test.db')}"
+    os.environ["WRITE_BEHIND_JOURNAL_DIR"] = os.path.join(workdir, "journal")
+    os.environ["WRITE_BEHIND_ENABLED"] = "False" if args.sync_writes else "True"
+    os.environ["SHARD_COUNT"] = str(args.shards)
+    os.environ["SHARD_DIR"] = os.path.join(workdir, "shards")
+    # Each simulated user names itself in X-User-Id
+    os.environ["TRUST_USER_ID_HEADER"] = "True"
+    os.environ.setdefault("GEMINI_API_KEY", "load-test")
+
+
+def build_stub_llm_client(rng: random.Random, exercise_ids: List[str]):
+    from llm.base import LLMClient
+
+    class StubLLMClient(LLMClient):
+        """Returns a routine of random catalog exercises instantly, so only the server and storage path is measured."""
+
+        async def generate_content(self, prompt: str, system_prompt: str = None, **kwargs) -> str:
+            return ""
+
+        async def generate_structured_content(self, prompt: str, system_prompt: str = None, **kwargs) -> str:
+            # A non-empty routine, an empty one would send the request to the local generator fallback
+            routine = [{"id": exercise_id, "name": exercise_id.replace("_", " "), "target_sets": 3,
+                        "target_reps": "8-10", "target_weight_lbs": 95, "rest_period_seconds": 90}
+                       for exercise_id in rng.sample(exercise_ids, 5)]
+            return json.dumps({"id": "", "date": "", "ai_insight": "Load test workout.", "routine": routine})
+
+        def get_config(self) -> Dict[str, str]:
+            return {"model": "stub"}
+
+    return StubLLMClient()
+
+
+def make_log_request(rng: random.Random, exercise_ids: List[str], user: int, session: int, start_ms: int, split: str) -> dict:
+    """A realistic LogWorkoutRequest body: 4-5 exercises of 3-5 sets with rest between them."""
+    logged_exercises = []
+    clock = start_ms
+    for exercise_id in rng.sample(exercise_ids, rng.randint(4, 5)):
+        exercise_start = clock
+        weight = rng.choice(range(45, 230, 5))
+        sets = []
+        for set_number in range(1, rng.randint(3, 5) + 1):
+            work_ms = rng.randint(25000, 60000)
+            sets.append({
+                "set_number": set_number,
+                "weight_lbs": weight,
+                "reps": rng.randint(6, 12),
+                "rpe": rng.choice([7, 8, 9, None]),
+                "startTime": clock,
+                "endTime": clock + work_ms,
+                "elapsedTime_ms": work_ms,
+                "status": "completed",
+            })
+            clock += work_ms + rng.randint(60000, 120000)
+        logged_exercises.append({
+            "exercise_id": exercise_id,
+            "name": exercise_id.replace("_", " "),
+            "sets": sets,
+            "startTime": exercise_start,
+            "elapsedTime_ms": clock - exercise_start,
+            "status": "completed",
+            "activeWorkTime_ms": sum(s["elapsedTime_ms"] for s in sets),
+        })
+    return {
+        "workoutRoutineId": f"LOADTEST_u{user}_s{session}",
+        "loggedExercises": logged_exercises,
+        "startTime": start_ms,
+        "endTime": clock,
+        "totalDurationSeconds": (clock - start_ms) / 1000,
+        "notes": None,
+        "split": split,
+    }
+
+
+def database_size(workdir: str) -> int:
+    """Size of the main database and the shards, with their WAL files."""
+    paths = glob.glob(os.path.join(workdir, "*.db*")) + glob.glob(os.path.join(workdir, "shards", "*.db*"))
+    return sum(os.path.getsize(path) for path in paths if not path.endswith(".lock"))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+async def run(args: argparse.Namespace, workdir: str) -> None:
+    import httpx
+    import main
+    from data.compiled_catalog import get_compiled_catalog
+    from llm.service import LLMService, get_llm_service
+
+    rng = random.Random(args.seed)
+    exercise_ids = [ex.id for ex in get_compiled_catalog() if ex.category == "strength"]
+
+    llm_service = LLMService()
+    llm_service.set_llm_client(build_stub_llm_client(rng, exercise_ids))
+    main.app.dependency_overrides[get_llm_service] = lambda: llm_service
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    lock_errors = 0
+
+    async def call(client: "httpx.AsyncClient", name: str, method: str, url: str, **kwargs) -> None:
+        nonlocal lock_errors
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            body = response.content
+        except Exception as e:
+            latencies[name].append(time.perf_counter() - started)
+            errors[name] += 1
+            lock_errors += any(marker in str(e) for marker in LOCK_ERROR_MARKERS)
+            return
+        latencies[name].append(time.perf_counter() - started)
+        failed = response.status_code >= 400
+        if not failed and response.headers.get("content-type", "").startswith("application/json"):
+            failed = not json.loads(body).get("success", False)
+        if failed:
+            errors[name] += 1
+            text = body.decode(errors="replace")
+            lock_errors += any(marker in text for marker in LOCK_ERROR_MARKERS)
+
+    async def simulate_user(client: "httpx.AsyncClient", user: int) -> None:
+        start_ms = 1735689600000 + user * 1000
+        headers = {"X-User-Id": f"load_test_user_{user}"}
+        for session in range(args.sessions):
+            split = rng.choice(SPLITS)
+            await call(client, "GET /api/workout/today", "GET", f"/api/workout/today?split={split}&quick=false", headers=headers)
+            await asyncio.sleep(args.think_time)
+            payload = make_log_request(rng, exercise_ids, user, session, start_ms + session * 86400000, split)
+            await call(client, "POST /api/workout/log", "POST", "/api/workout/log", json=payload, headers=headers)
+            for page in range(args.history_reads):
+                await asyncio.sleep(args.think_time)
+                await call(client, "GET /api/workout/history", "GET", f"/api/workout/history?limit=20&offset={page * 20}", headers=headers)
+            if args.export_every and (session + 1) % args.export_every == 0:
+                await call(client, "GET /api/workout/history/export", "GET", "/api/workout/history/export", headers=headers)
+            await asyncio.sleep(args.think_time)
+
+    async with main.app.router.lifespan_context(main.app):
+        size_before = database_size(workdir)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+            started = time.perf_counter()
+            await asyncio.gather(*[simulate_user(client, user) for user in range(args.users)])
+            elapsed = time.perf_counter() - started
+
+        drain_started = time.perf_counter()
+        if main.write_behind:
+            while main.write_behind.pending:
+                await asyncio.sleep(0.01)
+        drain_time = time.perf_counter() - drain_started
+        size_after = database_size(workdir)
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"\n{args.users} users x {args.sessions} workouts, write-behind {'off' if args.sync_writes else 'on'}, "
+          f"{args.shards or 'no'} shards")
+    print(f"{total} requests in {elapsed:.2f}s: {total / elapsed:.1f} req/s, {args.users * args.sessions / elapsed:.1f} workouts/s\n")
+    print(f"{'endpoint':<34} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, values in latencies.items():
+        print(f"{name:<34} {len(values):>6} {errors[name]:>6} "
+              f"{percentile(values, 0.5) * 1000:>8.1f} {percentile(values, 0.95) * 1000:>8.1f} "
+              f"{percentile(values, 0.99) * 1000:>8.1f} {max(values) * 1000:>8.1f}")
+    print(f"\nlock errors: {lock_errors}")
+    print(f"write-behind drain after load: {drain_time * 1000:.0f} ms")
+    print(f"database files: {size_before / 1024:.0f} KB -> {size_after / 1024:.0f} KB (+{(size_after - size_before) / 1024:.0f} KB)")
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="workout-pal-load-") as workdir:
+        configure_environment(args, workdir)
+        asyncio.run(run(args, workdir))
+
+
+if __name__ == "__main__":
+    main()
@@ -17,11 +17,24 @@ class ServerConfig(BaseModel):
     port: int = Field(default=8000, description="Server port")
     debug: bool = Field(default=True, description="Debug mode")
     cors_origins: list[str] = Field(default=[], description="Allowed CORS origins")
+    quick_workouts: bool = Field(default=False, description="Generate workouts with the local generator instead of the LLM by default")
+    admin_token: Optional[str] = Field(default=None, description="Token required in the X-Admin-Token header of admin endpoints, which are disabled without it")
+    trust_user_id_header: bool = Field(default=False, description="Take the requesting user from the X-User-Id header, only behind a gateway that authenticates users or for load tests")
 
 class DataConfig(BaseModel):
     """Data source configuration settings."""
     source_file: str = Field(default="data/exercises.json", description="Path to the data source file")
     vector_store_path: str = Field(default="data/vector_store", description="Path to store the vector database")
+    database_url: str = Field(default="sqlite:///exercises.db", description="SQLAlchemy database URL")
+    auto_migrate: bool = Field(default=True, description="Apply pending migrations on startup instead of only checking the schema version")
+    write_behind_enabled: bool = Field(default=True, description="Journal workout logs and commit them in the background")
+    journal_dir: str = Field(default="data/journal", description="Directory for the workout log write-behind journal")
+    sql_profiling: bool = Field(default=False, description="Profile SQL queries per request and report them in the X-Query-Profile header")
+    slow_query_ms: float = Field(default=100.0, description="Statements slower than this are written to the slow-query log")
+    slow_query_log: str = Field(default="data/slow_queries.log", description="Path of the slow-query log")
+    shard_count: int = Field(default=0, description="Number of SQLite shards for per-user data, 0 keeps it in the main database")
+    shard_dir: str = Field(default="data/shards", description="Directory of the per-user SQLite shards")
+    n_plus_one_threshold: int = Field(default=5, description="Times an identical statement may run in one request before it is flagged as N+1")
 
 class Config(BaseModel):
     """Main configuration class that combines all config sections."""
@@ -59,13 +72,26 @@ class ConfigManager:
             host=os.getenv("SERVER_HOST", "0.0.0.0"),
             port=int(os.getenv("SERVER_PORT", "8000")),
             debug=os.getenv("DEBUG", "True").lower() == "true",
-            cors_origins=os.getenv("CORS_ORIGINS", "").split(",") if os.getenv("CORS_ORIGINS") else []
+            cors_origins=os.getenv("CORS_ORIGINS", "").split(",") if os.getenv("CORS_ORIGINS") else [],
+            quick_workouts=os.getenv("QUICK_WORKOUTS", "False").lower() == "true",
+            admin_token=os.getenv("ADMIN_TOKEN") or None,
+            trust_user_id_header=os.getenv("TRUST_USER_ID_HEADER", "False").lower() == "true"
         )
 
         # Load data config
         data_config = DataConfig(
             source_file=os.getenv("DATA_SOURCE_FILE", "src/scraper/data.json"),
-            vector_store_path=os.getenv("VECTOR_STORE_PATH", "src/data/vector_store")
+            vector_store_path=os.getenv("VECTOR_STORE_PATH", "src/data/vector_store"),
+            database_url=os.getenv("DATABASE_URL", "sqlite:///exercises.db"),
+            auto_migrate=os.getenv("AUTO_MIGRATE", "True").lower() == "true",
+            write_behind_enabled=os.getenv("WRITE_BEHIND_ENABLED", "True").lower() == "true",
+            journal_dir=os.getenv("WRITE_BEHIND_JOURNAL_DIR", "data/journal"),
+            sql_profiling=os.getenv("SQL_PROFILING", "False").lower() == "true",
+            slow_query_ms=float(os.getenv("SLOW_QUERY_MS", "100")),
+            slow_query_log=os.getenv("SLOW_QUERY_LOG", "data/slow_queries.log"),
+            n_plus_one_threshold=int(os.getenv("N_PLUS_ONE_THRESHOLD", "5")),
+            shard_count=int(os.getenv("SHARD_COUNT", "0")),
+            shard_dir=os.getenv("SHARD_DIR", "data/shards")
         )
 
         self._config = Config(
@@ -0,0 +1,142 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from data.schema import Exercise, CatalogVersion
+from data.compiled_catalog import CompiledCatalog, CompiledExercise, get_compiled_catalog
+from models import CatalogExercise, ExerciseCatalogData, ExerciseCatalogDeltaData
+from responses import api_response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, clients then get the gzip snapshot
+    brotli = None
+
+
+def catalog_manifest(exercises: List[CatalogExercise]) -> Tuple[str, Dict[str, str]]:
+    """
+    Returns the catalog version and its manifest. The manifest holds per-exercise content hashes,
+    stored with the version so later versions can compute deltas.
+    """
+    manifest = {ex.id: hashlib.sha1(ex.model_dump_json().encode()).hexdigest()[:12] for ex in exercises}
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:16], manifest
+
+
+class CatalogSnapshot:
+    """
+    The full exercise catalog serialized once as an ApiResponse[ExerciseCatalogData] body,
+    pre-compressed with gzip (and brotli when available) and identified by a content hash.
+    """
+
+    def __init__(self, exercises: List[CatalogExercise]):
+        self.exercises = exercises
+        self.version, self.manifest = catalog_manifest(exercises)
+        # Weak ETag: the gzip and brotli representations are byte-wise different but semantically equal
+        self.etag = f'W/"{self.version}"'
+        self.body = api_response(ExerciseCatalogData, data=ExerciseCatalogData(version=self.version, exercises=exercises)).body
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.brotli_body = brotli.compress(self.body, quality=11) if brotli is not None else None
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header value refers to this snapshot."""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == f'"{self.version}"' for tag in tags)
+
+    def encoded(self, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """Returns the smallest pre-compressed body the client accepts and its Content-Encoding."""
+        accepted = set()
+        for part in (accept_encoding or "").split(","):
+            coding, *params = part.split(";")
+            quality = 1.0
+            for param in params:
+                key, _, value = param.strip().partition("=")
+                if key == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            if coding.strip() and quality > 0:
+                accepted.add(coding.strip().lower())
+        if self.brotli_body is not None and "br" in accepted:
+            return self.brotli_body, "br"
+        if "gzip" in accepted:
+            return self.gzip_body, "gzip"
+        return self.body, None
+
+
+def to_catalog_exercise(exercise: Union[Exercise, CompiledExercise]) -> CatalogExercise:
+    """Converts an Exercise row or compiled catalog entry into the shape of an entry in exercises.json."""
+    return CatalogExercise(
+        id=exercise.id,
+        name=exercise.name,
+        force=exercise.force,
+        level=exercise.level,
+        mechanic=exercise.mechanic,
+        equipment=exercise.equipment,
+        primaryMuscles=exercise.primary_muscles or [],
+        secondaryMuscles=exercise.secondary_muscles or [],
+        instructions=exercise.instructions or [],
+        category=exercise.category,
+        images=exercise.images or []
+    )
+
+
+def build_catalog_snapshot() -> CatalogSnapshot:
+    """Builds the catalog snapshot from the memory-mapped compiled catalog."""
+    return CatalogSnapshot([to_catalog_exercise(ex) for ex in get_compiled_catalog()])
+
+
+def record_catalog_version(db: Session, catalog: CompiledCatalog) -> str:
+    """
+    Records the version of a compiled catalog with its manifest, so clients holding an older version
+    can later ask for a delta. Run by migrate() whenever the catalog changes, workers only read it.
+    Returns the version. Raises SQLAlchemyError.
+    """
+    version, manifest = catalog_manifest([to_catalog_exercise(ex) for ex in catalog])
+    if db.get(CatalogVersion, version) is None:
+        db.add(CatalogVersion(version=version, created_at=int(time.time() * 1000), manifest=manifest))
+        db.commit()
+    return version
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+def get_catalog_snapshot() -> CatalogSnapshot:
+    """Returns the process-wide catalog snapshot, building it on first use (once, even under concurrent requests)."""
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = build_catalog_snapshot()
+    return _snapshot
+
+
+def get_catalog_delta(db: Session, snapshot: CatalogSnapshot, since: str) -> ExerciseCatalogDeltaData:
+    """
+    Returns the exercises added or changed and the ids removed since catalog version `since`.
+    Unknown versions get the whole catalog with full=True.
+    """
+    if since == snapshot.version:
+        return ExerciseCatalogDeltaData(fromVersion=since, version=snapshot.version, full=False, updated=[], removed=[])
+
+    previous = None
+    try:
+        previous = db.get(CatalogVersion, since)
+    except SQLAlchemyError as e:
+        print(f"Error fetching catalog version: {e}")
+    if previous is None:
+        return ExerciseCatalogDeltaData(fromVersion=since, version=snapshot.version, full=True, updated=snapshot.exercises, removed=[])
+
+    old_manifest: Dict[str, str] = previous.manifest or {}
+    updated = [ex for ex in snapshot.exercises if old_manifest.get(ex.id) != snapshot.manifest[ex.id]]
+    removed = sorted(set(old_manifest) - set(snapshot.manifest))
+    return ExerciseCatalogDeltaData(fromVersion=since, version=snapshot.version, full=False, updated=updated, removed=removed)
@@ -0,0 +1,341 @@
+"""
+Compact binary snapshot of exercises.json which worker processes memory-map read-only.
+
+Every process maps the same file, so the catalog is held once in the page cache no matter how
+many workers run, and opening it only reads the header and the small enum tables.
+
+Layout (little-endian):
+    header        magic, sha256 of the source json, section counts and offsets
+    strings       (n_strings + 1) u32 offsets into a utf-8 blob, every distinct string stored once
+    lists         (n_lists + 1) u32 offsets into an array of u32 string ids
+    records       one fixed-size record per exercise, sorted by exercise id
+
+Force, Level, Mechanic and Category are stored as u8 codes and muscles as u32 bitmasks for filtering
+(the muscle lists are also kept, to preserve their order). The code
+tables are stored as lists in the file: they start with the members of the schema enums in
+definition order, followed by any other values found in the source, e.g. "olympic weightlifting".
+
+Build it with: python -m data.compiled_catalog
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from enum import Enum
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+
+from data.schema import Force, Level, Mechanic, Category, PrimaryMuscle
+
+CATALOG_JSON_PATH = "data/exercises.json"
+COMPILED_CATALOG_PATH = "data/exercises.catalog"
+
+MAGIC = b"WPCAT\x00\x00\x01"
+# magic, source sha256, n_records, n_strings, n_lists, 5 enum table list ids, 5 section offsets
+HEADER = struct.Struct("<8s32s13I")
+# id, name, equipment, force, level, mechanic, category, primary mask, secondary mask,
+# primary muscles, secondary muscles, instructions, images
+RECORD = struct.Struct("<3I4B6I")
+U32 = struct.Struct("<I")
+NONE_STRING = 0xFFFFFFFF
+NONE_CODE = 0xFF
+
+ENUM_FIELDS: List[Tuple[str, str, Type[Enum]]] = [
+    ("force", "force", Force),
+    ("level", "level", Level),
+    ("mechanic", "mechanic", Mechanic),
+    ("category", "category", Category),
+]
+
+
+def _code_table(enum: Type[Enum], values: List[Optional[str]]) -> List[str]:
+    """Enum values in definition order followed by any other values present in the source."""
+    table = [member.value for member in enum]
+    table += sorted({value for value in values if value is not None and value not in table})
+    return table
+
+
+def compile_catalog(json_path: str = CATALOG_JSON_PATH, out_path: str = COMPILED_CATALOG_PATH) -> int:
+    """
+    Compiles exercises.json into the binary snapshot format. The file is written next to the
+    destination and renamed over it, so processes mapping the old file keep a consistent view.
+    Returns the number of exercises written.
+    """
+    with open(json_path, "rb") as f:
+        raw = f.read()
+    data = sorted(json.loads(raw), key=lambda item: item["id"])
+
+    strings: Dict[str, int] = {}
+    def intern(value: Optional[str]) -> int:
+        if value is None:
+            return NONE_STRING
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    lists: List[List[int]] = []
+    def add_list(values: List[str]) -> int:
+        lists.append([intern(value) for value in values])
+        return len(lists) - 1
+
+    code_tables = {field: _code_table(enum, [item.get(key) for item in data]) for field, key, enum in ENUM_FIELDS}
+    muscle_table = _code_table(PrimaryMuscle, [m for item in data for m in item.get("primaryMuscles", []) + item.get("secondaryMuscles", [])])
+    if len(muscle_table) > 32:
+        raise ValueError(f"Too many distinct muscles for a u32 bitmask: {len(muscle_table)}")
+    enum_list_ids = [add_list(code_tables[field]) for field, _, _ in ENUM_FIELDS] + [add_list(muscle_table)]
+
+    def code(field: str, value: Optional[str]) -> int:
+        return NONE_CODE if value is None else code_tables[field].index(value)
+
+    def mask(muscles: List[str]) -> int:
+        result = 0
+        for muscle in muscles:
+            result |= 1 << muscle_table.index(muscle)
+        return result
+
+    records = bytearray()
+    for item in data:
+        records += RECORD.pack(
+            intern(item["id"]),
+            intern(item["name"]),
+            intern(item.get("equipment")),
+            code("force", item.get("force")),
+            code("level", item.get("level")),
+            code("mechanic", item.get("mechanic")),
+            code("category", item.get("category")),
+            mask(item.get("primaryMuscles", [])),
+            mask(item.get("secondaryMuscles", [])),
+            add_list(item.get("primaryMuscles", [])),
+            add_list(item.get("secondaryMuscles", [])),
+            add_list(item.get("instructions", [])),
+            add_list(item.get("images", [])),
+        )
+
+    string_offsets = bytearray()
+    blob = bytearray()
+    for value in strings:  # dicts keep insertion order, which matches the interned ids
+        string_offsets += U32.pack(len(blob))
+        blob += value.encode("utf-8")
+    string_offsets += U32.pack(len(blob))
+
+    list_offsets = bytearray()
+    list_items = bytearray()
+    count = 0
+    for values in lists:
+        list_offsets += U32.pack(count)
+        list_items += struct.pack(f"<{len(values)}I", *values)
+        count += len(values)
+    list_offsets += U32.pack(count)
+
+    sections = [string_offsets, blob, list_offsets, list_items, records]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        position += -position % 4  # keep u32 arrays aligned
+        offsets.append(position)
+        position += len(section)
+
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, hashlib.sha256(raw).digest(), len(data), len(strings), len(lists), *enum_list_ids, *offsets))
+        for offset, section in zip(offsets, sections):
+            f.write(b"\x00" * (offset - f.tell()))
+            f.write(section)
+    os.replace(tmp_path, out_path)
+    return len(data)
+
+
+def source_hash(json_path: str = CATALOG_JSON_PATH) -> bytes:
+    """sha256 of the source json, compared with the header to detect a stale snapshot."""
+    with open(json_path, "rb") as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+class CompiledExercise:
+    """
+    Read-only view of one exercise in a compiled catalog. Attributes mirror the Exercise table
+    and are decoded from the mapped file on access.
+    """
+    __slots__ = ("_catalog", "_record")
+
+    def __init__(self, catalog: "CompiledCatalog", record: tuple):
+        self._catalog = catalog
+        self._record = record
+
+    @property
+    def id(self) -> str:
+        return self._catalog._string(self._record[0])
+
+    @property
+    def name(self) -> str:
+        return self._catalog._string(self._record[1])
+
+    @property
+    def equipment(self) -> Optional[str]:
+        return self._catalog._string(self._record[2])
+
+    @property
+    def force(self) -> Optional[str]:
+        return self._catalog._decode("force", self._record[3])
+
+    @property
+    def level(self) -> Optional[str]:
+        return self._catalog._decode("level", self._record[4])
+
+    @property
+    def mechanic(self) -> Optional[str]:
+        return self._catalog._decode("mechanic", self._record[5])
+
+    @property
+    def category(self) -> Optional[str]:
+        return self._catalog._decode("category", self._record[6])
+
+    @property
+    def primary_muscles(self) -> List[str]:
+        return self._catalog._list(self._record[9])
+
+    @property
+    def secondary_muscles(self) -> List[str]:
+        return self._catalog._list(self._record[10])
+
+    @property
+    def instructions(self) -> List[str]:
+        return self._catalog._list(self._record[11])
+
+    @property
+    def images(self) -> List[str]:
+        return self._catalog._list(self._record[12])
+
+    def __str__(self):
+        return f"{self.name} {self.primary_muscles} {self.secondary_muscles} {self.equipment} {self.force} {self.mechanic} {self.level} {self.category}"
+
+
+class CompiledCatalog:
+    """Memory-mapped, read-only view of a compiled catalog file."""
+
+    def __init__(self, path: str = COMPILED_CATALOG_PATH):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        header = HEADER.unpack_from(self._view, 0)
+        if header[0] != MAGIC:
+            raise ValueError(f"{path} is not a compiled exercise catalog")
+        self.source_hash: bytes = header[1]
+        self._n_records, self._n_strings, self._n_lists = header[2:5]
+        enum_list_ids = header[5:10]
+        self._string_offsets, self._blob, self._list_offsets, self._list_items, self._records = header[10:15]
+
+        # The code tables are tiny and fixed-size, everything else is decoded lazily from the mapping
+        self._code_tables: Dict[str, List[str]] = {
+            field: self._list(list_id) for (field, _, _), list_id in zip(ENUM_FIELDS, enum_list_ids)
+        }
+        self._muscle_table: List[str] = self._list(enum_list_ids[4])
+
+    def __len__(self) -> int:
+        return self._n_records
+
+    def __getitem__(self, index: int) -> CompiledExercise:
+        if not 0 <= index < self._n_records:
+            raise IndexError(index)
+        return CompiledExercise(self, RECORD.unpack_from(self._view, self._records + index * RECORD.size))
+
+    def __iter__(self) -> Iterator[CompiledExercise]:
+        for record in RECORD.iter_unpack(self._view[self._records:self._records + self._n_records * RECORD.size]):
+            yield CompiledExercise(self, record)
+
+    def close(self) -> None:
+        self._view.release()
+        self._mmap.close()
+
+    def _string(self, string_id: int) -> Optional[str]:
+        if string_id == NONE_STRING:
+            return None
+        start, end = struct.unpack_from("<2I", self._view, self._string_offsets + string_id * 4)
+        return str(self._view[self._blob + start:self._blob + end], "utf-8")
+
+    def _list(self, list_id: int) -> List[str]:
+        start, end = struct.unpack_from("<2I", self._view, self._list_offsets + list_id * 4)
+        string_ids = struct.unpack_from(f"<{end - start}I", self._view, self._list_items + start * 4)
+        return [self._string(string_id) for string_id in string_ids]
+
+    def _decode(self, field: str, code: int) -> Optional[str]:
+        return None if code == NONE_CODE else self._code_tables[field][code]
+
+    def _record_id(self, index: int) -> str:
+        return self._string(U32.unpack_from(self._view, self._records + index * RECORD.size)[0])
+
+    def get(self, exercise_id: str) -> Optional[CompiledExercise]:
+        """Looks up an exercise by id with a binary search over the sorted records."""
+        lo, hi = 0, self._n_records
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record_id(mid) < exercise_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n_records and self._record_id(lo) == exercise_id:
+            return self[lo]
+        return None
+
+    def search(self, filter: Any) -> List[CompiledExercise]:
+        """
+        Same semantics as data.queries.search_exercises, evaluated on the integer codes
+        without decoding any strings. `filter` is an ExerciseFilter.
+        """
+        wanted = []
+        for position, (field, _, _) in enumerate(ENUM_FIELDS, start=3):
+            value = getattr(filter, field)
+            if value is not None:
+                if value.value not in self._code_tables[field]:
+                    return []
+                wanted.append((position, self._code_tables[field].index(value.value)))
+        muscle_bit = 0
+        if filter.primary_muscle is not None:
+            if filter.primary_muscle.value not in self._muscle_table:
+                return []
+            muscle_bit = 1 << self._muscle_table.index(filter.primary_muscle.value)
+
+        results = []
+        for record in RECORD.iter_unpack(self._view[self._records:self._records + self._n_records * RECORD.size]):
+            if muscle_bit and not record[7] & muscle_bit:
+                continue
+            if all(record[position] == code for position, code in wanted):
+                results.append(CompiledExercise(self, record))
+        return results
+
+
+_catalog: Optional[CompiledCatalog] = None
+
+def get_compiled_catalog() -> CompiledCatalog:
+    """
+    Returns the process-wide mapping of the compiled catalog, compiling it first if the file does not exist.
+    Staleness against exercises.json is checked by the build step, not on every open.
+    """
+    global _catalog
+    if _catalog is None:
+        if not os.path.exists(COMPILED_CATALOG_PATH):
+            compile_catalog()
+        _catalog = CompiledCatalog(COMPILED_CATALOG_PATH)
+    return _catalog
+
+
+def compiled_catalog_is_current(json_path: str = CATALOG_JSON_PATH, out_path: str = COMPILED_CATALOG_PATH) -> bool:
+    """Whether the snapshot exists and was built from the current exercises.json."""
+    if not os.path.exists(out_path):
+        return False
+    with open(out_path, "rb") as f:
+        header = f.read(HEADER.size)
+    return len(header) == HEADER.size and HEADER.unpack(header)[:2] == (MAGIC, source_hash(json_path))
+
+
+def ensure_compiled_catalog(json_path: str = CATALOG_JSON_PATH, out_path: str = COMPILED_CATALOG_PATH) -> bool:
+    """Recompiles the snapshot if it is missing or was built from a different exercises.json. Returns True if rebuilt."""
+    if compiled_catalog_is_current(json_path, out_path):
+        return False
+    compile_catalog(json_path, out_path)
+    return True
+
+
+if __name__ == "__main__":
+    count = compile_catalog()
+    print(f"✅ Compiled {count} exercises into {COMPILED_CATALOG_PATH}.")
@@ -1,30 +1,163 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+"""
+Database engines and sessions.
+
+The main database (DATABASE_URL) holds the exercise catalog. With SHARD_COUNT > 0, the per-user
+tables (workout logs, logged exercises, generated workouts, history digests, telemetry) are
+stored in SHARD_COUNT SQLite shards in SHARD_DIR instead, and each user is mapped to one of them by
+a stable hash of the user id. Every shard has its own engine and connection pool, so users in different
+shards no longer wait for the same SQLite write lock. With SHARD_COUNT = 0 the main database holds
+everything, as before.
+
+Sessions come from StorageRouter.session_for(user_id): they are bound to the user's shard and route
+the catalog tables to the main database, so the queries in data/queries.py work unchanged.
+"""
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple, TypeVar
+
+from fastapi import Depends, Header
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from config.config import ConfigManager
 from data.schema import Base
-from data.loader import load_exercises_from_json
+from data.migrations import SHARD_TABLES, migrate, needs_migration, check_schema_version
+from data.query_profiler import QueryProfiler
+
+T = TypeVar("T")
+
+data_config = ConfigManager().get_data_config()
+server_config = ConfigManager().get_server_config()
+DATABASE_URL = data_config.database_url
+
+# Until authentication exists, every request belongs to this user
+DEFAULT_USER_ID = "default_user"
+
+# Per-request query statistics and the slow-query log, see data/query_profiler.py
+query_profiler = None
+if data_config.sql_profiling:
+    query_profiler = QueryProfiler(
+        slow_query_ms=data_config.slow_query_ms,
+        slow_query_log=data_config.slow_query_log,
+        n_plus_one_threshold=data_config.n_plus_one_threshold
+    )
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the writer and busy_timeout waits for the write lock instead of failing."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def create_database_engine(url: str) -> Engine:
+    """Engine with its own connection pool, the SQLite pragmas and the query profiler."""
+    database_engine = create_engine(url, connect_args={"check_same_thread": False})
+    if database_engine.url.get_backend_name() == "sqlite":
+        event.listen(database_engine, "connect", _set_sqlite_pragmas)
+    if query_profiler:
+        query_profiler.install(database_engine)
+    return database_engine
+
 
-DATABASE_URL = "sqlite:///exercises.db"
+class StorageRouter:
+    """Maps users to the database holding their data and hands out sessions for them."""
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+    def __init__(self, catalog_url: str, shard_count: int = 0, shard_dir: str = "data/shards"):
+        self.catalog_engine = create_database_engine(catalog_url)
+        self.shard_count = shard_count
+        self.shard_dir = shard_dir
+        self.catalog_session = sessionmaker(autocommit=False, autoflush=False, bind=self.catalog_engine)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        if shard_count:
+            os.makedirs(shard_dir, exist_ok=True)
+            self.shard_engines = [
+                create_database_engine(f"sqlite:///{os.path.join(shard_dir, f'shard_{shard:03d}.db')}")
+                for shard in range(shard_count)
+            ]
+            catalog_binds = {
+                table: self.catalog_engine for name, table in Base.metadata.tables.items() if name not in SHARD_TABLES
+            }
+            self._session_factories = [
+                sessionmaker(autocommit=False, autoflush=False, bind=shard_engine, binds=catalog_binds)
+                for shard_engine in self.shard_engines
+            ]
+        else:
+            self.shard_engines = [self.catalog_engine]
+            self._session_factories = [self.catalog_session]
+
+    def shard_for(self, user_id: str) -> int:
+        """Stable shard index of a user, the same in every process."""
+        return zlib.crc32(user_id.encode()) % len(self.shard_engines)
+
+    def session_for(self, user_id: str) -> Session:
+        """A session for the user's data; catalog tables are routed to the main database."""
+        return self._session_factories[self.shard_for(user_id)]()
+
+    def session_factory(self, user_id: str) -> Callable[[], Session]:
+        """Zero-argument session factory for one user, for code running outside the request."""
+        return self._session_factories[self.shard_for(user_id)]
+
+    def databases(self) -> Iterator[Tuple[str, Engine, bool]]:
+        """(name, engine, is_shard) of every database, the main database first."""
+        yield "main database", self.catalog_engine, False
+        if self.shard_count:
+            for shard, shard_engine in enumerate(self.shard_engines):
+                yield f"shard {shard}", shard_engine, True
+
+    def query_all_shards(self, query: Callable[[Session], List[T]]) -> List[T]:
+        """
+        Cross-shard admin query: runs query(session) on every shard in parallel and concatenates
+        the results in shard order. Results are per shard, aggregate or sort them afterwards.
+        """
+        def run(factory: Callable[[], Session]) -> List[T]:
+            db = factory()
+            try:
+                return query(db)
+            finally:
+                db.close()
+
+        with ThreadPoolExecutor(max_workers=min(len(self._session_factories), 8)) as executor:
+            return [row for rows in executor.map(run, self._session_factories) for row in rows]
+
+
+storage = StorageRouter(DATABASE_URL, data_config.shard_count, data_config.shard_dir)
+
+# The main database, which also holds the user tables when sharding is off
+engine = storage.catalog_engine
+SessionLocal = storage.catalog_session
 
 def init_db():
-    """Initializes the database tables based on the schema."""
+    """
+    Makes sure the database schema is current before serving.
+    With auto-migration on, pending migrations are applied by exactly one process under a file lock;
+    otherwise (or once migrated) the schema version is only checked.
+    The main database and every user shard are migrated and checked.
+    """
     print("Initializing database...")
-    # Creates all tables defined in Base.metadata
-    Base.metadata.create_all(bind=engine)
-    # Load data into the database
-    load_exercises_from_json("data/exercises.json")
+    for name, database_engine, shard in storage.databases():
+        if data_config.auto_migrate and needs_migration(database_engine, shard):
+            migrate(database_engine, shard=shard)
+        check_schema_version(database_engine)
     print("Database initialized.")
 
 
-def get_db():
-    """Dependency function to get a database session."""
-    db = SessionLocal()
+def get_user_id(x_user_id: Optional[str] = Header(None)) -> str:
+    """
+    Dependency returning the id of the requesting user: DEFAULT_USER_ID until authentication exists.
+    With TRUST_USER_ID_HEADER set, the X-User-Id header names the user instead.
+    """
+    if server_config.trust_user_id_header and x_user_id:
+        return x_user_id
+    return DEFAULT_USER_ID
+
+
+def get_db(user_id: str = Depends(get_user_id)):
+    """Dependency function to get a database session for the current user."""
+    db = storage.session_for(user_id)
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,249 @@
+"""
+In-process full-text search over the exercise catalog, built from the compiled catalog on first use.
+
+The inverted index maps each token of an exercise's name, equipment, muscles and instructions to the
+exercises containing it, weighted by field. Queries are tokenized the same way and every
+token has to match (AND). The last token is treated as a prefix while the user is typing, and tokens
+of at least MIN_TYPO_LENGTH characters also match terms within one edit through a deletion
+neighbourhood index (SymSpell-style): terms are indexed under every variant with one character
+deleted, so a typo is found with a handful of dict lookups instead of a scan of the vocabulary.
+
+Prefixes shorter than MIN_INSTRUCTION_PREFIX only expand to terms of names, equipment and muscles,
+since one or two letters would otherwise match nearly every exercise through its instructions.
+Token matches are cached, so the next keystroke of a query only computes its new last token.
+Among the exercises whose name matches every query token, the staple form of a lift (STAPLE_EXERCISES)
+ranks first, then names starting with the query.
+Results can be narrowed with the ExerciseFilter fields and equipment, and come with facet counts.
+"""
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from data.compiled_catalog import CompiledCatalog, CompiledExercise, get_compiled_catalog
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "equipment": 2.0,
+    "muscles": 2.0,
+    "instructions": 0.5,
+}
+PREFIX_MATCH_FACTOR = 0.8
+TYPO_MATCH_FACTOR = 0.5
+# Extra score when the exercise name starts with the query, so "bench p" ranks "Bench Press" first
+NAME_PREFIX_BONUS = 5.0
+# The standard form of common lifts, ranked above their variations when the name matches the query,
+# so "bench press" finds "Barbell Bench Press - Medium Grip" before "Bench Press with Chains"
+STAPLE_EXERCISES = frozenset({
+    "Barbell_Bench_Press_-_Medium_Grip", "Barbell_Squat", "Barbell_Deadlift", "Romanian_Deadlift", "Pullups",
+    "Chin-Up", "Pushups", "Dips_-_Triceps_Version", "Standing_Military_Press", "Bent_Over_Barbell_Row",
+    "Wide-Grip_Lat_Pulldown", "Seated_Cable_Rows", "Barbell_Curl", "Triceps_Pushdown", "Side_Lateral_Raise",
+    "Leg_Press", "Dumbbell_Lunges", "Barbell_Hip_Thrust", "Leg_Extensions", "Lying_Leg_Curls",
+    "Standing_Calf_Raises", "Barbell_Shrug", "Plank", "Crunches", "Hanging_Leg_Raise",
+})
+STAPLE_BONUS = 10.0
+MIN_TYPO_LENGTH = 4
+MIN_INSTRUCTION_PREFIX = 3
+TOKEN_CACHE_SIZE = 4096
+# Only skipped in instructions, names keep every word
+INSTRUCTION_STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it", "its", "of",
+    "on", "or", "so", "that", "the", "then", "this", "to", "while", "with", "you", "your",
+}
+FACET_FIELDS = ["level", "category", "force", "mechanic", "equipment", "primary_muscle"]
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def _deletes(term: str) -> Set[str]:
+    """Every variant of the term with one character deleted."""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class SearchResult:
+    """Matched exercises, best first, with facet counts over all matches."""
+    __slots__ = ("total", "exercises", "facets")
+
+    def __init__(self, total: int, exercises: List[CompiledExercise], facets: Dict[str, Dict[str, int]]):
+        self.total = total
+        self.exercises = exercises
+        self.facets = facets
+
+
+class ExerciseSearchIndex:
+    """Inverted index over a compiled catalog. Documents are positions of the catalog records."""
+
+    def __init__(self, catalog: CompiledCatalog):
+        self.exercises: List[CompiledExercise] = list(catalog)
+        self._names: List[str] = [(exercise.name or "").lower() for exercise in self.exercises]
+        self._name_tokens: List[List[str]] = [tokenize(name) for name in self._names]
+        self._staples: Set[int] = {doc for doc, exercise in enumerate(self.exercises) if exercise.id in STAPLE_EXERCISES}
+        self._facet_keys: List[Tuple[Tuple[str, str], ...]] = []
+        self._facet_docs: Dict[Tuple[str, str], Set[int]] = {}
+
+        postings: Dict[str, Dict[int, float]] = {}
+        title_postings: Dict[str, Dict[int, float]] = {}
+        for doc, exercise in enumerate(self.exercises):
+            fields = {
+                "name": tokenize(exercise.name),
+                "equipment": tokenize(exercise.equipment),
+                "muscles": [token for muscle in exercise.primary_muscles + exercise.secondary_muscles for token in tokenize(muscle)],
+                "instructions": [token for line in exercise.instructions for token in tokenize(line) if token not in INSTRUCTION_STOP_WORDS],
+            }
+            for field, tokens in fields.items():
+                for token in set(tokens):
+                    for index in ([postings] if field == "instructions" else [postings, title_postings]):
+                        weights = index.setdefault(token, {})
+                        weights[doc] = weights.get(doc, 0.0) + FIELD_WEIGHTS[field]
+
+            facets = {
+                "level": [exercise.level],
+                "category": [exercise.category],
+                "force": [exercise.force],
+                "mechanic": [exercise.mechanic],
+                "equipment": [exercise.equipment],
+                "primary_muscle": exercise.primary_muscles,
+            }
+            keys = tuple((field, value) for field, values in facets.items() for value in values if value)
+            self._facet_keys.append(keys)
+            for key in keys:
+                self._facet_docs.setdefault(key, set()).add(doc)
+
+        self._postings = postings
+        self._terms: List[str] = sorted(postings)
+        self._title_postings = title_postings
+        self._title_terms: List[str] = sorted(title_postings)
+        self._delete_index: Dict[str, Set[str]] = {}
+        for term in self._terms:
+            if len(term) >= MIN_TYPO_LENGTH - 1:
+                for variant in _deletes(term) | {term}:
+                    self._delete_index.setdefault(variant, set()).add(term)
+
+        self._match = lru_cache(maxsize=TOKEN_CACHE_SIZE)(self._match_token)
+
+    @staticmethod
+    def _prefix_terms(terms: List[str], prefix: str) -> Iterable[str]:
+        for i in range(bisect_left(terms, prefix), len(terms)):
+            if not terms[i].startswith(prefix):
+                break
+            yield terms[i]
+
+    def _typo_terms(self, token: str) -> Set[str]:
+        """Terms within one insertion, deletion, substitution or transposition of the token."""
+        candidates = set(self._delete_index.get(token, ()))
+        for variant in _deletes(token):
+            candidates |= self._delete_index.get(variant, set())
+        candidates.discard(token)
+        return candidates
+
+    def _match_token(self, token: str, is_prefix: bool) -> Dict[int, float]:
+        """Documents matching one query token with their score for it."""
+        scores: Dict[int, float] = dict(self._postings.get(token, {}))
+
+        def add(postings: Dict[int, float], factor: float) -> None:
+            for doc, weight in postings.items():
+                if weight * factor > scores.get(doc, 0.0):
+                    scores[doc] = weight * factor
+
+        if is_prefix:
+            if len(token) < MIN_INSTRUCTION_PREFIX:
+                terms, postings = self._title_terms, self._title_postings
+            else:
+                terms, postings = self._terms, self._postings
+            for term in self._prefix_terms(terms, token):
+                if term != token:
+                    add(postings[term], PREFIX_MATCH_FACTOR)
+        if len(token) >= MIN_TYPO_LENGTH:
+            for term in self._typo_terms(token):
+                add(self._postings[term], TYPO_MATCH_FACTOR)
+        return scores
+
+    def _name_matches(self, doc: int, tokens: List[str], last_is_prefix: bool) -> bool:
+        """Whether every query token matches a word of the exercise name, as it matches terms in _match_token."""
+        name_tokens = self._name_tokens[doc]
+        for i, token in enumerate(tokens):
+            is_prefix = last_is_prefix and i == len(tokens) - 1
+            typos = self._typo_terms(token) if len(token) >= MIN_TYPO_LENGTH else set()
+            if not any(term == token or term in typos or (is_prefix and term.startswith(token)) for term in name_tokens):
+                return False
+        return True
+
+    def _filter_docs(self, filter=None, equipment: Optional[str] = None) -> Optional[Set[int]]:
+        """Documents allowed by an ExerciseFilter and equipment, None when nothing is filtered."""
+        wanted = []
+        if filter is not None:
+            for field in ["level", "category", "force", "mechanic"]:
+                value = getattr(filter, field)
+                if value is not None:
+                    wanted.append((field, value.value))
+            if filter.primary_muscle is not None:
+                wanted.append(("primary_muscle", filter.primary_muscle.value))
+        if equipment:
+            wanted.append(("equipment", equipment))
+        if not wanted:
+            return None
+        allowed = set(self._facet_docs.get(wanted[0], set()))
+        for key in wanted[1:]:
+            allowed &= self._facet_docs.get(key, set())
+        return allowed
+
+    def search(self, query: str, filter=None, equipment: Optional[str] = None, limit: int = 20, offset: int = 0) -> SearchResult:
+        """
+        Returns the exercises matching every token of the query, best first. The last token is
+        matched as a prefix unless the query ends with a space. An empty query lists every exercise
+        allowed by the filters, by name.
+        """
+        tokens = tokenize(query)
+        last_is_prefix = not query[-1:].isspace()
+        allowed = self._filter_docs(filter, equipment)
+
+        scores: Optional[Dict[int, float]] = None
+        for i, token in enumerate(tokens):
+            is_prefix = i == len(tokens) - 1 and last_is_prefix
+            matches = self._match(token, is_prefix)
+            if scores is None:
+                scores = dict(matches) if allowed is None else {doc: score for doc, score in matches.items() if doc in allowed}
+            else:
+                scores = {doc: score + matches[doc] for doc, score in scores.items() if doc in matches}
+            if not scores:
+                break
+
+        if scores is None:
+            docs = allowed if allowed is not None else range(len(self.exercises))
+            page = heapq.nsmallest(offset + limit, docs, key=lambda doc: self._names[doc])[offset:]
+        else:
+            docs = scores
+            phrase = " ".join(tokens)
+            staples = {doc for doc in self._staples if doc in scores and self._name_matches(doc, tokens, last_is_prefix)}
+            page = heapq.nsmallest(offset + limit, scores, key=lambda doc: (
+                -scores[doc]
+                - (NAME_PREFIX_BONUS if self._names[doc].startswith(phrase) else 0.0)
+                - (STAPLE_BONUS if doc in staples else 0.0),
+                len(self._names[doc]),
+                self._names[doc]
+            ))[offset:]
+
+        facets: Dict[str, Dict[str, int]] = {field: {} for field in FACET_FIELDS}
+        for (field, value), count in Counter(chain.from_iterable(map(self._facet_keys.__getitem__, docs))).items():
+            facets[field][value] = count
+        return SearchResult(len(docs), [self.exercises[doc] for doc in page], facets)
+
+
+_index: Optional[ExerciseSearchIndex] = None
+_index_lock = threading.Lock()
+
+def get_exercise_search_index() -> ExerciseSearchIndex:
+    """Returns the process-wide search index, building it from the compiled catalog on first use (once)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ExerciseSearchIndex(get_compiled_catalog())
+    return _index
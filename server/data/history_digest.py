@@ -0,0 +1,172 @@
+"""
+Per-user training history digest used to personalize workout generation.
+
+The digest is updated incrementally in the same transaction as each new workout log, so
+generation never scans the raw logs. It holds:
+    sessions    the last few sessions per split, with the top set of each exercise
+    exercises   the last and best (weight, reps) per exercise, for the most recently trained exercises
+    fatigue     an exponentially decaying volume score per muscle group
+render_history_digest turns it into prompt text capped at a fixed token budget.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from data.schema import HistoryDigest
+from data.compiled_catalog import get_compiled_catalog
+from models import LogWorkoutRequest, LogSetStatus, WorkoutSplit
+
+MAX_SESSIONS_PER_SPLIT = 3
+MAX_EXERCISES = 40
+MAX_DIGEST_TOKENS = 300
+CHARS_PER_TOKEN = 4
+FATIGUE_HALF_LIFE_MS = 48 * 3600 * 1000
+# Fatigue added per completed set to the exercise's primary and secondary muscles
+PRIMARY_SET_FATIGUE = 1.0
+SECONDARY_SET_FATIGUE = 0.5
+MAX_FATIGUE = 10.0
+
+
+def _number(value: Any) -> Optional[float]:
+    """Weights and reps may be logged as strings such as "bodyweight"; those have no numeric value."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _decay(score: float, since_ms: int, now_ms: int) -> float:
+    return score * 0.5 ** (max(now_ms - since_ms, 0) / FATIGUE_HALF_LIFE_MS)
+
+
+def _format_set(weight: Optional[float], reps: Optional[float]) -> str:
+    weight_text = f"{weight:g}" if weight is not None else "BW"
+    return f"{weight_text}x{reps:g}" if reps is not None else weight_text
+
+
+def apply_workout_log(digest: Dict[str, Any], log_data: LogWorkoutRequest) -> Dict[str, Any]:
+    """Returns a new digest with the workout log folded in."""
+    sessions: Dict[str, List[Dict[str, Any]]] = {split: list(items) for split, items in digest.get("sessions", {}).items()}
+    exercises: Dict[str, Dict[str, Any]] = dict(digest.get("exercises", {}))
+    fatigue: Dict[str, List[float]] = dict(digest.get("fatigue", {}))
+
+    logged_at = log_data.startTime or int(time.time() * 1000)
+    catalog = get_compiled_catalog()
+    top_sets: List[Tuple[str, str]] = []
+    added_fatigue: Dict[str, float] = {}
+
+    for logged_exercise in log_data.loggedExercises:
+        completed = [s for s in logged_exercise.sets if s.status == LogSetStatus.COMPLETED]
+        if not completed:
+            continue
+        # Top set is the heaviest completed set, then the one with the most reps
+        numeric_sets = [(_number(s.weight_lbs), _number(s.reps)) for s in completed]
+        top = max(numeric_sets, key=lambda s: (s[0] or 0, s[1] or 0))
+        top_sets.append((logged_exercise.exercise_id, _format_set(*top)))
+
+        previous = exercises.get(logged_exercise.exercise_id, {})
+        entry = dict(previous)
+        if logged_at >= previous.get("last_ms", 0):
+            entry.update(last=list(top), last_ms=logged_at)
+        best = previous.get("best")
+        if best is None or (top[0] or 0, top[1] or 0) > (best[0] or 0, best[1] or 0):
+            entry["best"] = list(top)
+        exercises[logged_exercise.exercise_id] = entry
+
+        catalog_exercise = catalog.get(logged_exercise.exercise_id)
+        if catalog_exercise is not None:
+            for muscle in catalog_exercise.primary_muscles:
+                added_fatigue[muscle] = added_fatigue.get(muscle, 0.0) + PRIMARY_SET_FATIGUE * len(completed)
+            for muscle in catalog_exercise.secondary_muscles:
+                added_fatigue[muscle] = added_fatigue.get(muscle, 0.0) + SECONDARY_SET_FATIGUE * len(completed)
+
+    split = log_data.split.value
+    session = {"date": datetime.fromtimestamp(logged_at / 1000, tz=timezone.utc).strftime("%Y-%m-%d"), "ms": logged_at, "top_sets": top_sets}
+    sessions[split] = sorted(sessions.get(split, []) + [session], key=lambda s: s["ms"])[-MAX_SESSIONS_PER_SPLIT:]
+
+    # Only keep the most recently trained exercises
+    exercises = dict(sorted(exercises.items(), key=lambda item: item[1].get("last_ms", 0), reverse=True)[:MAX_EXERCISES])
+
+    # Scores are stored with the time they were last decayed to
+    for muscle, added in added_fatigue.items():
+        score, as_of = fatigue.get(muscle, [0.0, logged_at])
+        as_of_ms = max(as_of, logged_at)
+        fatigue[muscle] = [_decay(score, as_of, as_of_ms) + _decay(added, logged_at, as_of_ms), as_of_ms]
+
+    return {"sessions": sessions, "exercises": exercises, "fatigue": fatigue}
+
+
+def update_history_digest(db: Session, user_id: str, log_data: LogWorkoutRequest) -> None:
+    """Folds a new workout log into the user's digest. Added to the session, committed by the caller."""
+    stored = db.get(HistoryDigest, user_id)
+    digest = apply_workout_log(stored.digest if stored else {}, log_data)
+    db.merge(HistoryDigest(user_id=user_id, digest=digest, updated_at=int(time.time() * 1000)))
+    # Flushed so the next log of the same batch finds this digest instead of the committed one
+    db.flush()
+
+
+def get_history_digest(db: Session, user_id: str) -> Optional[Dict[str, Any]]:
+    """Returns the user's digest, or None if they have not logged a workout yet."""
+    try:
+        stored = db.get(HistoryDigest, user_id)
+        return stored.digest if stored else None
+    except SQLAlchemyError as e:
+        print(f"Error fetching history digest: {e}")
+        return None
+
+
+def get_muscle_fatigue(digest: Optional[Dict[str, Any]], now_ms: Optional[int] = None) -> Dict[str, float]:
+    """Fatigue score (0-10) per muscle group, decayed to now_ms."""
+    if not digest:
+        return {}
+    now_ms = now_ms or int(time.time() * 1000)
+    return {muscle: min(_decay(score, as_of, now_ms), MAX_FATIGUE) for muscle, (score, as_of) in digest.get("fatigue", {}).items()}
+
+
+def render_history_digest(digest: Optional[Dict[str, Any]],
+                          split: Optional[WorkoutSplit] = None,
+                          max_tokens: int = MAX_DIGEST_TOKENS,
+                          now_ms: Optional[int] = None) -> str:
+    """
+    Renders the digest as compact prompt text. Lines are added by priority (fatigue, sessions of
+    the requested split, exercise weights, other splits) until the token budget is reached.
+    """
+    if not digest:
+        return ""
+    now_ms = now_ms or int(time.time() * 1000)
+
+    lines = []
+    fatigue = sorted(get_muscle_fatigue(digest, now_ms).items(), key=lambda item: item[1], reverse=True)
+    fatigue = [(muscle, score) for muscle, score in fatigue if score >= 0.5]
+    if fatigue:
+        lines.append(f"Muscle fatigue (0-10): {', '.join(f'{muscle} {score:.1f}' for muscle, score in fatigue)}")
+
+    sessions = digest.get("sessions", {})
+    def session_lines(split_name: str) -> List[str]:
+        return [
+            f"{split_name} {session['date']}: {', '.join(f'{exercise_id} {top_set}' for exercise_id, top_set in session['top_sets'])}"
+            for session in reversed(sessions.get(split_name, []))
+        ]
+
+    requested = split.value if split else None
+    if requested:
+        lines.extend(session_lines(requested))
+    for exercise_id, entry in digest.get("exercises", {}).items():
+        last, best = entry.get("last"), entry.get("best")
+        if last:
+            lines.append(f"{exercise_id}: last {_format_set(*last)}, best {_format_set(*best) if best else '-'}")
+    for split_name in sessions:
+        if split_name != requested:
+            lines.extend(session_lines(split_name))
+
+    budget = max_tokens * CHARS_PER_TOKEN
+    rendered = []
+    for line in lines:
+        if len(line) + 1 > budget:
+            break
+        rendered.append(line)
+        budget -= len(line) + 1
+    return "\n".join(rendered)
@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from data.queries import iter_workout_history_rows
+from models import WorkoutSplit
+
+# Rows are buffered into chunks of about this many bytes before being sent
+CHUNK_SIZE = 64 * 1024
+
+CSV_COLUMNS = [
+    "workout_log_id", "workout_routine_id", "split", "start_time", "end_time", "total_duration_seconds", "notes",
+    "exercise_id", "exercise_name", "exercise_status", "exercise_start_time", "exercise_elapsed_time_ms", "exercise_active_work_time_ms",
+    "set_number", "weight_lbs", "reps", "rpe", "set_status", "set_start_time", "set_end_time", "set_elapsed_time_ms",
+]
+
+
+def _ndjson_lines(rows: Iterable) -> Iterator[str]:
+    """One JSON object per logged exercise, with its sets nested."""
+    for row in rows:
+        yield json.dumps({
+            "workoutLogId": row.workout_log_id,
+            "workoutRoutineId": row.workout_routine_id,
+            "split": row.split,
+            "startTime": row.start_time,
+            "endTime": row.end_time,
+            "totalDurationSeconds": row.total_duration_seconds,
+            "notes": row.notes,
+            "exerciseId": row.exercise_id,
+            "name": row.name,
+            "status": row.status,
+            "exerciseStartTime": row.exercise_start_time,
+            "elapsedTime_ms": row.elapsed_time_ms,
+            "activeWorkTime_ms": row.active_work_time_ms,
+            "sets": row.sets or [],
+        }) + "\n"
+
+
+def _csv_lines(rows: Iterable) -> Iterator[str]:
+    """One CSV row per logged set; exercises without sets get a single row with empty set columns."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writerow(CSV_COLUMNS)
+    yield flush()
+    for row in rows:
+        workout = [row.workout_log_id, row.workout_routine_id, row.split, row.start_time, row.end_time, row.total_duration_seconds, row.notes,
+                   row.exercise_id, row.name, row.status, row.exercise_start_time, row.elapsed_time_ms, row.active_work_time_ms]
+        sets: List[Dict[str, Any]] = row.sets or [{}]
+        for logged_set in sets:
+            writer.writerow(workout + [
+                logged_set.get("set_number"), logged_set.get("weight_lbs"), logged_set.get("reps"), logged_set.get("rpe"),
+                logged_set.get("status"), logged_set.get("startTime"), logged_set.get("endTime"), logged_set.get("elapsedTime_ms"),
+            ])
+        yield flush()
+
+
+EXPORT_FORMATS: Dict[str, Callable[[Iterable], Iterator[str]]] = {
+    "ndjson": _ndjson_lines,
+    "csv": _csv_lines,
+}
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def stream_history_export(session_factory: Callable[[], Session],
+                          export_format: str,
+                          user_id: str,
+                          start_ms: Optional[int] = None,
+                          end_ms: Optional[int] = None,
+                          split: Optional[WorkoutSplit] = None) -> Iterator[bytes]:
+    """
+    Generator for a StreamingResponse body. It opens its own session, since it runs after the
+    endpoint has returned, and yields the export in chunks of about CHUNK_SIZE bytes.
+    """
+    db = session_factory()
+    try:
+        rows = iter_workout_history_rows(db, user_id, start_ms, end_ms, split)
+        chunk: List[str] = []
+        size = 0
+        for line in EXPORT_FORMATS[export_format](rows):
+            chunk.append(line)
+            size += len(line)
+            if size >= CHUNK_SIZE:
+                yield "".join(chunk).encode()
+                chunk, size = [], 0
+        if chunk:
+            yield "".join(chunk).encode()
+    finally:
+        db.close()
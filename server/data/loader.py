@@ -1,12 +1,12 @@
 import json
 from sqlalchemy.orm import Session
-from data.schema import Exercise, Base
+from data.schema import Exercise
 from sqlalchemy import create_engine
 
 def load_exercises_from_json(json_path: str, db_path: str = "sqlite:///exercises.db"):
-    # Setup DB
+    # The exercises table is created by the migrations (python -m data.migrations), which call this to seed it.
+    # The table is made to match the json: exercises are inserted or updated, and ones no longer in it are deleted.
     engine = create_engine(db_path)
-    Base.metadata.create_all(engine)
     session = Session(bind=engine)
 
     # Load data
@@ -30,9 +30,9 @@ def load_exercises_from_json(json_path: str, db_path: str = "sqlite:///exercises
         )
         session.merge(exercise)  # avoids duplicates on rerun
 
+    # Exercises removed from the catalog
+    session.query(Exercise).filter(Exercise.id.notin_([item["id"] for item in data])).delete(synchronize_session=False)
     session.commit()
     session.close()
+    engine.dispose()
     print("✅ Exercises loaded into database.")
-
-if __name__ == "__main__":
-    load_exercises_from_json("exercises.json")
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""
+Schema versioning for the application database.
+
+Each migration has an increasing version and is applied at most once; applied versions are
+recorded in the schema_migrations table. Tables are only ever created by migrations. Migrating also
+compiles the exercise catalog snapshot, seeds the exercises table from it when exercises.json
+changed and records the catalog version used for catalog deltas.
+
+With user sharding on, every user shard is migrated too, but only the tables in SHARD_TABLES are
+created there; the main database keeps every table and the catalog.
+
+With several workers, run the migrations once before starting them:
+    python -m data.migrations
+and start the workers with AUTO_MIGRATE=false, so they only check the schema version.
+When auto-migration is on, a file lock makes sure only one process migrates while the others wait.
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Callable, FrozenSet, List, NamedTuple, Optional
+
+from sqlalchemy import func, inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from data.schema import Base, Exercise, SchemaMigration
+from data.loader import load_exercises_from_json
+from data.compiled_catalog import CATALOG_JSON_PATH, COMPILED_CATALOG_PATH, CompiledCatalog, compiled_catalog_is_current, ensure_compiled_catalog
+from data.catalog import record_catalog_version
+from data.file_lock import file_lock
+
+
+# Per-user tables, the only ones created in user shards
+SHARD_TABLES: FrozenSet[str] = frozenset({"workout_logs", "logged_exercises", "generated_workouts", "history_digests", "telemetry_chunks"})
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    # Called with the connection and the names of the tables this database holds (None for all)
+    upgrade: Callable[[Connection, Optional[FrozenSet[str]]], None]
+
+
+def _create_tables(*table_names: str) -> Callable[[Connection, Optional[FrozenSet[str]]], None]:
+    """Migration step which creates the given tables (and their indexes) if they do not exist yet."""
+    def upgrade(connection: Connection, tables: Optional[FrozenSet[str]] = None) -> None:
+        names = [name for name in table_names if tables is None or name in tables]
+        Base.metadata.create_all(connection, tables=[Base.metadata.tables[name] for name in names])
+    return upgrade
+
+
+def _add_columns(table_name: str, *column_names: str) -> Callable[[Connection, Optional[FrozenSet[str]]], None]:
+    """Migration step which adds columns of the schema to an existing table, skipping ones it already has."""
+    def upgrade(connection: Connection, tables: Optional[FrozenSet[str]] = None) -> None:
+        if tables is not None and table_name not in tables:
+            return
+        existing = {column["name"] for column in inspect(connection).get_columns(table_name)}
+        table = Base.metadata.tables[table_name]
+        for name in column_names:
+            if name not in existing:
+                column = table.columns[name]
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}")
+    return upgrade
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Initial schema", _create_tables("exercises", "workout_logs", "logged_exercises", "generated_workouts", "catalog_versions")),
+    Migration(2, "Add training history digests", _create_tables("history_digests")),
+    Migration(3, "Add wearable telemetry chunks", _create_tables("telemetry_chunks")),
+    Migration(4, "Add request fingerprints to workout logs", _add_columns("workout_logs", "request_hash")),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(engine: Engine) -> int:
+    """Returns the latest applied migration version, 0 for a database that was never migrated."""
+    with engine.connect() as connection:
+        if not inspect(connection).has_table(SchemaMigration.__tablename__):
+            return 0
+        return Session(bind=connection).query(func.max(SchemaMigration.version)).scalar() or 0
+
+
+def needs_migration(engine: Engine, shard: bool = False) -> bool:
+    """Whether migrate() has anything to do, checked without taking the lock."""
+    return get_schema_version(engine) < SCHEMA_VERSION or (not shard and not compiled_catalog_is_current())
+
+
+def get_lock_path(engine: Engine) -> str:
+    """The init lock lives next to the SQLite file, so every process using that file shares it."""
+    database = engine.url.database
+    if engine.url.get_backend_name() == "sqlite" and database and database != ":memory:":
+        return f"{database}.lock"
+    return os.path.join("data", ".migrate.lock")
+
+
+def migrate(engine: Engine, json_path: str = CATALOG_JSON_PATH, shard: bool = False) -> int:
+    """
+    Applies pending migrations and refreshes the catalog while holding the init lock.
+    Safe to call from several processes at once: the first one migrates, the others wait for the
+    lock and then find nothing left to do. Returns the schema version.
+    A user shard only gets the SHARD_TABLES and no catalog.
+    """
+    with file_lock(get_lock_path(engine)):
+        SchemaMigration.__table__.create(engine, checkfirst=True)
+        version = get_schema_version(engine)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            print(f"Applying migration {migration.version}: {migration.description}")
+            with engine.begin() as connection:
+                migration.upgrade(connection, SHARD_TABLES if shard else None)
+                connection.execute(SchemaMigration.__table__.insert().values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=int(time.time() * 1000)
+                ))
+            version = migration.version
+        if shard:
+            return version
+
+        # Seed the catalog when exercises.json changed or the database is new
+        rebuilt = ensure_compiled_catalog(json_path)
+        with Session(bind=engine) as session:
+            empty = session.query(Exercise.id).first() is None
+        if rebuilt or empty:
+            load_exercises_from_json(json_path, db_path=engine.url.render_as_string(hide_password=False))
+
+        # Record the catalog version for delta requests here, so workers never write at boot
+        catalog = CompiledCatalog(COMPILED_CATALOG_PATH)
+        try:
+            with Session(bind=engine) as session:
+                record_catalog_version(session, catalog)
+        finally:
+            catalog.close()
+        return version
+
+
+def check_schema_version(engine: Engine) -> None:
+    """Raises if the database is not at the schema version this code expects."""
+    version = get_schema_version(engine)
+    if version != SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {SCHEMA_VERSION}. "
+            "Run `python -m data.migrations` before starting the server."
+        )
+
+
+if __name__ == "__main__":
+    from data.database import storage
+
+    parser = argparse.ArgumentParser(description="Apply database migrations to the main database and every user shard.")
+    parser.add_argument("--check", action="store_true", help="Only check whether migrations are pending")
+    args = parser.parse_args()
+
+    if args.check:
+        pending = False
+        for name, engine, shard in storage.databases():
+            version = get_schema_version(engine)
+            print(f"{name}: schema version {version}, expected {SCHEMA_VERSION}.")
+            pending = pending or needs_migration(engine, shard)
+        sys.exit(1 if pending else 0)
+
+    for name, engine, shard in storage.databases():
+        version = migrate(engine, shard=shard)
+        print(f"✅ {name} at schema version {version}.")
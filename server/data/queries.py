@@ -1,9 +1,14 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select, func, distinct
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from data.schema import Exercise, PrimaryMuscle, Level, Category, Force, Mechanic, WorkoutLog, LoggedExercise as LoggedExerciseDB # Renamed to avoid Pydantic model conflict
-from models import LogWorkoutRequest
-from typing import Optional, List
+from data.schema import Exercise, PrimaryMuscle, Level, Category, Force, Mechanic, WorkoutLog, GeneratedWorkout, LoggedExercise as LoggedExerciseDB # Renamed to avoid Pydantic model conflict
+from models import LogWorkoutRequest, WorkoutRoutine, WorkoutSplit
+from data.history_digest import update_history_digest
+from data.compiled_catalog import CompiledExercise, get_compiled_catalog
+from typing import Optional, List, Tuple, Dict, Iterator, Literal, Union, overload
+import hashlib
+import time
+import uuid
 class ExerciseFilter:
     def __init__(self,
                  primary_muscle: PrimaryMuscle = None, 
@@ -20,9 +25,45 @@ class ExerciseFilter:
     def __str__(self):
         return f"ExerciseFilter(primary_muscle={self.primary_muscle.value}, level={self.level.value}, category={self.category.value}, force={self.force.value}, mechanic={self.mechanic.value})"
 
-def search_exercises(filter: ExerciseFilter, session: Session) -> list[Exercise]:
-    query = session.query(Exercise)
+class ExerciseOption:
+    """
+    Lightweight read model of an exercise for workout generation: only the fields the agents read.
+    Leaves out instructions and images, and is read from the memory-mapped compiled catalog
+    instead of the database.
+    """
+    __slots__ = ("id", "name", "force", "level", "mechanic", "equipment", "category", "primary_muscles")
+
+    def __init__(self, id, name, force, level, mechanic, equipment, category, primary_muscles):
+        self.id = id
+        self.name = name
+        self.force = force
+        self.level = level
+        self.mechanic = mechanic
+        self.equipment = equipment
+        self.category = category
+        self.primary_muscles = primary_muscles
+
+    @classmethod
+    def from_compiled(cls, exercise: CompiledExercise) -> "ExerciseOption":
+        """Decodes the fields once, the agents read them many times while scoring candidates."""
+        return cls(exercise.id, exercise.name, exercise.force, exercise.level, exercise.mechanic,
+                   exercise.equipment, exercise.category, exercise.primary_muscles)
+
+@overload
+def search_exercises(filter: ExerciseFilter, session: Session, lean: Literal[False] = False) -> List[Exercise]: ...
+@overload
+def search_exercises(filter: ExerciseFilter, session: Session, lean: Literal[True]) -> List[ExerciseOption]: ...
 
+def search_exercises(filter: ExerciseFilter, session: Session, lean: bool = False) -> Union[List[Exercise], List[ExerciseOption]]:
+    """
+    Returns the exercises matching the filter as full Exercise rows, or as ExerciseOption
+    read models when lean is set (for the generation path). Lean results are filtered on the
+    compiled catalog's integer codes without a database query.
+    """
+    if lean:
+        return [ExerciseOption.from_compiled(exercise) for exercise in get_compiled_catalog().search(filter)]
+
+    query = session.query(Exercise)
     if filter.primary_muscle:
         query = query.filter(Exercise.primary_muscles.contains([filter.primary_muscle.value]))
     if filter.level:
@@ -34,70 +75,135 @@ def search_exercises(filter: ExerciseFilter, session: Session) -> list[Exercise]
     if filter.mechanic:
         query = query.filter(Exercise.mechanic == filter.mechanic.value)
     
-    results = query.all()
-    return results
+    return query.all()
 
-def get_stretching_exercises(db: Session):
+def get_stretching_exercises(db: Session, lean: bool = False):
     stretching_filter = ExerciseFilter(category=Category.STRETCHING)
-    stretching_exercises = search_exercises(stretching_filter, db)
+    stretching_exercises = search_exercises(stretching_filter, db, lean)
     return stretching_exercises
 
-def get_push_exercises(db: Session):
+def get_push_exercises(db: Session, lean: bool = False):
     push_filter = ExerciseFilter(force=Force.PUSH)
-    push_exercises = search_exercises(push_filter, db)
+    push_exercises = search_exercises(push_filter, db, lean)
     return push_exercises
 
-def get_pull_exercises(db: Session):
+def get_pull_exercises(db: Session, lean: bool = False):
     pull_filter = ExerciseFilter(force=Force.PULL)
-    pull_exercises = search_exercises(pull_filter, db)
+    pull_exercises = search_exercises(pull_filter, db, lean)
     return pull_exercises
 
-def get_abs_exercises(db: Session):
+def get_abs_exercises(db: Session, lean: bool = False):
     abs_filter = ExerciseFilter(primary_muscle=PrimaryMuscle.ABDOMINALS)
-    abs_exercises = search_exercises(abs_filter, db)
+    abs_exercises = search_exercises(abs_filter, db, lean)
     return abs_exercises
 
-def get_full_body_exercises(db: Session):
+def get_full_body_exercises(db: Session, lean: bool = False):
     full_body_filter = ExerciseFilter(mechanic=Mechanic.COMPOUND)
-    full_body_exercises = search_exercises(full_body_filter, db)
+    full_body_exercises = search_exercises(full_body_filter, db, lean)
     return full_body_exercises
 
-def create_workout_log(db: Session, user_id: str, log_data: LogWorkoutRequest) -> Optional[WorkoutLog]:
+LEG_MUSCLES = [PrimaryMuscle.QUADRICEPS, PrimaryMuscle.HAMSTRINGS, PrimaryMuscle.GLUTES, PrimaryMuscle.CALVES]
+
+def get_leg_exercises(db: Session, lean: bool = False):
+    leg_exercises = []
+    for muscle in LEG_MUSCLES:
+        leg_filter = ExerciseFilter(primary_muscle=muscle, category=Category.STRENGTH)
+        leg_exercises.extend(search_exercises(leg_filter, db, lean))
+    return leg_exercises
+
+def get_split_exercises(db: Session, split: Optional[WorkoutSplit], lean: bool = False):
+    """
+    Returns the primary exercise candidates for a workout split, or None if the split is not supported.
+    Defaults to the PUSH split when no split is given. With lean set, candidates are ExerciseOption read models.
+    """
+    if split == WorkoutSplit.PUSH or (split is None):
+        return get_push_exercises(db, lean)
+    elif split == WorkoutSplit.PULL:
+        return get_pull_exercises(db, lean)
+    elif split == WorkoutSplit.LEGS:
+        return get_leg_exercises(db, lean)
+    elif split == WorkoutSplit.ABS:
+        return get_abs_exercises(db, lean)
+    elif split == WorkoutSplit.FULL_BODY:
+        return get_full_body_exercises(db, lean)
+    return None
+
+class WorkoutLogConflictError(ValueError):
+    """A workout log id (i.e. idempotency key) was reused for a different workout."""
+
+    def __init__(self, log_id: str):
+        super().__init__(f"Workout log {log_id} already exists with different data.")
+        self.log_id = log_id
+
+def make_workout_log_id(user_id: str, log_data: LogWorkoutRequest, idempotency_key: Optional[str] = None) -> str:
+    """
+    Assigns the id of a new workout log. Without an idempotency key every request gets a new id;
+    with one, requests retried with the same key (by the same user) map to the same log.
+    """
+    if idempotency_key:
+        token = uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}/{idempotency_key}").hex
+    else:
+        token = uuid.uuid4().hex
+    return f"log_{log_data.workoutRoutineId}_{token}"
+
+def workout_log_fingerprint(log_data: LogWorkoutRequest) -> str:
+    """Hash of the request, stored with the log so a retry can be told apart from a different workout."""
+    return hashlib.sha256(log_data.model_dump_json().encode()).hexdigest()[:32]
+
+def _add_workout_log(db: Session, user_id: str, log_id: str, log_data: LogWorkoutRequest) -> WorkoutLog:
+    """Adds a workout log and its logged exercises to the session without committing."""
+    # Create the main workout log entry
+    db_workout_log = WorkoutLog(
+        id=log_id,
+        workout_routine_id=log_data.workoutRoutineId,
+        user_id=user_id,
+        start_time=log_data.startTime,
+        end_time=log_data.endTime,
+        total_duration_seconds=log_data.totalDurationSeconds,
+        split=log_data.split,
+        notes=log_data.notes,
+        request_hash=workout_log_fingerprint(log_data)
+    )
+    db.add(db_workout_log)
+
+    # Create entries for each logged exercise
+    for exercise_log_data in log_data.loggedExercises:
+        # Convert Pydantic LoggedSet models to dictionaries for JSON storage
+        sets_data = [s.model_dump() for s in exercise_log_data.sets]
+
+        db_logged_exercise = LoggedExerciseDB(
+            workout_log_id=log_id,
+            exercise_id=exercise_log_data.exercise_id,
+            name=exercise_log_data.name,
+            sets=sets_data, # Store as JSON
+            start_time=exercise_log_data.startTime,
+            elapsed_time_ms=exercise_log_data.elapsedTime_ms,
+            status=exercise_log_data.status.value, # Assuming status is an Enum
+            active_work_time_ms=exercise_log_data.activeWorkTime_ms
+        )
+        db.add(db_logged_exercise)
+
+    # Keep the user's training history digest current in the same transaction
+    update_history_digest(db, user_id, log_data)
+    return db_workout_log
+
+def check_workout_log_replay(existing: WorkoutLog, log_data: LogWorkoutRequest) -> None:
+    """Raises WorkoutLogConflictError unless the existing log was stored from the same request."""
+    if existing.request_hash != workout_log_fingerprint(log_data):
+        raise WorkoutLogConflictError(existing.id)
+
+def create_workout_log(db: Session, user_id: str, log_id: str, log_data: LogWorkoutRequest) -> Optional[WorkoutLog]:
     """
     Creates a new workout log entry in the database along with its associated logged exercises.
+    A retry of a stored log returns the stored one; reusing its id for a different workout raises
+    WorkoutLogConflictError. Returns None when the database write fails.
     """
     try:
-        # Create the main workout log entry
-        new_log_id = f"log_{log_data.workoutRoutineId}_{log_data.startTime or 'manual'}"
-        db_workout_log = WorkoutLog(
-            id=new_log_id,
-            workout_routine_id=log_data.workoutRoutineId,
-            user_id=user_id,
-            start_time=log_data.startTime,
-            end_time=log_data.endTime,
-            total_duration_seconds=log_data.totalDurationSeconds,
-            split=log_data.split,
-            notes=log_data.notes
-        )
-        db.add(db_workout_log)
-
-        # Create entries for each logged exercise
-        for exercise_log_data in log_data.loggedExercises:
-            # Convert Pydantic LoggedSet models to dictionaries for JSON storage
-            sets_data = [s.model_dump() for s in exercise_log_data.sets]
-
-            db_logged_exercise = LoggedExerciseDB(
-                workout_log_id=new_log_id,
-                exercise_id=exercise_log_data.exercise_id,
-                name=exercise_log_data.name,
-                sets=sets_data, # Store as JSON
-                start_time=exercise_log_data.startTime,
-                elapsed_time_ms=exercise_log_data.elapsedTime_ms,
-                status=exercise_log_data.status.value, # Assuming status is an Enum
-                active_work_time_ms=exercise_log_data.activeWorkTime_ms
-            )
-            db.add(db_logged_exercise)
-        
+        existing = db.get(WorkoutLog, log_id)
+        if existing is not None:
+            check_workout_log_replay(existing, log_data)
+            return existing
+        db_workout_log = _add_workout_log(db, user_id, log_id, log_data)
         db.commit()
         db.refresh(db_workout_log)
         return db_workout_log
@@ -107,6 +213,29 @@ def create_workout_log(db: Session, user_id: str, log_data: LogWorkoutRequest) -
         print(f"Error creating workout log: {e}")
         return None
 
+def create_workout_logs(db: Session, entries: List[Tuple[str, str, LogWorkoutRequest]]) -> List[str]:
+    """
+    Group-commits a batch of (user_id, log_id, LogWorkoutRequest) entries in a single transaction.
+    Logs that already exist are skipped, so replaying a batch is idempotent; an existing log stored
+    from a different request raises WorkoutLogConflictError and nothing is committed.
+    Returns the ids of the logs written. Raises SQLAlchemyError so the caller can retry the batch.
+    """
+    try:
+        log_ids = [log_id for _, log_id, _ in entries]
+        existing = {row.id: row for row in db.query(WorkoutLog).filter(WorkoutLog.id.in_(log_ids))}
+        written = []
+        for user_id, log_id, log_data in entries:
+            if log_id in existing:
+                check_workout_log_replay(existing[log_id], log_data)
+                continue
+            existing[log_id] = _add_workout_log(db, user_id, log_id, log_data)
+            written.append(log_id)
+        db.commit()
+        return written
+    except (SQLAlchemyError, WorkoutLogConflictError):
+        db.rollback()
+        raise
+
 def get_workout_log_by_id(db: Session, log_id: str, user_id: str) -> Optional[WorkoutLog]:
     """
     Retrieves a specific workout log by its ID for a given user.
@@ -142,6 +271,133 @@ def get_user_workout_logs(db: Session, user_id: str, limit: int = 100, offset: i
         print(f"Error fetching user workout logs: {e}")
         return []
 
+def get_recent_exercise_ids(db: Session, user_id: str, split: Optional[WorkoutSplit] = None, limit: int = 2) -> List[str]:
+    """
+    Returns the ids of the exercises logged in the user's last `limit` workouts, optionally only of one split.
+    """
+    try:
+        recent_logs = db.query(WorkoutLog.id)\
+                        .filter(WorkoutLog.user_id == user_id)
+        if split:
+            recent_logs = recent_logs.filter(WorkoutLog.split == split.value)
+        recent_logs = recent_logs.order_by(WorkoutLog.start_time.desc()).limit(limit).subquery()
+        rows = db.query(LoggedExerciseDB.exercise_id)\
+                 .filter(LoggedExerciseDB.workout_log_id.in_(select(recent_logs.c.id)))\
+                 .distinct()\
+                 .all()
+        return [row.exercise_id for row in rows]
+    except SQLAlchemyError as e:
+        print(f"Error fetching recent exercises: {e}")
+        return []
+
+def count_users_and_workout_logs(db: Session) -> List[Tuple[int, int]]:
+    """
+    Returns [(distinct users, workout logs)] of one database, for cross-shard admin queries
+    (StorageRouter.query_all_shards) which concatenate the per-shard lists.
+    """
+    try:
+        users, logs = db.query(func.count(distinct(WorkoutLog.user_id)), func.count(WorkoutLog.id)).one()
+        return [(users, logs)]
+    except SQLAlchemyError as e:
+        print(f"Error counting workout logs: {e}")
+        return [(0, 0)]
+
+def save_generated_workouts(db: Session, user_id: str, plan_id: str, workouts: List[Tuple[WorkoutSplit, str, WorkoutRoutine]]) -> bool:
+    """
+    Stores the days of a generated plan so they can be served without calling the LLM again.
+    Each entry is a (split, scheduled_date, routine) tuple. Re-generating a day replaces the stored routine.
+    """
+    try:
+        created_at = int(time.time() * 1000)
+        for split, scheduled_date, routine in workouts:
+            db.merge(GeneratedWorkout(
+                id=routine.id,
+                plan_id=plan_id,
+                user_id=user_id,
+                split=split.value,
+                scheduled_date=scheduled_date,
+                routine=routine.model_dump(),
+                created_at=created_at
+            ))
+        db.commit()
+        return True
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Error saving generated workouts: {e}")
+        return False
+
+def get_generated_workout(db: Session, user_id: str, scheduled_date: str, split: Optional[WorkoutSplit] = None) -> Optional[WorkoutRoutine]:
+    """
+    Retrieves the most recently generated workout for a user on a given date, optionally for a specific split.
+    """
+    try:
+        query = db.query(GeneratedWorkout).filter(
+            GeneratedWorkout.user_id == user_id,
+            GeneratedWorkout.scheduled_date == scheduled_date
+        )
+        if split:
+            query = query.filter(GeneratedWorkout.split == split.value)
+        stored = query.order_by(GeneratedWorkout.created_at.desc()).first()
+        return WorkoutRoutine.model_validate(stored.routine) if stored else None
+    except SQLAlchemyError as e:
+        print(f"Error fetching generated workout: {e}")
+        return None
+
+def get_logged_exercises_for_logs(db: Session, workout_log_ids: List[str]) -> Dict[str, List[LoggedExerciseDB]]:
+    """
+    Retrieves the logged exercises of several workout logs in one query, keyed by workout_log_id.
+    """
+    grouped: Dict[str, List[LoggedExerciseDB]] = {log_id: [] for log_id in workout_log_ids}
+    try:
+        for logged_exercise in db.query(LoggedExerciseDB)\
+                                 .filter(LoggedExerciseDB.workout_log_id.in_(workout_log_ids))\
+                                 .order_by(LoggedExerciseDB.id):
+            grouped[logged_exercise.workout_log_id].append(logged_exercise)
+    except SQLAlchemyError as e:
+        print(f"Error fetching logged exercises: {e}")
+    return grouped
+
+HISTORY_EXPORT_COLUMNS = [
+    WorkoutLog.id.label("workout_log_id"),
+    WorkoutLog.workout_routine_id,
+    WorkoutLog.split,
+    WorkoutLog.start_time,
+    WorkoutLog.end_time,
+    WorkoutLog.total_duration_seconds,
+    WorkoutLog.notes,
+    LoggedExerciseDB.exercise_id,
+    LoggedExerciseDB.name,
+    LoggedExerciseDB.status,
+    LoggedExerciseDB.start_time.label("exercise_start_time"),
+    LoggedExerciseDB.elapsed_time_ms,
+    LoggedExerciseDB.active_work_time_ms,
+    LoggedExerciseDB.sets,
+]
+
+def iter_workout_history_rows(db: Session,
+                              user_id: str,
+                              start_ms: Optional[int] = None,
+                              end_ms: Optional[int] = None,
+                              split: Optional[WorkoutSplit] = None,
+                              batch_size: int = 500) -> Iterator:
+    """
+    Streams a user's history as one row per logged exercise (workout logs without exercises get a
+    row with empty exercise columns), oldest first. Rows are plain column tuples fetched from a
+    server-side cursor in batches of `batch_size`, so memory use does not grow with the history.
+    """
+    stmt = select(*HISTORY_EXPORT_COLUMNS)\
+        .outerjoin(LoggedExerciseDB, LoggedExerciseDB.workout_log_id == WorkoutLog.id)\
+        .where(WorkoutLog.user_id == user_id)\
+        .order_by(WorkoutLog.start_time, WorkoutLog.id, LoggedExerciseDB.id)\
+        .execution_options(yield_per=batch_size)
+    if start_ms is not None:
+        stmt = stmt.where(WorkoutLog.start_time >= start_ms)
+    if end_ms is not None:
+        stmt = stmt.where(WorkoutLog.start_time < end_ms)
+    if split:
+        stmt = stmt.where(WorkoutLog.split == split.value)
+    yield from db.execute(stmt)
+
 # TODO: Add functions for updating and deleting workout logs if needed
 # TODO: Add functions for more complex queries, e.g., exercise history for a specific exercise_id
 
@@ -0,0 +1,210 @@
+"""
+SQL query profiling for the data layer.
+
+When enabled (SQL_PROFILING=true), engine event hooks time every statement. Inside an HTTP
+request the timings are collected in a per-request QueryProfile (held in a context variable, so it
+follows the request into the threadpool) which records:
+    - the query count and total database time
+    - the slowest statements, with their EXPLAIN QUERY PLAN on SQLite
+    - statements repeated at least n_plus_one_threshold times, the usual sign of an N+1 pattern
+The summary is sent back in the X-Query-Profile response header (for streamed responses it only
+covers the queries run before the body started). Requests with a slow statement
+or an N+1 pattern, and slow statements run outside a request (write-behind, migrations), are
+appended to the slow-query log as JSON lines.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_HEADER = "X-Query-Profile"
+MAX_SLOWEST = 3
+MAX_LOGGED_PARAMETERS = 200
+EXPLAIN_PREFIXES = ("SELECT", "WITH")
+# Statements with expanding IN (?, ?, ...) lists have a text per list length, so only the most recent plans are kept
+MAX_CACHED_PLANS = 256
+
+
+class QueryRecord:
+    """One executed statement."""
+    __slots__ = ("statement", "parameters", "duration_ms", "plan")
+
+    def __init__(self, statement: str, parameters: Any, duration_ms: float, plan: Optional[List[str]] = None):
+        self.statement = statement
+        self.parameters = parameters
+        self.duration_ms = duration_ms
+        self.plan = plan
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "statement": self.statement,
+            "parameters": repr(self.parameters)[:MAX_LOGGED_PARAMETERS],
+            "duration_ms": round(self.duration_ms, 3),
+            "plan": self.plan,
+        }
+
+
+class QueryProfile:
+    """Query statistics of a single request."""
+
+    def __init__(self, name: str, max_slowest: int = MAX_SLOWEST):
+        self.name = name
+        self.max_slowest = max_slowest
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest: List[QueryRecord] = []
+        self.statement_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def enters_slowest(self, duration_ms: float) -> bool:
+        return len(self.slowest) < self.max_slowest or duration_ms > self.slowest[-1].duration_ms
+
+    def record(self, record: QueryRecord) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_ms += record.duration_ms
+            self.statement_counts[record.statement] = self.statement_counts.get(record.statement, 0) + 1
+            if self.enters_slowest(record.duration_ms):
+                self.slowest = sorted(self.slowest + [record], key=lambda r: r.duration_ms, reverse=True)[:self.max_slowest]
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Statements executed at least threshold times in this request."""
+        return {statement: count for statement, count in self.statement_counts.items() if count >= threshold}
+
+    def header_value(self, threshold: int) -> str:
+        slowest_ms = self.slowest[0].duration_ms if self.slowest else 0.0
+        return (f"count={self.count}; db_ms={self.total_ms:.2f}; slowest_ms={slowest_ms:.2f}; "
+                f"n_plus_one={len(self.repeated(threshold))}")
+
+
+_current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+
+
+class QueryProfiler:
+    """Engine event hooks plus the slow-query log they write to."""
+
+    def __init__(self, slow_query_ms: float = 100.0, slow_query_log: Optional[str] = None, n_plus_one_threshold: int = 5):
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._log_lock = threading.Lock()
+        self._plans: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._plans_lock = threading.Lock()
+
+    def install(self, engine: Engine) -> None:
+        """Hooks into an engine. One profiler can be installed on several engines."""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _handle_error(self, exception_context):
+        """A failed statement never reaches after_cursor_execute, so drop its start time here."""
+        conn = exception_context.connection
+        if conn is not None and exception_context.statement is not None:
+            start_times = conn.info.get("query_start_time")
+            if start_times:
+                start_times.pop()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+        profile = _current_profile.get()
+        slow = duration_ms >= self.slow_query_ms
+        if profile is None and not slow:
+            return
+
+        plan = None
+        if not executemany and (slow or (profile is not None and profile.enters_slowest(duration_ms))):
+            plan = self._explain(conn, statement, parameters)
+        record = QueryRecord(statement, parameters, duration_ms, plan)
+
+        if profile is not None:
+            profile.record(record)
+        elif slow:
+            self.write_slow_log({"source": "background", "query": record.to_dict()})
+
+    def _explain(self, conn, statement: str, parameters: Any) -> Optional[List[str]]:
+        """EXPLAIN QUERY PLAN of a read statement, LRU-cached per statement text."""
+        if conn.dialect.name != "sqlite" or not statement.lstrip().upper().startswith(EXPLAIN_PREFIXES):
+            return None
+        with self._plans_lock:
+            if statement in self._plans:
+                self._plans.move_to_end(statement)
+                return self._plans[statement]
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plan = [row[-1] for row in cursor.fetchall()]
+        except Exception as e:
+            plan = [f"EXPLAIN failed: {e}"]
+        finally:
+            cursor.close()
+        with self._plans_lock:
+            self._plans[statement] = plan
+            while len(self._plans) > MAX_CACHED_PLANS:
+                self._plans.popitem(last=False)
+        return plan
+
+    def write_slow_log(self, entry: Dict[str, Any]) -> None:
+        if not self.slow_query_log:
+            return
+        line = json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), **entry})
+        with self._log_lock:
+            with open(self.slow_query_log, "a") as f:
+                f.write(line + "\n")
+
+    def start_profile(self, name: str):
+        """Starts collecting queries for a request. Returns the token for finish_profile."""
+        return _current_profile.set(QueryProfile(name))
+
+    def finish_profile(self, token) -> QueryProfile:
+        """Stops collecting, logs the request if it was slow or had an N+1 pattern and returns its profile."""
+        profile = _current_profile.get()
+        _current_profile.reset(token)
+        repeated = profile.repeated(self.n_plus_one_threshold)
+        for statement, count in repeated.items():
+            print(f"Possible N+1 in {profile.name}: statement ran {count} times: {statement[:120]}")
+        if repeated or (profile.slowest and profile.slowest[0].duration_ms >= self.slow_query_ms):
+            self.write_slow_log({
+                "source": profile.name,
+                "count": profile.count,
+                "db_ms": round(profile.total_ms, 3),
+                "n_plus_one": repeated,
+                "slowest": [record.to_dict() for record in profile.slowest],
+            })
+        return profile
+
+
+class QueryProfileMiddleware:
+    """ASGI middleware which profiles the queries of each HTTP request and adds the X-Query-Profile header."""
+
+    def __init__(self, app, profiler: QueryProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = self.profiler.start_profile(f"{scope['method']} {scope['path']}")
+        profile = _current_profile.get()
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_HEADER.lower().encode(), profile.header_value(self.profiler.n_plus_one_threshold).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            self.profiler.finish_profile(token)
@@ -1,5 +1,5 @@
 from enum import Enum
-from sqlalchemy import Column, String, Integer, Text, JSON, create_engine
+from sqlalchemy import Column, String, Integer, Text, JSON, LargeBinary, Index, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.schema import ForeignKey
 
@@ -72,7 +72,7 @@ class Exercise(Base):
 class WorkoutLog(Base):
     __tablename__ = "workout_logs"
 
-    id = Column(String, primary_key=True) # e.g., log_WORKOUT_ROUTINE_ID_TIMESTAMP
+    id = Column(String, primary_key=True) # e.g., log_WORKOUT_ROUTINE_ID_UUID
     workout_routine_id = Column(String) # Reference to the original WorkoutRoutine.id if applicable
     user_id = Column(String, index=True) # To associate logs with a user
     split = Column(String) # The split of the workout
@@ -80,6 +80,7 @@ class WorkoutLog(Base):
     end_time = Column(Integer, nullable=True) # Unix timestamp (milliseconds)
     total_duration_seconds = Column(Integer, nullable=True)
     notes = Column(Text, nullable=True)
+    request_hash = Column(String, nullable=True) # Fingerprint of the logged request, to tell replays from conflicting reuses of an id
 
 class LoggedExercise(Base):
     __tablename__ = "logged_exercises"
@@ -100,3 +101,60 @@ class LoggedExercise(Base):
     status = Column(String) # e.g., 'completed', 'skipped'
     active_work_time_ms = Column(Integer, nullable=True)
 
+
+
+
+# --- Generated Workout Schema ---
+class GeneratedWorkout(Base):
+    __tablename__ = "generated_workouts"
+
+    id = Column(String, primary_key=True) # WorkoutRoutine.id
+    plan_id = Column(String, index=True) # Groups the days generated together in one plan
+    user_id = Column(String, index=True)
+    split = Column(String)
+    scheduled_date = Column(String, index=True) # YYYY-MM-DD
+    routine = Column(JSON) # WorkoutRoutine.model_dump()
+    created_at = Column(Integer) # Unix timestamp (milliseconds)
+
+
+# --- Training History Digest ---
+class HistoryDigest(Base):
+    __tablename__ = "history_digests"
+
+    user_id = Column(String, primary_key=True)
+    digest = Column(JSON) # Compact summary of the user's workout logs, see data/history_digest.py
+    updated_at = Column(Integer) # Unix timestamp (milliseconds)
+
+# --- Exercise Catalog Versions ---
+class CatalogVersion(Base):
+    __tablename__ = "catalog_versions"
+
+    version = Column(String, primary_key=True) # Content hash of the catalog snapshot
+    created_at = Column(Integer) # Unix timestamp (milliseconds)
+    manifest = Column(JSON) # {exercise_id: content hash of the exercise}, used to compute deltas
+
+# --- Wearable Telemetry ---
+class TelemetryChunk(Base):
+    __tablename__ = "telemetry_chunks"
+    # Range queries select the chunks of one session and metric overlapping a time window
+    __table_args__ = (Index("ix_telemetry_chunks_series", "user_id", "session_id", "metric", "start_time", unique=True),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String)
+    session_id = Column(String) # WorkoutLog.id the samples were recorded during
+    metric = Column(String) # TelemetryMetric value, e.g. 'heart_rate'
+    start_time = Column(Integer) # Unix timestamp (milliseconds) of the first sample
+    end_time = Column(Integer) # Unix timestamp (milliseconds) of the last sample
+    sample_count = Column(Integer)
+    timestamps = Column(LargeBinary) # zlib-compressed int32 deltas from start_time, see data/telemetry.py
+    values = Column(LargeBinary) # zlib-compressed int32 deltas of the scaled values
+    created_at = Column(Integer) # Unix timestamp (milliseconds)
+
+
+# --- Schema Versioning ---
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String)
+    applied_at = Column(Integer) # Unix timestamp (milliseconds)
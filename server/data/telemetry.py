@@ -0,0 +1,226 @@
+"""
+Compact time-series storage for wearable telemetry (heart rate, steps, sleep) recorded during workouts.
+
+Samples are uploaded in chunks, and every chunk is stored as one telemetry_chunks row per
+(user, session, metric) instead of one row per sample. A chunk holds two columns of int32 deltas:
+    timestamps  milliseconds since the previous sample, the first relative to start_time
+    values      the value scaled to an integer (METRIC_SCALES) minus the previous one
+Sampled at a steady rate, the deltas are small and repeat, so zlib stores 1 Hz heart rate in about
+1.5 bytes per sample instead of 16 for raw int64/float64 columns. Range queries only load the
+chunks overlapping the window, found through the series index on (user_id, session_id, metric,
+start_time), and decode them straight into NumPy arrays.
+
+analyze_set_heart_rate joins the heart rate of a session to its logged sets through their startTime
+and endTime, for per-set intensity and the recovery during the rest after each set.
+
+NumPy is optional: without it telemetry_available() is False and the telemetry endpoints report so.
+"""
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from data.schema import TelemetryChunk
+from models import SetHeartRate, TelemetryMetric
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, telemetry is unavailable without it
+    np = None
+
+# Values are stored as integers in units of 1 / scale, e.g. heart rate to 0.1 bpm
+METRIC_SCALES: Dict[TelemetryMetric, int] = {
+    TelemetryMetric.HEART_RATE: 10,
+    TelemetryMetric.STEPS: 1,
+    TelemetryMetric.SLEEP_STAGE: 1,
+}
+# A day of 1 Hz samples; longer recordings are uploaded in several chunks
+MAX_CHUNK_SAMPLES = 86_400
+DELTA_DTYPE = "<i4"
+INT32_MAX = 2**31 - 1
+COMPRESSION_LEVEL = 6
+# Recovery is measured over the rest after a set, up to the next set's start or this long
+RECOVERY_WINDOW_MS = 60_000
+
+
+def telemetry_available() -> bool:
+    return np is not None
+
+
+def _encode_deltas(array: "np.ndarray", first: int = 0) -> bytes:
+    """Delta-encodes an int64 array (the first delta relative to `first`) as zlib-compressed int32."""
+    deltas = np.diff(array, prepend=first)
+    if deltas.size and np.abs(deltas).max() > INT32_MAX:
+        raise ValueError("Telemetry samples are too far apart for one chunk, split the upload.")
+    return zlib.compress(deltas.astype(DELTA_DTYPE).tobytes(), COMPRESSION_LEVEL)
+
+
+def _decode_deltas(data: bytes, first: int = 0) -> "np.ndarray":
+    """Inverse of _encode_deltas, as int64."""
+    deltas = np.frombuffer(zlib.decompress(data), dtype=DELTA_DTYPE).astype(np.int64)
+    deltas[:1] += first
+    return np.cumsum(deltas)
+
+
+def encode_chunk(metric: TelemetryMetric, timestamps: Sequence[int], values: Sequence[float]) -> Tuple[int, int, bytes, bytes]:
+    """
+    Validates and encodes the samples of one chunk.
+    Returns (start_time, end_time, encoded timestamps, encoded values). Raises ValueError for invalid samples.
+    """
+    if len(timestamps) != len(values):
+        raise ValueError("timestamps and values must have the same length.")
+    if not timestamps:
+        raise ValueError("A telemetry chunk needs at least one sample.")
+    if len(timestamps) > MAX_CHUNK_SAMPLES:
+        raise ValueError(f"A telemetry chunk holds at most {MAX_CHUNK_SAMPLES} samples.")
+
+    times = np.asarray(timestamps, dtype=np.int64)
+    if np.any(np.diff(times) < 0):
+        raise ValueError("Telemetry timestamps must be in ascending order.")
+    scaled = np.asarray(values, dtype=np.float64) * METRIC_SCALES[metric]
+    if not np.all(np.isfinite(scaled)) or np.abs(scaled).max() > INT32_MAX // 2:
+        raise ValueError(f"Invalid {metric.value} values.")
+
+    start_time = int(times[0])
+    return start_time, int(times[-1]), _encode_deltas(times, start_time), _encode_deltas(np.rint(scaled).astype(np.int64))
+
+
+def decode_chunk(chunk: TelemetryChunk) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Decodes a stored chunk into (int64 millisecond timestamps, float64 values)."""
+    times = _decode_deltas(chunk.timestamps, chunk.start_time)
+    values = _decode_deltas(chunk.values) / METRIC_SCALES[TelemetryMetric(chunk.metric)]
+    return times, values
+
+
+def save_telemetry_chunk(db: Session,
+                         user_id: str,
+                         session_id: str,
+                         metric: TelemetryMetric,
+                         timestamps: Sequence[int],
+                         values: Sequence[float]) -> Optional[TelemetryChunk]:
+    """
+    Stores one uploaded chunk. A chunk uploaded again (same session, metric and first sample)
+    replaces the stored one, so retried uploads are idempotent.
+    Raises ValueError for invalid samples, returns None when the database write fails.
+    """
+    start_time, end_time, encoded_times, encoded_values = encode_chunk(metric, timestamps, values)
+    try:
+        chunk = db.query(TelemetryChunk).filter(
+            TelemetryChunk.user_id == user_id,
+            TelemetryChunk.session_id == session_id,
+            TelemetryChunk.metric == metric.value,
+            TelemetryChunk.start_time == start_time
+        ).first()
+        if chunk is None:
+            chunk = TelemetryChunk(user_id=user_id, session_id=session_id, metric=metric.value, start_time=start_time)
+            db.add(chunk)
+        chunk.end_time = end_time
+        chunk.sample_count = len(timestamps)
+        chunk.timestamps = encoded_times
+        chunk.values = encoded_values
+        chunk.created_at = int(time.time() * 1000)
+        db.commit()
+        return chunk
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Error saving telemetry chunk: {e}")
+        return None
+
+
+def read_telemetry(db: Session,
+                   user_id: str,
+                   session_id: str,
+                   metric: TelemetryMetric,
+                   start_ms: Optional[int] = None,
+                   end_ms: Optional[int] = None) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Returns the samples of a session and metric with start_ms <= timestamp < end_ms as
+    (int64 millisecond timestamps, float64 values), ascending. Only overlapping chunks are decoded.
+    """
+    try:
+        query = db.query(TelemetryChunk).filter(
+            TelemetryChunk.user_id == user_id,
+            TelemetryChunk.session_id == session_id,
+            TelemetryChunk.metric == metric.value
+        )
+        if start_ms is not None:
+            query = query.filter(TelemetryChunk.end_time >= start_ms)
+        if end_ms is not None:
+            query = query.filter(TelemetryChunk.start_time < end_ms)
+        chunks = query.order_by(TelemetryChunk.start_time).all()
+    except SQLAlchemyError as e:
+        print(f"Error reading telemetry: {e}")
+        chunks = []
+
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    decoded = [decode_chunk(chunk) for chunk in chunks]
+    times = np.concatenate([chunk_times for chunk_times, _ in decoded])
+    values = np.concatenate([chunk_values for _, chunk_values in decoded])
+
+    # Chunks ordered by their first sample only interleave when uploads overlapped
+    if np.any(np.diff(times) < 0):
+        order = np.argsort(times, kind="stable")
+        times, values = times[order], values[order]
+    lo = np.searchsorted(times, start_ms, side="left") if start_ms is not None else 0
+    hi = np.searchsorted(times, end_ms, side="left") if end_ms is not None else len(times)
+    return times[lo:hi], values[lo:hi]
+
+
+def downsample(timestamps: "np.ndarray", values: "np.ndarray", bucket_ms: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Averages the samples over fixed buckets of bucket_ms, for charts. Empty buckets are left out."""
+    if not len(timestamps):
+        return timestamps, values
+    buckets = timestamps // bucket_ms
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    counts = np.diff(np.append(starts, len(values)))
+    return buckets[starts] * bucket_ms, np.add.reduceat(values, starts) / counts
+
+
+def _set_intervals(logged_exercises: List[Any]) -> List[Tuple[int, int, str, int]]:
+    """(startTime, endTime, exercise_id, set_number) of the logged sets with both times, in time order."""
+    intervals = []
+    for ex in logged_exercises:
+        for logged_set in ex.sets or []:
+            start, end = logged_set.get("startTime"), logged_set.get("endTime")
+            if start is not None and end is not None and end >= start:
+                intervals.append((start, end, ex.exercise_id, logged_set.get("set_number")))
+    intervals.sort()
+    return intervals
+
+
+def analyze_set_heart_rate(timestamps: "np.ndarray", values: "np.ndarray", logged_exercises: List[Any]) -> List[SetHeartRate]:
+    """
+    Per-set heart rate of a session: average and peak during each set, and the heart rate at the
+    end of the following rest (until the next set starts, at most RECOVERY_WINDOW_MS).
+    logged_exercises are LoggedExercise rows of the session, their sets hold the set times.
+    """
+    intervals = _set_intervals(logged_exercises)
+    if not intervals:
+        return []
+    starts = np.array([start for start, _, _, _ in intervals], dtype=np.int64)
+    ends = np.array([end for _, end, _, _ in intervals], dtype=np.int64)
+    next_starts = np.append(starts[1:], np.iinfo(np.int64).max)
+    rest_ends = np.where(next_starts > ends, np.minimum(ends + RECOVERY_WINDOW_MS, next_starts), ends)
+
+    # Sample ranges of all sets at once: [lo, hi) during the set, rest_last the last sample of the rest
+    lo = np.searchsorted(timestamps, starts, side="left")
+    hi = np.searchsorted(timestamps, ends, side="right")
+    rest_last = np.searchsorted(timestamps, rest_ends, side="right") - 1
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+
+    results = []
+    for i, (start, end, exercise_id, set_number) in enumerate(intervals):
+        samples = int(hi[i] - lo[i])
+        stats = SetHeartRate(exercise_id=exercise_id, set_number=set_number, startTime=start, endTime=end, samples=samples)
+        if samples:
+            stats.avgHeartRate = round(float((sums[hi[i]] - sums[lo[i]]) / samples), 1)
+            stats.maxHeartRate = float(values[lo[i]:hi[i]].max())
+            if rest_last[i] >= hi[i]:
+                stats.recoveryHeartRate = float(values[rest_last[i]])
+                stats.heartRateRecovery = round(stats.maxHeartRate - stats.recoveryHeartRate, 1)
+                stats.restSeconds = round((int(timestamps[rest_last[i]]) - end) / 1000, 1)
+        results.append(stats)
+    return results
@@ -0,0 +1,411 @@
+"""
+Write-behind path for workout logs.
+
+An accepted LogWorkoutRequest is appended to an on-disk journal and fsynced before the API
+acknowledges it, then a background task group-commits the queued logs to the database.
+
+Each process appends to its own journal segment and holds an flock on it while it runs. On
+startup, segments whose lock can be taken belong to a process that exited, and their entries are
+replayed. Replays are idempotent because the log id is assigned when the log is submitted and
+journaled with it, and create_workout_logs skips logs that already exist. A client retrying a
+request sends the same idempotency key, which maps to the same log id; reusing a key for a
+different workout is rejected as a conflict, or dead-lettered when only found at commit time.
+
+A batch is split by partition (the user's storage shard) and the partitions are committed in
+parallel, each in its own transaction on its own database.
+
+Transient database errors (locks, lost connections, pool timeouts) are retried with backoff up to
+max_attempts times. If they persist, the segment is kept on disk when it is rotated and replayed
+later. Any other error falls back to committing the partition's logs one at a time, and logs that
+still fail are moved to the dead-letter file, so one bad log cannot block the logs queued behind it.
+Dead-lettered logs are skipped when a kept segment is replayed, so they are only recorded once.
+"""
+import asyncio
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import DisconnectionError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+
+from data.queries import (WorkoutLogConflictError, check_workout_log_replay, create_workout_logs,
+                          get_workout_log_by_id, make_workout_log_id)
+from models import LogWorkoutRequest
+
+SEGMENT_GLOB = "segment-*.jsonl"
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+# Errors worth retrying: the same commit can succeed once the lock, connection or pool frees up
+TRANSIENT_ERRORS = (OperationalError, DisconnectionError, PoolTimeoutError)
+MAX_RETRY_INTERVAL = 30.0
+
+# (user_id, log_id, request) of an accepted workout log
+JournalEntry = Tuple[str, str, LogWorkoutRequest]
+
+
+class WorkoutLogJournal:
+    """Append-only journal segment of accepted workout logs, owned by the current process."""
+
+    def __init__(self, journal_dir: str):
+        self.journal_dir = journal_dir
+        os.makedirs(journal_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = None
+        self._open_segment()
+
+    def _open_segment(self) -> None:
+        self.segment_path = os.path.join(self.journal_dir, f"segment-{os.getpid()}-{time.time_ns()}.jsonl")
+        self._file = open(self.segment_path, "ab")
+        # Held for the life of the segment, so other processes know it is not orphaned
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, user_id: str, log_id: str, request: LogWorkoutRequest) -> None:
+        """Durably appends an entry; it survives a crash once this returns."""
+        line = json.dumps({"user_id": user_id, "log_id": log_id, "request": request.model_dump(mode="json")})
+        with self._lock:
+            self._file.write(line.encode() + b"\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def rotate(self, keep: bool = False) -> None:
+        """
+        Starts a new segment and deletes the current one. Only call when no entry is queued.
+        With keep, the old segment stays on disk unlocked, so its uncommitted entries are replayed.
+        """
+        with self._lock:
+            old_file, old_path = self._file, self.segment_path
+            self._open_segment()
+            if not keep:
+                os.remove(old_path)
+            old_file.close()
+
+    def dead_letter(self, user_id: str, log_id: str, request: LogWorkoutRequest, error: Exception) -> None:
+        """Durably records a log that cannot be committed, for inspection. Dead letters are never replayed."""
+        line = json.dumps({
+            "user_id": user_id,
+            "log_id": log_id,
+            "error": f"{type(error).__name__}: {error}",
+            "failed_at": int(time.time() * 1000),
+            "request": request.model_dump(mode="json"),
+        })
+        with self._lock:
+            with open(os.path.join(self.journal_dir, DEAD_LETTER_FILE), "ab") as f:
+                f.write(line.encode() + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def close(self, remove: bool = False) -> None:
+        """Closes the segment, removing it when every entry is committed."""
+        with self._lock:
+            self._file.close()
+            if remove:
+                os.remove(self.segment_path)
+
+
+class JournalIndex:
+    """
+    Log ids of journal files, read incrementally: every lookup only parses the lines appended since
+    the previous one, so status requests do not rescan whole segments and the dead-letter file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # path -> (bytes read so far, log ids of those lines)
+        self._files: Dict[str, Tuple[int, Set[str]]] = {}
+
+    def log_ids(self, path: str) -> Set[str]:
+        """The ids of the log entries in a journal file, empty if it does not exist."""
+        with self._lock:
+            offset, log_ids = self._files.get(path, (0, set()))
+            try:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break  # Torn line of a segment being written, read again next time
+                        offset += len(line)
+                        try:
+                            log_ids.add(json.loads(line)["log_id"])
+                        except (ValueError, KeyError):
+                            continue
+            except FileNotFoundError:
+                self._files.pop(path, None)  # Rotated away meanwhile
+                return set()
+            self._files[path] = (offset, log_ids)
+            return log_ids
+
+    def retain(self, paths: Iterable[str]) -> None:
+        """Forgets the files not in paths, e.g. rotated segments."""
+        paths = set(paths)
+        with self._lock:
+            for path in [path for path in self._files if path not in paths]:
+                del self._files[path]
+
+
+def read_segment(path: str) -> List[JournalEntry]:
+    """Reads the (user_id, log_id, request) entries of a segment, ignoring a torn last line from a crash."""
+    entries = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                entries.append((entry["user_id"], entry["log_id"], LogWorkoutRequest.model_validate(entry["request"])))
+            except (ValueError, KeyError) as e:
+                print(f"Skipping unreadable journal entry in {path}: {e}")
+    return entries
+
+
+class WriteBehindWorker:
+    """Queues journaled workout logs and group-commits them to the database in the background."""
+
+    def __init__(self,
+                 session_factory: Callable[[str], Session],
+                 journal_dir: str,
+                 partition: Callable[[str], Any] = lambda user_id: 0,
+                 batch_size: int = 64,
+                 flush_interval: float = 0.05,
+                 retry_interval: float = 1.0,
+                 max_attempts: int = 5,
+                 replay_interval: float = 60.0):
+        """
+        session_factory returns a session for a user id, partition maps a user id to its database.
+        Transient errors are retried max_attempts times, backing off from retry_interval; segments
+        kept after that are replayed every replay_interval seconds while the queue is idle.
+        """
+        self.session_factory = session_factory
+        self.partition = partition
+        self.journal_dir = journal_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.max_attempts = max_attempts
+        self.replay_interval = replay_interval
+        self.pending: Dict[str, JournalEntry] = {}
+        # The current segment holds entries that were given up on and must be kept when rotating
+        self._keep_segment = False
+        # Segments were kept on disk and are waiting to be replayed
+        self._unreplayed = False
+        self._journal: Optional[WorkoutLogJournal] = None
+        self._index = JournalIndex()
+        self._dead_letter_path = os.path.join(journal_dir, DEAD_LETTER_FILE)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Replays orphaned journal segments, then starts the background commit task."""
+        self._journal = WorkoutLogJournal(self.journal_dir)
+        self._queue = asyncio.Queue()
+        await asyncio.to_thread(self.recover)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Commits everything still queued and stops the background task."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._journal.close(remove=not self.pending and not self._keep_segment)
+
+    async def submit(self, user_id: str, request: LogWorkoutRequest, idempotency_key: Optional[str] = None) -> str:
+        """
+        Journals a workout log and queues it for commit. Returns the log id.
+        A retry with the same idempotency key returns the id of the log already queued or saved;
+        reusing the key for a different workout raises WorkoutLogConflictError.
+        """
+        log_id = make_workout_log_id(user_id, request, idempotency_key)
+        if idempotency_key and await asyncio.to_thread(self._is_saved, user_id, log_id, request):
+            return log_id
+        if log_id in self.pending:
+            if self.pending[log_id][2] != request:
+                raise WorkoutLogConflictError(log_id)
+            return log_id
+        # Registered as pending before the append, so the journal is never rotated under it
+        self.pending[log_id] = (user_id, log_id, request)
+        try:
+            await asyncio.to_thread(self._journal.append, user_id, log_id, request)
+        except OSError:
+            del self.pending[log_id]
+            raise
+        self._queue.put_nowait(log_id)
+        return log_id
+
+    def _is_saved(self, user_id: str, log_id: str, request: LogWorkoutRequest) -> bool:
+        """Whether the log is already saved from this request. Raises WorkoutLogConflictError if it was saved from another."""
+        db = self.session_factory(user_id)
+        try:
+            existing = get_workout_log_by_id(db, log_id, user_id)
+        finally:
+            db.close()
+        if existing is None:
+            return False
+        check_workout_log_replay(existing, request)
+        return True
+
+    def status(self, log_id: str) -> Optional[str]:
+        """'pending' if the log is queued in this process, None otherwise."""
+        return "pending" if log_id in self.pending else None
+
+    def journal_status(self, log_id: str) -> Optional[str]:
+        """
+        Looks the log up in the journal files shared by every process: 'pending' if a segment holds it
+        (queued in another worker, or kept for replay), 'failed' if it was dead-lettered, None otherwise.
+        Ask the database first, a committed log can still be in a segment until it is rotated.
+        """
+        segments = glob.glob(os.path.join(self.journal_dir, SEGMENT_GLOB))
+        self._index.retain(segments + [self._dead_letter_path])
+        for path in segments:
+            if log_id in self._index.log_ids(path):
+                return "pending"
+        if log_id in self._index.log_ids(self._dead_letter_path):
+            return "failed"
+        return None
+
+    def recover(self) -> int:
+        """Commits the entries of journal segments left behind by processes that exited. Returns the number of logs written."""
+        written = 0
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, SEGMENT_GLOB))):
+            if path == self._journal.segment_path:
+                continue
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue  # Replayed and removed by another process
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # Owned by a running process
+                dead_lettered = self._index.log_ids(self._dead_letter_path)
+                entries = [entry for entry in read_segment(path) if entry[1] not in dead_lettered]
+                try:
+                    for group in self._partitions(entries):
+                        try:
+                            written += len(self._commit(group))
+                        except TRANSIENT_ERRORS:
+                            raise
+                        except Exception as e:
+                            print(f"Error replaying workout log batch, committing its logs one by one: {e}")
+                            written += len(self._commit_each(group))
+                except Exception as e:
+                    print(f"Error replaying journal segment {path}, keeping it for a later replay: {e}")
+                    self._unreplayed = True
+                    continue
+                os.remove(path)
+            finally:
+                os.close(fd)
+        if written:
+            print(f"Replayed {written} workout logs from the journal.")
+        return written
+
+    def _partitions(self, entries: List[JournalEntry]) -> List[List[JournalEntry]]:
+        groups: Dict[Any, List[JournalEntry]] = {}
+        for entry in entries:
+            groups.setdefault(self.partition(entry[0]), []).append(entry)
+        return list(groups.values())
+
+    def _commit(self, entries: List[JournalEntry]) -> List[str]:
+        """Commits the entries of one partition in a single transaction."""
+        db = self.session_factory(entries[0][0])
+        try:
+            return create_workout_logs(db, entries)
+        finally:
+            db.close()
+
+    def _commit_each(self, entries: List[JournalEntry]) -> List[str]:
+        """Commits the entries one per transaction, dead-lettering the ones that fail. Returns the ids written."""
+        written = []
+        for user_id, log_id, request in entries:
+            try:
+                written += self._commit([(user_id, log_id, request)])
+            except Exception as e:
+                print(f"Error committing workout log {log_id}, moving it to the dead-letter file: {e}")
+                self._journal.dead_letter(user_id, log_id, request, e)
+        return written
+
+    async def _commit_partition(self, entries: List[JournalEntry]) -> None:
+        """
+        Commits one partition, retrying only that partition while the others go ahead.
+        Transient errors are retried with backoff; when they persist the entries are left in the
+        journal for a later replay. Other errors isolate the failing logs with _commit_each.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await asyncio.to_thread(self._commit, entries)
+                return
+            except TRANSIENT_ERRORS as e:
+                print(f"Error committing workout log batch (attempt {attempt}/{self.max_attempts}): {e}")
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(min(self.retry_interval * 2 ** (attempt - 1), MAX_RETRY_INTERVAL))
+            except Exception as e:
+                print(f"Error committing workout log batch, committing its logs one by one: {e}")
+                await asyncio.to_thread(self._commit_each, entries)
+                return
+        print(f"Giving up on {len(entries)} workout logs for now, they stay in the journal for a later replay.")
+        self._keep_segment = True
+
+    async def _replay_kept_segments(self) -> None:
+        self._unreplayed = False
+        try:
+            await asyncio.to_thread(self.recover)
+        except Exception as e:
+            print(f"Error replaying the workout log journal: {e}")
+            self._unreplayed = True
+
+    async def _next_batch(self) -> List[str]:
+        """
+        Waits for the first queued log, then collects more for up to flush_interval.
+        While segments are waiting to be replayed, they are retried whenever the queue is idle for replay_interval.
+        """
+        while True:
+            try:
+                if self._unreplayed:
+                    first = await asyncio.wait_for(self._queue.get(), self.replay_interval)
+                else:
+                    first = await self._queue.get()
+                break
+            except asyncio.TimeoutError:
+                await self._replay_kept_segments()
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                groups = self._partitions([self.pending[log_id] for log_id in batch])
+                await asyncio.gather(*[self._commit_partition(group) for group in groups])
+            except Exception as e:
+                # The worker must survive: the batch stays in the journal and is replayed later
+                print(f"Error in the workout log writer, keeping the batch for a later replay: {e}")
+                self._keep_segment = True
+            finally:
+                for log_id in batch:
+                    self.pending.pop(log_id, None)
+                    self._queue.task_done()
+            # Checked and rotated without yielding to the event loop, so no submit can slip in between
+            if not self.pending:
+                try:
+                    self._journal.rotate(keep=self._keep_segment)
+                except OSError as e:
+                    print(f"Error rotating the workout log journal: {e}")
+                    continue
+                if self._keep_segment:
+                    self._keep_segment = False
+                    self._unreplayed = True
@@ -0,0 +1,221 @@
+# server/llm/agents/local_workout_agent.py
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from models import Exercise, WorkoutRoutine, WorkoutSplit
+from llm.agents.base_agent import BaseAgent
+from data.history_digest import get_muscle_fatigue
+from data.compiled_catalog import get_compiled_catalog
+
+# Muscle groups each split should cover, in order of priority
+SPLIT_TARGET_MUSCLES: Dict[WorkoutSplit, List[str]] = {
+    WorkoutSplit.PUSH: ["chest", "shoulders", "triceps"],
+    WorkoutSplit.PULL: ["lats", "middle back", "biceps"],
+    WorkoutSplit.LEGS: ["quadriceps", "hamstrings", "glutes", "calves"],
+    WorkoutSplit.ABS: ["abdominals", "lower back"],
+    WorkoutSplit.FULL_BODY: ["chest", "lats", "quadriceps", "hamstrings", "shoulders"],
+}
+
+# Compound exercises wanted in a routine per split, the remaining slots go to isolation exercises
+SPLIT_COMPOUND_COUNT: Dict[WorkoutSplit, int] = {
+    WorkoutSplit.PUSH: 3,
+    WorkoutSplit.PULL: 3,
+    WorkoutSplit.LEGS: 3,
+    WorkoutSplit.ABS: 2,
+    WorkoutSplit.FULL_BODY: 5,
+}
+
+# Starting weight for exercises the user has no history for
+DEFAULT_WEIGHT_LBS = {
+    "barbell": 65,
+    "e-z curl bar": 40,
+    "dumbbell": 20,
+    "kettlebells": 25,
+    "cable": 30,
+    "machine": 50,
+    "body only": 0,
+}
+PREFERRED_EQUIPMENT = {"barbell", "dumbbell", "cable", "machine", "body only", "e-z curl bar"}
+
+TIME_BUDGET_SECONDS = 45 * 60
+SECONDS_PER_REP = 3
+SET_SETUP_SECONDS = 15
+EXERCISE_TRANSITION_SECONDS = 90
+WEIGHT_INCREMENT_LBS = 5
+# Primary muscles above this fatigue get one set less and no weight increase
+HIGH_FATIGUE = 6.0
+
+
+class Prescription:
+    """Sets, reps and rest for a selected exercise, trimmed until the routine fits the time budget."""
+    __slots__ = ("exercise", "compound", "sets", "min_sets", "rep_range", "rest_seconds", "min_rest_seconds")
+
+    def __init__(self, exercise: Any, compound: bool, fatigued: bool):
+        self.exercise = exercise
+        self.compound = compound
+        self.sets = (4 if compound else 3) - (1 if fatigued else 0)
+        self.min_sets = min(self.sets, 3 if compound else 2)
+        self.rep_range = (6, 8) if compound else (10, 12)
+        self.rest_seconds = 120 if compound else 60
+        self.min_rest_seconds = 90 if compound else 45
+
+    @property
+    def seconds(self) -> int:
+        work = self.rep_range[1] * SECONDS_PER_REP + SET_SETUP_SECONDS
+        return self.sets * (work + self.rest_seconds) + EXERCISE_TRANSITION_SECONDS
+
+
+class LocalWorkoutGeneratorAgent(BaseAgent):
+    """
+    Deterministic, LLM-free workout generator.
+    Used for the quick mode and as the fallback when the LLM fails or returns an empty routine.
+    """
+
+    async def execute(self, **kwargs) -> WorkoutRoutine:
+        """
+        Generate a workout routine from the catalog candidates without calling the LLM.
+
+        Args:
+            split: Workout split type
+            primary_exercises: List of main exercises (Exercise rows or ExerciseOption read models) to pick from
+            history: The user's training history digest (optional)
+            recent_exercise_ids: Exercises of the user's latest workouts, avoided if possible (optional)
+            planned_exercise_ids: Exercises already chosen for other days of the same plan, avoided more strongly (optional)
+            max_exercises: Exercises in the routine, 4-5 (optional)
+            now: The day the workout is for, e.g. a plan day's scheduled date (optional, defaults to now)
+
+        Returns:
+            Generated WorkoutRoutine
+        """
+        return self.generate(
+            split=kwargs.get('split'),
+            primary_exercises=kwargs.get('primary_exercises', []),
+            history=kwargs.get('history'),
+            recent_exercise_ids=kwargs.get('recent_exercise_ids', []),
+            planned_exercise_ids=kwargs.get('planned_exercise_ids', []),
+            max_exercises=kwargs.get('max_exercises', 5),
+            now=kwargs.get('now')
+        )
+
+    def generate(self,
+                 split: Optional[WorkoutSplit],
+                 primary_exercises: List[Any],
+                 history: Optional[Dict[str, Any]] = None,
+                 recent_exercise_ids: Optional[List[str]] = None,
+                 max_exercises: int = 5,
+                 now: Optional[datetime] = None,
+                 planned_exercise_ids: Optional[List[str]] = None) -> WorkoutRoutine:
+        """
+        Synchronous generation, it only does in-memory work on the candidates.
+        The selection is seeded by the day of `now`, so each day of a plan gets its own variation.
+        """
+        split = split or WorkoutSplit.PUSH
+        now = now or datetime.now()
+        history = history or {}
+        fatigue = get_muscle_fatigue(history, int(now.timestamp() * 1000))
+        exercise_history = history.get("exercises", {})
+
+        candidates = [ex for ex in primary_exercises if ex.category == "strength"] or list(primary_exercises)
+        selected = self._select(split, candidates, fatigue, exercise_history, set(recent_exercise_ids or []),
+                                set(planned_exercise_ids or []), max_exercises, seed=f"{now.strftime('%Y-%m-%d')}:{split.value}")
+        prescriptions = [
+            Prescription(ex, ex.mechanic == "compound", any(fatigue.get(m, 0.0) >= HIGH_FATIGUE for m in ex.primary_muscles or []))
+            for ex in selected
+        ]
+        prescriptions = self._fit_time_budget(prescriptions)
+
+        routine = [self._to_exercise(p, exercise_history.get(p.exercise.id), fatigue) for p in prescriptions]
+        minutes = round(sum(p.seconds for p in prescriptions) / 60)
+        covered = [m for m in SPLIT_TARGET_MUSCLES[split] if any(m in (p.exercise.primary_muscles or []) for p in prescriptions)]
+        insight = f"Quick {split.value.replace('_', ' ').lower()} session covering {', '.join(covered) or 'the split'} in about {minutes} minutes."
+        if any(p.exercise.id in exercise_history for p in prescriptions):
+            insight += " Target weights build on your recent sets."
+        return WorkoutRoutine(id="", date=now.strftime("%Y-%m-%d"), ai_insight=insight, routine=routine)
+
+    def _select(self,
+                split: WorkoutSplit,
+                candidates: List[Any],
+                fatigue: Dict[str, float],
+                exercise_history: Dict[str, Any],
+                recent: Set[str],
+                planned: Set[str],
+                max_exercises: int,
+                seed: str) -> List[Any]:
+        """Greedily picks compounds first, then isolation, scoring each candidate against what is already covered."""
+        targets = SPLIT_TARGET_MUSCLES[split]
+        compound_count = min(SPLIT_COMPOUND_COUNT[split], max_exercises)
+        selected: List[Any] = []
+        covered: Dict[str, int] = {}
+
+        def score(ex: Any) -> float:
+            muscles = ex.primary_muscles or []
+            value = sum(3.0 for m in muscles if m in targets and m not in covered)
+            value += 1.0 if any(m in targets for m in muscles) else -2.0
+            value -= sum(1.5 * covered.get(m, 0) for m in muscles)
+            value -= 0.3 * max((fatigue.get(m, 0.0) for m in muscles), default=0.0)
+            value -= 5.0 if ex.id in recent else 0.0
+            value -= 8.0 if ex.id in planned else 0.0
+            value += 1.0 if ex.id in exercise_history else 0.0
+            value += 0.5 if ex.equipment in PREFERRED_EQUIPMENT else 0.0
+            value -= 1.0 if ex.level == "expert" else 0.0
+            # Stable jitter so the routine varies from day to day but is reproducible
+            return value + zlib.crc32(f"{seed}:{ex.id}".encode()) / 2**32
+
+        for slot in range(max_exercises):
+            wants_compound = slot < compound_count
+            pool = [ex for ex in candidates if ex not in selected and (ex.mechanic == "compound") == wants_compound]
+            pool = pool or [ex for ex in candidates if ex not in selected]
+            if not pool:
+                break
+            best = max(pool, key=score)
+            selected.append(best)
+            for m in best.primary_muscles or []:
+                covered[m] = covered.get(m, 0) + 1
+        return selected
+
+    def _fit_time_budget(self, prescriptions: List[Prescription]) -> List[Prescription]:
+        """Shortens rests, then removes sets, then drops the last exercise (keeping 4) until the routine fits."""
+        def total() -> int:
+            return sum(p.seconds for p in prescriptions)
+
+        for p in prescriptions:
+            if total() <= TIME_BUDGET_SECONDS:
+                return prescriptions
+            p.rest_seconds = p.min_rest_seconds
+        while total() > TIME_BUDGET_SECONDS:
+            reducible = [p for p in prescriptions if p.sets > p.min_sets]
+            if reducible:
+                max(reducible, key=lambda p: p.sets).sets -= 1
+            elif len(prescriptions) > 4:
+                prescriptions = prescriptions[:-1]
+            else:
+                break
+        return prescriptions
+
+    def _to_exercise(self, p: Prescription, history_entry: Optional[Dict[str, Any]], fatigue: Dict[str, float]) -> Exercise:
+        low, high = p.rep_range
+        weight = DEFAULT_WEIGHT_LBS.get(p.exercise.equipment, 20)
+        last = history_entry.get("last") if history_entry else None
+        if last and last[0] is not None:
+            last_weight, last_reps = last
+            weight = int(last_weight)
+            fatigued = any(fatigue.get(m, 0.0) >= HIGH_FATIGUE for m in p.exercise.primary_muscles or [])
+            if last_reps is not None and last_reps >= high and not fatigued:
+                weight += WEIGHT_INCREMENT_LBS
+            elif last_reps is not None and last_reps < low:
+                weight = max(weight - WEIGHT_INCREMENT_LBS, 0)
+
+        # Candidates are lean read models without instructions, the tip comes from the compiled catalog
+        catalog_exercise = get_compiled_catalog().get(p.exercise.id)
+        instructions = catalog_exercise.instructions if catalog_exercise else []
+        return Exercise(
+            id=p.exercise.id,
+            name=p.exercise.name,
+            target_sets=p.sets,
+            target_reps=f"{low}-{high}",
+            target_weight_lbs=weight,
+            rest_period_seconds=p.rest_seconds,
+            tip=instructions[0] if instructions else None,
+            focus_groups=[m.title() for m in p.exercise.primary_muscles or []] or None
+        )
@@ -22,6 +22,7 @@ class WorkoutGeneratorAgent(BaseAgent):
             split: Workout split type
             stretching_exercises: List of stretching exercises
             primary_exercises: List of main exercises
+            history_digest: Rendered training history digest (optional)
             
         Returns:
             Generated WorkoutRoutine
@@ -30,13 +31,15 @@ class WorkoutGeneratorAgent(BaseAgent):
         split = kwargs.get('split')
         stretching_exercises = kwargs.get('stretching_exercises', [])
         primary_exercises = kwargs.get('primary_exercises', [])
+        history_digest = kwargs.get('history_digest')
         
         # Build the context for the model
         context = self._build_context(
             prompt=prompt, 
             split=split, 
             stretching_exercises=stretching_exercises,
-            primary_exercises=primary_exercises
+            primary_exercises=primary_exercises,
+            history_digest=history_digest
         )
         
         # Get the response from the LLM
@@ -50,34 +53,17 @@ class WorkoutGeneratorAgent(BaseAgent):
                      prompt: str, 
                      split: Optional[WorkoutSplit],
                      stretching_exercises: List[Exercise],
-                     primary_exercises: List[Exercise]) -> str:
+                     primary_exercises: List[Exercise],
+                     history_digest: Optional[str] = None) -> str:
         """Build the prompt context for the LLM model."""
         # Format the available exercises as JSON
-        stretching_json = json.dumps([{
-            "id": ex.id,
-            "name": ex.name,
-            "force": ex.force,
-            "level": ex.level,
-            "equipment": ex.equipment,
-            "primary_muscles": ex.primary_muscles,
-        } for ex in (stretching_exercises or [])])
+        stretching_json = json.dumps(self._format_exercise_options(stretching_exercises))
         
-        primary_json = json.dumps([{
-            "id": ex.id,
-            "name": ex.name,
-            "force": ex.force,
-            "level": ex.level,
-            "equipment": ex.equipment,
-            "primary_muscles": ex.primary_muscles,
-        } for ex in (primary_exercises or [])])
+        primary_json = json.dumps(self._format_exercise_options(primary_exercises))
         
         # Build the model prompt
         # We already specify the response schema for Gemini
-        focus_groups = []
-        if split and split.value == WorkoutSplit.PUSH:
-            focus_groups = ["Chest", "Shoulders", "Triceps"]
-        elif split and split.value == WorkoutSplit.PULL:
-            focus_groups = ["Back", "Biceps", "Forearms"]
+        focus_groups = self._focus_groups(split)
         context = f"""
         Create a workout routine for the user based on the following information:
         
@@ -85,7 +71,7 @@ class WorkoutGeneratorAgent(BaseAgent):
         Workout split: {split.value if split else 'Not specified'}
         Workout focus groups: {", ".join(focus_groups) if focus_groups else 'Not specified'}
         User preferences: {prompt}
-        
+        {self._format_history(history_digest)}
         The data below is the relevant exercises from the exercises.json file. ONLY SELECT EXERCISES FROM THIS LIST AND USE THE EXERCISE IDS PROVIDED.
 
         Available primary exercises for this split:
@@ -107,7 +93,35 @@ class WorkoutGeneratorAgent(BaseAgent):
         """
         
         return context
+
+    def _format_history(self, history_digest: Optional[str]) -> str:
+        """Prompt section with the user's training history digest, empty when there is no history."""
+        if not history_digest:
+            return ""
+        return f"""
+        Recent training history (exercise ids with top sets as lbs x reps). Base target weights on it and go easy on fatigued muscles:
+        {history_digest}
+        """
     
+    def _format_exercise_options(self, exercises: List[Any]) -> List[Dict[str, Any]]:
+        """Reduce catalog exercises to the attributes the model needs to pick from them."""
+        return [{
+            "id": ex.id,
+            "name": ex.name,
+            "force": ex.force,
+            "level": ex.level,
+            "equipment": ex.equipment,
+            "primary_muscles": ex.primary_muscles,
+        } for ex in (exercises or [])]
+
+    def _focus_groups(self, split: Optional[WorkoutSplit]) -> List[str]:
+        """Muscle groups to emphasize for a split."""
+        if split and split.value == WorkoutSplit.PUSH:
+            return ["Chest", "Shoulders", "Triceps"]
+        elif split and split.value == WorkoutSplit.PULL:
+            return ["Back", "Biceps", "Forearms"]
+        return []
+
     def _parse_workout_response(self, response_text) -> WorkoutRoutine:
         """Parse the LLM response into a WorkoutRoutine object."""
         if isinstance(self.llm_client, GeminiClient):
@@ -128,19 +142,10 @@ class WorkoutGeneratorAgent(BaseAgent):
             workout_data = json.loads(json_str)
             
             # Create the workout routine
-            exercises = [
-                Exercise(
-                    id=ex["id"],
-                    name=ex["name"],
-                    target_sets=ex["target_sets"],
-                    target_reps=ex["target_reps"],
-                    rest_period_seconds=ex.get("rest_period_seconds"),
-                    target_weight_kg=ex.get("target_weight_kg")
-                )
-                for ex in workout_data["routine"]
-            ]
+            exercises = [Exercise.model_validate(ex) for ex in workout_data["routine"]]
             
             return WorkoutRoutine(
+                id=workout_data.get("id", ""),
                 date=datetime.now().strftime("%Y-%m-%d"),
                 ai_insight=workout_data.get("ai_insight"),
                 routine=exercises
@@ -153,6 +158,7 @@ class WorkoutGeneratorAgent(BaseAgent):
             
             # Return a minimal valid workout
             return WorkoutRoutine(
+                id="",
                 date=datetime.now().strftime("%Y-%m-%d"),
                 ai_insight="Failed to generate a proper workout. Please try again.",
                 routine=[]
@@ -0,0 +1,162 @@
+# server/services/agents/workout_plan_agent.py
+import asyncio
+import json
+from typing import List, Optional, Dict, Any, Tuple
+
+from pydantic import BaseModel
+
+from models import WorkoutRoutine, WorkoutSplit
+from llm.agents.workout_generator_agent import WorkoutGeneratorAgent
+from llm.gemini_client import GeminiClient
+from config.prompts import WORKOUT_AGENT_SYSTEM_PROMPT
+
+# Plans with more days than this are split into several calls which run concurrently
+MAX_DAYS_PER_CALL = 4
+
+
+class WorkoutPlanResponse(BaseModel):
+    """Response schema for a batched multi-day generation call."""
+    workouts: List[WorkoutRoutine]
+
+
+class WorkoutPlanGeneratorAgent(WorkoutGeneratorAgent):
+    """Agent for generating several days of workouts in as few LLM calls as possible."""
+
+    async def execute(self, **kwargs) -> List[WorkoutRoutine]:
+        """
+        Generate a multi-day workout plan.
+
+        Args:
+            prompt: User prompt or preferences
+            days: List of (split, date) tuples, one per day in the plan
+            stretching_exercises: List of stretching exercises
+            split_exercises: Dict of split to its primary exercise candidates
+            history_digest: Rendered training history digest (optional)
+
+        Returns:
+            One WorkoutRoutine per day, in the same order as `days`
+        """
+        prompt = kwargs.get('prompt', 'Goal: Gain muscle mass and strength and lose fat')
+        days: List[Tuple[WorkoutSplit, str]] = kwargs.get('days', [])
+        stretching_exercises = kwargs.get('stretching_exercises', [])
+        split_exercises: Dict[WorkoutSplit, List[Any]] = kwargs.get('split_exercises', {})
+        history_digest: Optional[str] = kwargs.get('history_digest')
+
+        # Each chunk shares one catalog context; chunks are generated concurrently
+        chunks = [days[i:i + MAX_DAYS_PER_CALL] for i in range(0, len(days), MAX_DAYS_PER_CALL)]
+        results = await asyncio.gather(*[
+            self._generate_chunk(prompt, chunk, stretching_exercises, split_exercises, history_digest)
+            for chunk in chunks
+        ])
+        return [workout for chunk_workouts in results for workout in chunk_workouts]
+
+    async def _generate_chunk(self,
+                              prompt: str,
+                              days: List[Tuple[WorkoutSplit, str]],
+                              stretching_exercises: List[Any],
+                              split_exercises: Dict[WorkoutSplit, List[Any]],
+                              history_digest: Optional[str] = None) -> List[WorkoutRoutine]:
+        """Generate the days of one chunk in a single call, regenerating any missing days individually."""
+        context = self._build_plan_context(prompt, days, split_exercises, history_digest)
+        print(f"Plan context: {context}")
+        response = await self.llm_client.generate_structured_content(context, response_schema=WorkoutPlanResponse, system_prompt=WORKOUT_AGENT_SYSTEM_PROMPT)
+        workouts = self._parse_plan_response(response)[:len(days)]
+
+        # Fall back to one call per day for days the batched response did not cover
+        missing = [(index, split) for index, (split, _) in enumerate(days) if index >= len(workouts) or not workouts[index].routine]
+        if missing:
+            regenerated = await asyncio.gather(*[
+                super(WorkoutPlanGeneratorAgent, self).execute(
+                    prompt=prompt,
+                    split=split,
+                    stretching_exercises=stretching_exercises,
+                    primary_exercises=split_exercises.get(split, []),
+                    history_digest=history_digest
+                )
+                for _, split in missing
+            ])
+            for (index, _), workout in zip(missing, regenerated):
+                if index < len(workouts):
+                    workouts[index] = workout
+                else:
+                    workouts.append(workout)
+
+        for workout, (_, date) in zip(workouts, days):
+            workout.date = date
+        return workouts
+
+    def _build_plan_context(self,
+                            prompt: str,
+                            days: List[Tuple[WorkoutSplit, str]],
+                            split_exercises: Dict[WorkoutSplit, List[Any]],
+                            history_digest: Optional[str] = None) -> str:
+        """
+        Build the prompt context for a multi-day plan.
+        Every candidate exercise is listed once in a shared catalog and each day only references ids,
+        so splits with overlapping candidates do not repeat the catalog in the prompt.
+        """
+        catalog: Dict[str, Dict[str, Any]] = {}
+        day_candidates = []
+        for index, (split, date) in enumerate(days):
+            options = self._format_exercise_options(split_exercises.get(split, []))
+            for option in options:
+                catalog.setdefault(option["id"], option)
+            focus_groups = self._focus_groups(split)
+            day_candidates.append({
+                "day": index + 1,
+                "date": date,
+                "split": split.value,
+                "focus_groups": focus_groups or None,
+                "candidate_ids": [option["id"] for option in options],
+            })
+
+        context = f"""
+        Create a {len(days)} day workout plan for the user based on the following information:
+
+        User preferences: {prompt}
+        {self._format_history(history_digest)}
+        The data below is the relevant exercises from the exercises.json file. ONLY SELECT EXERCISES FROM THIS LIST AND USE THE EXERCISE IDS PROVIDED.
+
+        Exercise catalog:
+        {json.dumps(list(catalog.values()))}
+
+        Days in the plan, with the ids of the catalog exercises available for each day:
+        {json.dumps(day_candidates)}
+
+        Return exactly one workout routine per day, in the same order as the days above. Each routine must be finishable in under 45 minutes and contain:
+        1. A brief insight about the workout (1-2 sentences) providing an overview of the workout
+        2. A list of 4-5 primary exercises chosen from that day's candidate ids
+        Avoid repeating the same exercise on consecutive days of the plan.
+
+        For each exercise, specify:
+        - Exercise ID (must match one from the available exercises)
+        - Exercise name
+        - Number of sets (typically 3-5)
+        - Rep range (e.g., "8-10" or "12")
+        - Target weight in lbs (a single positive integer)
+        - Rest period in seconds (typically 30-120)
+        - Tip (short and concise tip for the exercise that a personal trainer would give to help the user perform the exercise better)
+        - Focus groups (optional, can be null)
+        """
+
+        return context
+
+    def _parse_plan_response(self, response) -> List[WorkoutRoutine]:
+        """Parse the LLM response into a list of WorkoutRoutine objects."""
+        try:
+            if isinstance(self.llm_client, GeminiClient):
+                parsed = response.parsed
+            else:
+                json_str = response.strip()
+                if json_str.startswith("```json"):
+                    json_str = json_str[7:].strip()
+                if json_str.startswith("```"):
+                    json_str = json_str[3:].strip()
+                if json_str.endswith("```"):
+                    json_str = json_str[:-3].strip()
+                parsed = WorkoutPlanResponse.model_validate_json(json_str)
+            return parsed.workouts if parsed else []
+        except Exception as e:
+            print(f"Error parsing LLM plan response: {str(e)}")
+            print(f"Raw response: {response}")
+            return []
@@ -1,11 +1,15 @@
 # server/services/llm_service.py
-from typing import Dict, Optional, Type
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 from models import WorkoutSplit, WorkoutRoutine
 from llm.base import LLMClient
 from llm.gemini_client import GeminiClient
 from llm.agents.base_agent import BaseAgent
 from llm.agents.workout_generator_agent import WorkoutGeneratorAgent
+from llm.agents.workout_plan_agent import WorkoutPlanGeneratorAgent
+from llm.agents.local_workout_agent import LocalWorkoutGeneratorAgent
 
 class LLMService:
     """Service for managing LLM clients and agents."""
@@ -19,6 +23,8 @@ class LLMService:
     def _register_agents(self):
         """Register all available agents."""
         self.agents["workout_generator"] = WorkoutGeneratorAgent(self.llm_client)
+        self.agents["workout_plan_generator"] = WorkoutPlanGeneratorAgent(self.llm_client)
+        self.agents["local_workout_generator"] = LocalWorkoutGeneratorAgent(self.llm_client)
         # Add more agents here as they are implemented
     
     def set_llm_client(self, client: LLMClient):
@@ -33,18 +39,74 @@ class LLMService:
         for agent_name, agent in self.agents.items():
             agent.llm_client = client
     
-    async def generate_workout(self, prompt: str, split: Optional[WorkoutSplit] = None, **kwargs) -> WorkoutRoutine:
+    async def generate_workout(self, prompt: str, split: Optional[WorkoutSplit] = None, quick: bool = False, **kwargs) -> WorkoutRoutine:
         """
         Generate a workout routine.
+        Falls back to the local generator when the LLM fails or returns an empty routine.
         
         Args:
             prompt: User preferences
             split: Workout split type
+            quick: Skip the LLM and use the local generator
             **kwargs: Additional parameters for the agent
             
         Returns:
             A generated workout routine
         """
+        if quick:
+            return await self.agents["local_workout_generator"].execute(split=split, **kwargs)
         workout_agent = self.agents["workout_generator"]
-        return await workout_agent.execute(prompt=prompt, split=split, **kwargs)
+        try:
+            workout = await workout_agent.execute(prompt=prompt, split=split, **kwargs)
+        except Exception as e:
+            print(f"Workout generation failed, using the local generator: {e}")
+            workout = None
+        if not workout or not workout.routine:
+            workout = await self.agents["local_workout_generator"].execute(split=split, **kwargs)
+        return workout
 
+    async def generate_workout_plan(self,
+                                    prompt: str,
+                                    days: List[Tuple[WorkoutSplit, str]],
+                                    split_exercises: Dict[WorkoutSplit, List[Any]],
+                                    **kwargs) -> List[WorkoutRoutine]:
+        """
+        Generate a multi-day workout plan.
+        
+        Args:
+            prompt: User preferences
+            days: List of (split, date) tuples, one per day
+            split_exercises: Primary exercise candidates for each split in the plan
+            **kwargs: Additional parameters for the agent
+            
+        Returns:
+            One generated workout routine per day
+        """
+        plan_agent = self.agents["workout_plan_generator"]
+        try:
+            workouts = await plan_agent.execute(prompt=prompt, days=days, split_exercises=split_exercises, **kwargs)
+        except Exception as e:
+            print(f"Workout plan generation failed, using the local generator: {e}")
+            workouts = []
+        # Days the LLM could not generate are filled in by the local generator, each for its scheduled
+        # date and avoiding the exercises already in the plan, so repeated splits get different routines
+        local_agent = self.agents["local_workout_generator"]
+        workouts = list(workouts[:len(days)]) + [None] * (len(days) - len(workouts))
+        planned_exercise_ids = [ex.id for workout in workouts if workout for ex in workout.routine]
+        for i, (split, scheduled_date) in enumerate(days):
+            if not workouts[i] or not workouts[i].routine:
+                workouts[i] = await local_agent.execute(
+                    split=split,
+                    primary_exercises=split_exercises[split],
+                    planned_exercise_ids=planned_exercise_ids,
+                    now=datetime.fromisoformat(scheduled_date),
+                    **kwargs
+                )
+                planned_exercise_ids += [ex.id for ex in workouts[i].routine]
+        return workouts
+
+
+@lru_cache(maxsize=1)
+def get_llm_service() -> LLMService:
+    """Dependency function to get the shared LLM service."""
+    return LLMService()
@@ -1,5 +1,9 @@
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, Query, Depends
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
+from datetime import datetime, date, time, timedelta, timezone
+from fastapi import FastAPI, HTTPException, Query, Depends, Header, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Optional, Union, TypeVar, Generic, Any
@@ -14,16 +18,56 @@ from models import (
     EditExerciseRequest,
     EditExerciseData,
     LogWorkoutRequest,
-    LogWorkoutData
+    LogWorkoutData,
+    LogWorkoutStatusData,
+    LoggedExercise,
+    ExportFormat,
+    WorkoutLogSummary,
+    WorkoutHistoryData,
+    GeneratePlanRequest,
+    GeneratePlanData,
+    WorkoutPlan,
+    ExerciseCatalogData,
+    ExerciseCatalogDeltaData,
+    ExerciseSearchData,
+    ShardStats,
+    StorageStatsData,
+    TelemetryMetric,
+    TelemetryChunkRequest,
+    TelemetryChunkData,
+    TelemetrySamplesData,
+    SessionHeartRateData
 )
-from data.database import init_db, get_db
-from data.schema import Exercise, Force, Category
-from data.queries import get_stretching_exercises, get_push_exercises, get_pull_exercises, get_abs_exercises, get_full_body_exercises
+from responses import ApiJSONResponse, api_response
+from data.database import init_db, get_db, get_user_id, data_config, storage, query_profiler
+from data.query_profiler import QueryProfileMiddleware, PROFILE_HEADER
+from data.schema import Exercise, Force, Category, Level, Mechanic, PrimaryMuscle
+from data.queries import ExerciseFilter, get_stretching_exercises, get_split_exercises, get_generated_workout, save_generated_workouts, get_recent_exercise_ids, count_users_and_workout_logs
 from sqlalchemy.orm import Session
-from llm.service import LLMService
-from data.queries import create_workout_log
+from config.config import ConfigManager
+from llm.service import LLMService, get_llm_service
+from data.queries import WorkoutLogConflictError, create_workout_log, make_workout_log_id, get_workout_log_by_id, get_user_workout_logs, get_logged_exercises_for_logs, get_logged_exercises_for_log
+from data.history_export import stream_history_export, EXPORT_MEDIA_TYPES
+from data.write_behind import WriteBehindWorker
+from data.history_digest import get_history_digest, render_history_digest
+from data.catalog import get_catalog_snapshot, get_catalog_delta, to_catalog_exercise
+from data.exercise_search import get_exercise_search_index
+from data.telemetry import telemetry_available, save_telemetry_chunk, read_telemetry, downsample, analyze_set_heart_rate
 
-app = FastAPI(title="Workout Pal API")
+server_config = ConfigManager().get_server_config()
+
+# Workout logs are journaled and committed in the background when write-behind is enabled
+write_behind = WriteBehindWorker(storage.session_for, data_config.journal_dir, partition=storage.shard_for) if data_config.write_behind_enabled else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if write_behind:
+        await write_behind.start()
+    yield
+    if write_behind:
+        await write_behind.stop()
+
+app = FastAPI(title="Workout Pal API", default_response_class=ApiJSONResponse, lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -37,71 +81,224 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[PROFILE_HEADER],
 )
 
+if query_profiler:
+    app.add_middleware(QueryProfileMiddleware, profiler=query_profiler)
+
 # Initialize the database
 init_db()
+# The catalog snapshot and the search index are built on first use, so startup does not scale with the catalog
 # Initialize the LLM service
 
 @app.get("/api/workout/today", response_model=ApiResponse[FetchWorkoutData])
-async def fetch_today_workout(split: Optional[WorkoutSplit] = Query(None), db: Session = Depends(get_db)):
+async def fetch_today_workout(split: Optional[WorkoutSplit] = Query(None),
+                              quick: Optional[bool] = Query(None),
+                              user_id: str = Depends(get_user_id),
+                              db: Session = Depends(get_db),
+                              llm_service: LLMService = Depends(get_llm_service)):
     """
     Fetches today's workout routine.
     Optionally allows filtering by workout split.
+    With quick=true the workout is built by the local generator in milliseconds instead of the LLM
+    (QUICK_WORKOUTS sets the default); the local generator is also the fallback when the LLM fails.
 
     Use await to make the API and db read calls.
     user_prefs = await db.get_user_preferences(user_id)
     generated_workout = await llm_service.generate_workout(prompt=user_prefs.prompt, split=split)
     """
+    # 0. Serve today's workout from a previously generated plan if there is one
     # 1. Query stretching exercises
     # 2. Query exercises for the workout split
-    # 3. (to be implemented) Query user's workout history
+    # 3. Query the digest of the user's workout history
     # 4. (to be implemented) Query user's preferences
     # 5. Prompt LLM to generate the workout
     # 6. Return the workout
     try:
-        stretching_exercises = get_stretching_exercises(db)
-        primary_exercises = []
-        if split == WorkoutSplit.PUSH or (split is None):
-            primary_exercises = get_push_exercises(db)
-        elif split == WorkoutSplit.PULL:
-            primary_exercises = get_pull_exercises(db)
-        elif split == WorkoutSplit.ABS:
-            primary_exercises = get_abs_exercises(db)
-        elif split == WorkoutSplit.FULL_BODY:
-            primary_exercises = get_full_body_exercises(db)
-        else:
-            return ApiResponse[FetchWorkoutData](
-                success=False,
+        planned_workout = get_generated_workout(db, user_id, date.today().isoformat(), split)
+        if planned_workout:
+            return api_response(
+                FetchWorkoutData,
+                data=FetchWorkoutData(workout=planned_workout)
+            )
+
+        stretching_exercises = get_stretching_exercises(db, lean=True)
+        primary_exercises = get_split_exercises(db, split, lean=True)
+        if primary_exercises is None:
+            return api_response(
+                FetchWorkoutData,
                 error=ApiErrorDetail(message="Not implemented", code="NOT_IMPLEMENTED")
             )
             
-        # (TODO) Query workout history for the user
-            # 3. Generate the workout using the LLM service
+        history = get_history_digest(db, user_id)
+        history_digest = render_history_digest(history, split)
         # For now, use a default prompt since user preferences aren't implemented yet
         curr_split = split.value if split else "PUSH"
         default_prompt = f"Create a workout routine for the {curr_split} split for a 26 year old male who is 180 lbs and 5'10 looking to gain muscle mass and strength."
-        llm_service = LLMService()
         generated_workout = await llm_service.generate_workout(
             prompt=default_prompt, 
             split=split,
+            quick=quick if quick is not None else server_config.quick_workouts,
             stretching_exercises=stretching_exercises,
-            primary_exercises=primary_exercises
+            primary_exercises=primary_exercises,
+            history_digest=history_digest,
+            history=history,
+            recent_exercise_ids=get_recent_exercise_ids(db, user_id, split)
         )
         response_data = FetchWorkoutData(workout=generated_workout)
         response_data.workout.id = str(split) + "_" + str(datetime.now().strftime("%Y%m%d%H%M%S"))
-        return ApiResponse[FetchWorkoutData](
-            success=True,
+        return api_response(
+            FetchWorkoutData,
             data=response_data
         )
     except Exception as e:
         # In a real app, log the exception 'e'
-        return ApiResponse[FetchWorkoutData](
-            success=False,
+        return api_response(
+            FetchWorkoutData,
             error=ApiErrorDetail(message=f"Failed to fetch workout: {str(e)}", code="FETCH_WORKOUT_ERROR")
         )
 
 
+@app.post("/api/workout/plan", response_model=ApiResponse[GeneratePlanData])
+async def generate_workout_plan(request: GeneratePlanRequest,
+                                user_id: str = Depends(get_user_id),
+                                db: Session = Depends(get_db),
+                                llm_service: LLMService = Depends(get_llm_service)):
+    """
+    Generates a multi-day plan (e.g. a training week) in batched LLM calls and stores every day,
+    so /api/workout/today can serve those days without generating them again.
+    """
+    try:
+        if not request.splits:
+            return api_response(
+                GeneratePlanData,
+                error=ApiErrorDetail(message="A plan needs at least one split.", code="INVALID_PLAN_REQUEST")
+            )
+        start_date = date.fromisoformat(request.startDate) if request.startDate else date.today()
+        days = [(split, (start_date + timedelta(days=i)).isoformat()) for i, split in enumerate(request.splits)]
+
+        # Query the candidates once per distinct split, the plan shares them across days
+        split_exercises = {}
+        for split in set(request.splits):
+            candidates = get_split_exercises(db, split, lean=True)
+            if candidates is None:
+                return api_response(
+                    GeneratePlanData,
+                    error=ApiErrorDetail(message=f"Split {split.value} is not implemented", code="NOT_IMPLEMENTED")
+                )
+            split_exercises[split] = candidates
+
+        history = get_history_digest(db, user_id)
+        prompt = request.prompt or "Create a workout plan for a 26 year old male who is 180 lbs and 5'10 looking to gain muscle mass and strength."
+        workouts = await llm_service.generate_workout_plan(
+            prompt=prompt,
+            days=days,
+            split_exercises=split_exercises,
+            stretching_exercises=get_stretching_exercises(db, lean=True),
+            history_digest=render_history_digest(history),
+            history=history
+        )
+        if len(workouts) != len(days):
+            return api_response(
+                GeneratePlanData,
+                error=ApiErrorDetail(message="Failed to generate every day of the plan.", code="GENERATE_PLAN_ERROR")
+            )
+
+        plan_id = "plan_" + datetime.now().strftime("%Y%m%d%H%M%S")
+        for workout, (split, scheduled_date) in zip(workouts, days):
+            workout.id = str(split) + "_" + scheduled_date.replace("-", "") + "_" + plan_id
+            workout.date = scheduled_date
+        if not save_generated_workouts(db, user_id, plan_id, [(split, scheduled_date, workout) for workout, (split, scheduled_date) in zip(workouts, days)]):
+            return api_response(
+                GeneratePlanData,
+                error=ApiErrorDetail(message="Failed to save workout plan to database.", code="DB_SAVE_ERROR")
+            )
+
+        return api_response(
+            GeneratePlanData,
+            data=GeneratePlanData(plan=WorkoutPlan(id=plan_id, startDate=start_date.isoformat(), workouts=workouts))
+        )
+    except Exception as e:
+        return api_response(
+            GeneratePlanData,
+            error=ApiErrorDetail(message=f"Failed to generate plan: {str(e)}", code="GENERATE_PLAN_ERROR")
+        )
+
+
+@app.get("/api/exercises", response_model=ApiResponse[ExerciseCatalogData])
+def fetch_exercise_catalog(request: Request):
+    """
+    Returns the full exercise catalog from a precomputed, pre-compressed snapshot.
+    Clients cache it and revalidate with If-None-Match, which returns 304 while the catalog is unchanged.
+    Sync, so building the snapshot on the first request does not block the event loop.
+    """
+    snapshot = get_catalog_snapshot()
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if snapshot.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    body, encoding = snapshot.encoded(request.headers.get("accept-encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/exercises/delta", response_model=ApiResponse[ExerciseCatalogDeltaData])
+def fetch_exercise_catalog_delta(since: str = Query(...), db: Session = Depends(get_db)):
+    """
+    Returns the exercises changed since the catalog version a client has cached.
+    """
+    try:
+        delta = get_catalog_delta(db, get_catalog_snapshot(), since)
+        return api_response(ExerciseCatalogDeltaData, data=delta)
+    except Exception as e:
+        return api_response(
+            ExerciseCatalogDeltaData,
+            error=ApiErrorDetail(message=f"Failed to fetch catalog delta: {str(e)}", code="CATALOG_DELTA_ERROR")
+        )
+
+
+@app.get("/api/exercises/search", response_model=ApiResponse[ExerciseSearchData])
+def search_exercise_catalog(q: str = Query(""),
+                            limit: int = Query(20, ge=1, le=100),
+                            offset: int = Query(0, ge=0),
+                            primary_muscle: Optional[PrimaryMuscle] = Query(None),
+                            level: Optional[Level] = Query(None),
+                            category: Optional[Category] = Query(None),
+                            force: Optional[Force] = Query(None),
+                            mechanic: Optional[Mechanic] = Query(None),
+                            equipment: Optional[str] = Query(None)):
+    """
+    Searches the exercise catalog by name, equipment, muscles and instructions as the user types.
+    The last word of q is matched as a prefix, small typos are tolerated and the filters narrow
+    the results; facets count the values of each filter field over all matches.
+    Sync, so building the index on the first request does not block the event loop.
+    """
+    try:
+        result = get_exercise_search_index().search(
+            q,
+            filter=ExerciseFilter(primary_muscle=primary_muscle, level=level, category=category, force=force, mechanic=mechanic),
+            equipment=equipment,
+            limit=limit,
+            offset=offset
+        )
+        return api_response(
+            ExerciseSearchData,
+            data=ExerciseSearchData(
+                query=q,
+                total=result.total,
+                results=[to_catalog_exercise(exercise) for exercise in result.exercises],
+                facets=result.facets
+            )
+        )
+    except Exception as e:
+        return api_response(
+            ExerciseSearchData,
+            error=ApiErrorDetail(message=f"Failed to search exercises: {str(e)}", code="EXERCISE_SEARCH_ERROR")
+        )
+
+
 @app.post("/api/workout/edit-exercise", response_model=ApiResponse[EditExerciseData])
 async def edit_specific_exercise(request: EditExerciseRequest):
     """
@@ -122,49 +319,316 @@ async def edit_specific_exercise(request: EditExerciseRequest):
             target_weight_kg=None, # LLM might suggest this
             rest_period_seconds=60
         )
-        return ApiResponse[EditExerciseData](
-            success=True,
+        return api_response(
+            EditExerciseData,
             data=EditExerciseData(newExercise=new_exercise)
         )
 
     except Exception as e:
         # Log exception 'e'
-        return ApiResponse[EditExerciseData](
-            success=False,
+        return api_response(
+            EditExerciseData,
             error=ApiErrorDetail(message=f"Failed to edit exercise: {str(e)}", code="EDIT_EXERCISE_ERROR")
         )
 
 
-@app.post("/api/workout/log", response_model=ApiResponse[LogWorkoutData])
-async def log_workout_data(request: LogWorkoutRequest, db: Session = Depends(get_db)):
+@app.post("/api/workout/log", response_model=ApiResponse[LogWorkoutData], status_code=202)
+async def log_workout_data(request: LogWorkoutRequest,
+                           idempotency_key: Optional[str] = Header(None),
+                           user_id: str = Depends(get_user_id),
+                           db: Session = Depends(get_db)):
     """
     Receives logged workout data from the client and persists it.
+    With write-behind enabled the log is journaled and acknowledged with 202 before it is committed;
+    its progress can be followed on /api/workout/log/{log_id}/status.
+    Clients retrying a request send the same Idempotency-Key header, so the workout is logged once;
+    reusing a key for a different workout is rejected with 409 LOG_CONFLICT.
     """
     try:
-        # For now, use a hardcoded user_id.
-        # In a real application, this would come from an authentication system.
-        user_id = "default_user"
         print(f"Received request to log workout: {request}")
-        persisted_log = create_workout_log(db, user_id, request)
+        if write_behind:
+            log_id = await write_behind.submit(user_id, request, idempotency_key)
+            return api_response(
+                LogWorkoutData,
+                data=LogWorkoutData(
+                    loggedWorkoutId=log_id,
+                    message="Workout received and queued for saving."
+                ),
+                status_code=202
+            )
+
+        # Committed in a worker thread, so a wait on the connection pool or a database lock does not block the event loop
+        log_id = make_workout_log_id(user_id, request, idempotency_key)
+        persisted_log = await asyncio.to_thread(create_workout_log, db, user_id, log_id, request)
 
         if not persisted_log:
-            return ApiResponse[LogWorkoutData](
-                success=False,
+            return api_response(
+                LogWorkoutData,
                 error=ApiErrorDetail(message="Failed to save workout log to database.", code="DB_SAVE_ERROR")
             )
 
-        return ApiResponse[LogWorkoutData](
-            success=True,
+        return api_response(
+            LogWorkoutData,
             data=LogWorkoutData(
                 loggedWorkoutId=persisted_log.id,
                 message="Workout logged successfully."
             )
         )
+    except WorkoutLogConflictError as e:
+        return api_response(
+            LogWorkoutData,
+            error=ApiErrorDetail(message=str(e), code="LOG_CONFLICT"),
+            status_code=409
+        )
     except Exception as e:
         # Log exception 'e'
-        return ApiResponse[LogWorkoutData](
-            success=False,
+        return api_response(
+            LogWorkoutData,
             error=ApiErrorDetail(message=f"Failed to log workout: {str(e)}", code="LOG_WORKOUT_ERROR")
         )
 
-# Run from terminal: uvicorn main:app --reload
\ No newline at end of file
+
+@app.get("/api/workout/log/{log_id}/status", response_model=ApiResponse[LogWorkoutStatusData])
+def fetch_log_workout_status(log_id: str, user_id: str = Depends(get_user_id), db: Session = Depends(get_db)):
+    """
+    Reports whether a workout log is still queued for saving, already saved or failed to save.
+    Logs accepted by another worker process are found through the shared journal.
+    """
+    try:
+        status = write_behind.status(log_id) if write_behind else None
+        if status is None and get_workout_log_by_id(db, log_id, user_id):
+            status = "saved"
+        if status is None and write_behind:
+            status = write_behind.journal_status(log_id)
+        status = status or "unknown"
+        return api_response(
+            LogWorkoutStatusData,
+            data=LogWorkoutStatusData(
+                loggedWorkoutId=log_id,
+                status=status,
+                pendingCount=len(write_behind.pending) if write_behind else 0
+            )
+        )
+    except Exception as e:
+        return api_response(
+            LogWorkoutStatusData,
+            error=ApiErrorDetail(message=f"Failed to fetch workout log status: {str(e)}", code="LOG_STATUS_ERROR")
+        )
+
+@app.get("/api/workout/history", response_model=ApiResponse[WorkoutHistoryData])
+def fetch_workout_history(limit: int = Query(20, ge=1, le=100),
+                          offset: int = Query(0, ge=0),
+                          user_id: str = Depends(get_user_id),
+                          db: Session = Depends(get_db)):
+    """
+    Returns a page of the user's logged workouts, most recent first.
+    """
+    try:
+        logs = get_user_workout_logs(db, user_id, limit=limit, offset=offset)
+        logged_exercises = get_logged_exercises_for_logs(db, [log.id for log in logs])
+        summaries = [
+            WorkoutLogSummary(
+                id=log.id,
+                workoutRoutineId=log.workout_routine_id,
+                split=log.split,
+                startTime=log.start_time,
+                endTime=log.end_time,
+                totalDurationSeconds=log.total_duration_seconds,
+                notes=log.notes,
+                loggedExercises=[
+                    LoggedExercise(
+                        exercise_id=ex.exercise_id,
+                        name=ex.name,
+                        sets=ex.sets or [],
+                        startTime=ex.start_time,
+                        elapsedTime_ms=ex.elapsed_time_ms,
+                        status=ex.status,
+                        activeWorkTime_ms=ex.active_work_time_ms
+                    )
+                    for ex in logged_exercises[log.id]
+                ]
+            )
+            for log in logs
+        ]
+        return api_response(
+            WorkoutHistoryData,
+            data=WorkoutHistoryData(logs=summaries, limit=limit, offset=offset)
+        )
+    except Exception as e:
+        return api_response(
+            WorkoutHistoryData,
+            error=ApiErrorDetail(message=f"Failed to fetch workout history: {str(e)}", code="FETCH_HISTORY_ERROR")
+        )
+
+
+@app.get("/api/workout/history/export")
+async def export_workout_history(export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+                                 start: Optional[date] = Query(None, description="First day to include (YYYY-MM-DD)"),
+                                 end: Optional[date] = Query(None, description="Last day to include (YYYY-MM-DD)"),
+                                 split: Optional[WorkoutSplit] = Query(None),
+                                 user_id: str = Depends(get_user_id)):
+    """
+    Streams the user's full workout history as NDJSON (one line per logged exercise) or CSV (one row per set).
+    Rows are read from a server-side cursor in batches, so memory use is constant regardless of history size.
+    Days are UTC days, like the stored timestamps.
+    """
+    to_ms = lambda day: int(datetime.combine(day, time.min, tzinfo=timezone.utc).timestamp() * 1000)
+    start_ms = to_ms(start) if start else None
+    end_ms = to_ms(end + timedelta(days=1)) if end else None
+    return StreamingResponse(
+        stream_history_export(storage.session_factory(user_id), export_format.value, user_id, start_ms, end_ms, split),
+        media_type=EXPORT_MEDIA_TYPES[export_format.value],
+        headers={"Content-Disposition": f'attachment; filename="workout-history.{export_format.value}"'}
+    )
+
+
+def is_admin(admin_token: Optional[str]) -> bool:
+    """Admin endpoints need the X-Admin-Token header to match ADMIN_TOKEN, and are disabled while it is unset."""
+    return bool(server_config.admin_token and admin_token
+                and secrets.compare_digest(admin_token, server_config.admin_token))
+
+
+@app.get("/api/admin/storage", response_model=ApiResponse[StorageStatsData])
+def fetch_storage_stats(x_admin_token: Optional[str] = Header(None)):
+    """
+    Reports how users and workout logs are spread over the storage shards (a cross-shard query).
+    Admin only.
+    """
+    if not is_admin(x_admin_token):
+        return api_response(
+            StorageStatsData,
+            error=ApiErrorDetail(message="Admin access required.", code="FORBIDDEN"),
+            status_code=403
+        )
+    try:
+        counts = storage.query_all_shards(count_users_and_workout_logs)
+        return api_response(
+            StorageStatsData,
+            data=StorageStatsData(
+                shardCount=storage.shard_count,
+                shards=[ShardStats(shard=shard, users=users, workoutLogs=logs) for shard, (users, logs) in enumerate(counts)]
+            )
+        )
+    except Exception as e:
+        return api_response(
+            StorageStatsData,
+            error=ApiErrorDetail(message=f"Failed to fetch storage stats: {str(e)}", code="STORAGE_STATS_ERROR")
+        )
+
+
+def telemetry_unavailable(data_type: type):
+    return api_response(
+        data_type,
+        error=ApiErrorDetail(message="Telemetry requires numpy, which is not installed on this server.", code="TELEMETRY_UNAVAILABLE")
+    )
+
+
+@app.post("/api/telemetry/chunks", response_model=ApiResponse[TelemetryChunkData])
+def upload_telemetry_chunk(request: TelemetryChunkRequest, user_id: str = Depends(get_user_id), db: Session = Depends(get_db)):
+    """
+    Stores a chunk of wearable samples of one metric recorded during a workout session.
+    Long recordings are uploaded as several chunks; uploading a chunk again replaces it.
+    """
+    if not telemetry_available():
+        return telemetry_unavailable(TelemetryChunkData)
+    try:
+        chunk = save_telemetry_chunk(db, user_id, request.sessionId, request.metric, request.timestamps, request.values)
+        if not chunk:
+            return api_response(
+                TelemetryChunkData,
+                error=ApiErrorDetail(message="Failed to save telemetry chunk to database.", code="DB_SAVE_ERROR")
+            )
+        return api_response(
+            TelemetryChunkData,
+            data=TelemetryChunkData(
+                sessionId=request.sessionId,
+                metric=request.metric,
+                samples=chunk.sample_count,
+                startTime=chunk.start_time,
+                endTime=chunk.end_time
+            )
+        )
+    except ValueError as e:
+        return api_response(
+            TelemetryChunkData,
+            error=ApiErrorDetail(message=str(e), code="INVALID_TELEMETRY")
+        )
+    except Exception as e:
+        return api_response(
+            TelemetryChunkData,
+            error=ApiErrorDetail(message=f"Failed to upload telemetry: {str(e)}", code="TELEMETRY_UPLOAD_ERROR")
+        )
+
+
+@app.get("/api/telemetry/{session_id}/{metric}", response_model=ApiResponse[TelemetrySamplesData])
+def fetch_telemetry(session_id: str,
+                    metric: TelemetryMetric,
+                    start: Optional[int] = Query(None, description="First timestamp to include (milliseconds)"),
+                    end: Optional[int] = Query(None, description="Timestamp to stop before (milliseconds)"),
+                    bucket_ms: Optional[int] = Query(None, ge=1000, description="Average the samples over buckets of this many milliseconds"),
+                    user_id: str = Depends(get_user_id),
+                    db: Session = Depends(get_db)):
+    """
+    Returns the samples of one metric of a workout session within a time range, optionally averaged into buckets.
+    """
+    if not telemetry_available():
+        return telemetry_unavailable(TelemetrySamplesData)
+    try:
+        timestamps, values = read_telemetry(db, user_id, session_id, metric, start, end)
+        if bucket_ms:
+            timestamps, values = downsample(timestamps, values, bucket_ms)
+        return api_response(
+            TelemetrySamplesData,
+            data=TelemetrySamplesData(
+                sessionId=session_id,
+                metric=metric,
+                bucketMs=bucket_ms,
+                timestamps=timestamps.tolist(),
+                values=values.tolist()
+            )
+        )
+    except Exception as e:
+        return api_response(
+            TelemetrySamplesData,
+            error=ApiErrorDetail(message=f"Failed to fetch telemetry: {str(e)}", code="FETCH_TELEMETRY_ERROR")
+        )
+
+
+@app.get("/api/workout/log/{log_id}/heart-rate", response_model=ApiResponse[SessionHeartRateData])
+def fetch_workout_heart_rate(log_id: str, user_id: str = Depends(get_user_id), db: Session = Depends(get_db)):
+    """
+    Joins the heart rate recorded during a logged workout to its sets: average and peak heart rate
+    per set and the recovery during the rest after it.
+    """
+    if not telemetry_available():
+        return telemetry_unavailable(SessionHeartRateData)
+    try:
+        log = get_workout_log_by_id(db, log_id, user_id)
+        if not log:
+            pending = write_behind is not None and (write_behind.status(log_id) or write_behind.journal_status(log_id)) == "pending"
+            return api_response(
+                SessionHeartRateData,
+                error=ApiErrorDetail(
+                    message=f"Workout log {log_id} is still being saved." if pending else f"Workout log {log_id} not found.",
+                    code="LOG_PENDING" if pending else "LOG_NOT_FOUND"
+                )
+            )
+        timestamps, values = read_telemetry(db, user_id, log_id, TelemetryMetric.HEART_RATE)
+        return api_response(
+            SessionHeartRateData,
+            data=SessionHeartRateData(
+                sessionId=log_id,
+                samples=len(values),
+                avgHeartRate=round(float(values.mean()), 1) if len(values) else None,
+                maxHeartRate=float(values.max()) if len(values) else None,
+                sets=analyze_set_heart_rate(timestamps, values, get_logged_exercises_for_log(db, log_id))
+            )
+        )
+    except Exception as e:
+        return api_response(
+            SessionHeartRateData,
+            error=ApiErrorDetail(message=f"Failed to analyze workout heart rate: {str(e)}", code="HEART_RATE_ERROR")
+        )
+
+
+# Run from terminal: uvicorn main:app --reload
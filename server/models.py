@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Union, TypeVar, Generic, Any
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Dict, List, Optional, Union, TypeVar, Generic, Any
 from enum import Enum
+from functools import lru_cache
 
 # --- Enums ---
 class WorkoutSplit(str, Enum):
@@ -74,6 +75,14 @@ class ApiResponse(BaseModel, Generic[T]):
     data: Optional[T] = None
     error: Optional[ApiErrorDetail] = None
 
+@lru_cache(maxsize=None)
+def get_response_adapter(response_type: type) -> TypeAdapter:
+    """
+    Returns a cached TypeAdapter for a response type, e.g. ApiResponse[FetchWorkoutData].
+    Building an adapter compiles a serializer, so each specialization is only built once.
+    """
+    return TypeAdapter(response_type)
+
 
 # --- API Specific Request/Response Data Payloads (mirroring client/src/types/api.ts) ---
 
@@ -103,3 +112,128 @@ class LogWorkoutRequest(BaseModel):
 class LogWorkoutData(BaseModel):
     loggedWorkoutId: str
     message: str
+
+class LogWorkoutStatusData(BaseModel):
+    loggedWorkoutId: str
+    status: str # "pending" (queued for saving), "saved", "failed" (dead-lettered, see data/write_behind.py) or "unknown"
+    pendingCount: int # Workout logs this server process still has to save
+
+# 4. Workout History
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+class WorkoutLogSummary(BaseModel):
+    id: str
+    workoutRoutineId: Optional[str] = None
+    split: Optional[str] = None
+    startTime: Optional[int] = None
+    endTime: Optional[int] = None
+    totalDurationSeconds: Optional[float] = None
+    notes: Optional[str] = None
+    loggedExercises: List[LoggedExercise]
+
+class WorkoutHistoryData(BaseModel):
+    logs: List[WorkoutLogSummary]
+    limit: int
+    offset: int
+
+# 5. Generate a Multi-Day Plan
+class GeneratePlanRequest(BaseModel):
+    splits: List[WorkoutSplit] # One split per day, in order
+    startDate: Optional[str] = None # "YYYY-MM-DD", defaults to today
+    prompt: Optional[str] = None
+
+class WorkoutPlan(BaseModel):
+    id: str
+    startDate: str
+    workouts: List[WorkoutRoutine]
+
+class GeneratePlanData(BaseModel):
+    plan: WorkoutPlan
+
+# 6. Exercise Catalog
+class CatalogExercise(BaseModel):
+    id: str
+    name: str
+    force: Optional[str] = None
+    level: Optional[str] = None
+    mechanic: Optional[str] = None
+    equipment: Optional[str] = None
+    primaryMuscles: List[str] = []
+    secondaryMuscles: List[str] = []
+    instructions: List[str] = []
+    category: Optional[str] = None
+    images: List[str] = []
+
+class ExerciseCatalogData(BaseModel):
+    version: str
+    exercises: List[CatalogExercise]
+
+class ExerciseCatalogDeltaData(BaseModel):
+    fromVersion: str
+    version: str
+    full: bool # True when fromVersion is unknown and `updated` holds the whole catalog
+    updated: List[CatalogExercise]
+    removed: List[str]
+
+class ExerciseSearchData(BaseModel):
+    query: str
+    total: int # Matches before limit and offset
+    results: List[CatalogExercise]
+    facets: Dict[str, Dict[str, int]] # Value counts over all matches, per filter field
+
+# 7. Storage Administration
+class ShardStats(BaseModel):
+    shard: int
+    users: int
+    workoutLogs: int
+
+class StorageStatsData(BaseModel):
+    shardCount: int # 0 when all user data is in the main database
+    shards: List[ShardStats]
+
+# 8. Wearable Telemetry
+class TelemetryMetric(str, Enum):
+    HEART_RATE = "heart_rate" # Beats per minute
+    STEPS = "steps" # Steps since the previous sample
+    SLEEP_STAGE = "sleep_stage" # 0 awake, 1 light, 2 deep, 3 REM
+
+class TelemetryChunkRequest(BaseModel):
+    sessionId: str # WorkoutLog.id of the session, derived from workoutRoutineId and startTime like the log id
+    metric: TelemetryMetric
+    timestamps: List[int] # JS timestamps (milliseconds), ascending
+    values: List[float]
+
+class TelemetryChunkData(BaseModel):
+    sessionId: str
+    metric: TelemetryMetric
+    samples: int
+    startTime: int
+    endTime: int
+
+class TelemetrySamplesData(BaseModel):
+    sessionId: str
+    metric: TelemetryMetric
+    bucketMs: Optional[int] = None # Values are bucket means when set
+    timestamps: List[int]
+    values: List[float]
+
+class SetHeartRate(BaseModel):
+    exercise_id: str
+    set_number: int
+    startTime: int
+    endTime: int
+    samples: int # Heart rate samples during the set
+    avgHeartRate: Optional[float] = None
+    maxHeartRate: Optional[float] = None
+    recoveryHeartRate: Optional[float] = None # Heart rate at the end of the rest after the set
+    heartRateRecovery: Optional[float] = None # maxHeartRate - recoveryHeartRate
+    restSeconds: Optional[float] = None # Length of the rest the recovery was measured over
+
+class SessionHeartRateData(BaseModel):
+    sessionId: str
+    samples: int
+    avgHeartRate: Optional[float] = None
+    maxHeartRate: Optional[float] = None
+    sets: List[SetHeartRate] # Sets with a startTime and endTime, in the order they were done
@@ -0,0 +1,41 @@
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from models import ApiResponse, ApiErrorDetail, get_response_adapter
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib encoder is used without it
+    orjson = None
+
+
+class ApiJSONResponse(JSONResponse):
+    """
+    JSON response used by every endpoint.
+    Pydantic models are serialized straight to bytes through their cached TypeAdapter,
+    anything else is encoded with orjson when it is installed.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return get_response_adapter(type(content)).dump_json(content)
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return super().render(content)
+
+
+def api_response(data_type: type,
+                 data: Optional[Any] = None,
+                 error: Optional[ApiErrorDetail] = None,
+                 status_code: int = 200) -> ApiJSONResponse:
+    """
+    Wraps data built by the server in ApiResponse[data_type] without validating it again.
+
+    Returning a Response also makes FastAPI skip its own response_model validation and
+    jsonable_encoder pass, so the endpoint's response_model is only used for the OpenAPI schema.
+    Only pass objects that were already validated (pydantic models built by the server).
+    """
+    response = ApiResponse[data_type].model_construct(success=error is None, data=data, error=error)
+    return ApiJSONResponse(content=response, status_code=status_code)
@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix="workout-pal-tests-")
+
+# The configuration is read when main is imported, so point it at a scratch database first
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}",
+    WRITE_BEHIND_ENABLED="true",
+    WRITE_BEHIND_JOURNAL_DIR=os.path.join(TEST_DIR, "journal"),
+    SHARD_COUNT="0",
+    SQL_PROFILING="false",
+)
+os.environ.setdefault("GEMINI_API_KEY", "test")
+# Catalog paths are relative to the server directory
+os.chdir(SERVER_DIR)
+
+
+@pytest.fixture(scope="session")
+def client():
+    import main
+    # Entering the client runs the lifespan, which starts the write-behind worker
+    with TestClient(main.app) as test_client:
+        yield test_client
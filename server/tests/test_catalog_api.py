@@ -0,0 +1,62 @@
+import time
+
+from data.catalog import get_catalog_snapshot
+from data.database import DEFAULT_USER_ID, storage
+from data.schema import CatalogVersion
+
+
+def test_catalog_etag_revalidation(client):
+    response = client.get("/api/exercises")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert response.json()["data"]["version"] in etag
+
+    revalidated = client.get("/api/exercises", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["ETag"] == etag
+
+    stale = client.get("/api/exercises", headers={"If-None-Match": 'W/"outdated"'})
+    assert stale.status_code == 200
+
+
+def test_catalog_encodings(client):
+    identity = client.get("/api/exercises", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in identity.headers
+    gzipped = client.get("/api/exercises", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in gzipped.headers["Vary"]
+    # The client decodes the body, both representations carry the same catalog
+    assert gzipped.content == identity.content
+    # Served from the pre-compressed body
+    assert int(gzipped.headers["Content-Length"]) == len(get_catalog_snapshot().gzip_body) < len(identity.content) / 4
+
+
+def test_catalog_delta_from_an_older_version(client):
+    snapshot = get_catalog_snapshot()
+    changed, dropped = snapshot.exercises[0].id, snapshot.exercises[1].id
+    # The manifest of an older catalog: one exercise changed since, one added since and one removed since
+    old_manifest = dict(snapshot.manifest)
+    old_manifest[changed] = "0" * 12
+    del old_manifest[dropped]
+    old_manifest["Retired_Exercise"] = "1" * 12
+    with storage.session_for(DEFAULT_USER_ID) as db:
+        db.merge(CatalogVersion(version="older_test_version", created_at=int(time.time() * 1000), manifest=old_manifest))
+        db.commit()
+
+    delta = client.get("/api/exercises/delta", params={"since": "older_test_version"}).json()["data"]
+    assert not delta["full"]
+    assert delta["version"] == snapshot.version
+    assert sorted(ex["id"] for ex in delta["updated"]) == sorted([changed, dropped])
+    assert delta["removed"] == ["Retired_Exercise"]
+
+    current = client.get("/api/exercises/delta", params={"since": snapshot.version}).json()["data"]
+    assert not current["full"] and current["updated"] == [] and current["removed"] == []
+
+
+def test_catalog_delta_from_an_unknown_version(client):
+    delta = client.get("/api/exercises/delta", params={"since": "never_published"}).json()["data"]
+    assert delta["full"]
+    assert len(delta["updated"]) == len(get_catalog_snapshot().exercises)
+    assert delta["removed"] == []
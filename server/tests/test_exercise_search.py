@@ -0,0 +1,69 @@
+import pytest
+
+from data.compiled_catalog import ensure_compiled_catalog
+from data.exercise_search import FACET_FIELDS, MIN_TYPO_LENGTH, get_exercise_search_index
+from data.queries import ExerciseFilter
+from data.schema import Category, Level
+
+
+@pytest.fixture(scope="module")
+def index():
+    ensure_compiled_catalog()
+    return get_exercise_search_index()
+
+
+def names(result):
+    return [exercise.name for exercise in result.exercises]
+
+
+def test_staple_lift_ranks_before_its_variations(index):
+    assert names(index.search("bench press", limit=3))[0] == "Barbell Bench Press - Medium Grip"
+    assert names(index.search("squat", limit=3))[0] == "Barbell Squat"
+    # Every query token still has to match, the staple does not leak into narrower queries
+    assert "Barbell Bench Press - Medium Grip" not in names(index.search("incline bench press", limit=50))
+
+
+def test_last_token_is_a_prefix_while_typing(index):
+    typing = index.search("bench pr")
+    assert typing.total > 0
+    assert all("bench" in exercise.name.lower() for exercise in typing.exercises)
+    assert names(typing)[0] == "Barbell Bench Press - Medium Grip"
+    # A trailing space ends the word, "pr" no longer matches "press"
+    assert index.search("bench pr ").total < typing.total
+
+
+def test_tolerates_one_typo(index):
+    assert names(index.search("bech press", limit=1)) == ["Barbell Bench Press - Medium Grip"]
+    assert "Barbell Squat" in names(index.search("sqaut", limit=10))
+    # Tokens shorter than MIN_TYPO_LENGTH have to match exactly
+    assert len("lgs") < MIN_TYPO_LENGTH and index.search("lgs ").total == 0
+
+
+def test_filters_narrow_the_results(index):
+    everything = index.search("press", limit=100)
+    narrowed = index.search("press", filter=ExerciseFilter(level=Level.BEGINNER, category=Category.STRENGTH), equipment="barbell", limit=100)
+    assert 0 < narrowed.total < everything.total
+    assert all(exercise.level == "beginner" and exercise.category == "strength" and exercise.equipment == "barbell"
+               for exercise in narrowed.exercises)
+    assert narrowed.facets["equipment"] == {"barbell": narrowed.total}
+
+
+def test_facets_count_every_match(index):
+    result = index.search("curl", limit=5)
+    assert len(result.exercises) == 5 < result.total
+    assert set(result.facets) == set(FACET_FIELDS)
+    assert sum(result.facets["equipment"].values()) <= result.total
+    assert sum(result.facets["level"].values()) == result.total
+
+
+def test_pages_slice_one_ordering(index):
+    full = index.search("dumbbell", limit=30)
+    pages = [index.search("dumbbell", limit=10, offset=offset) for offset in (0, 10, 20)]
+    assert all(page.total == full.total for page in pages)
+    assert [name for page in pages for name in names(page)] == names(full)
+
+
+def test_empty_query_lists_by_name(index):
+    result = index.search("", filter=ExerciseFilter(level=Level.EXPERT), limit=10)
+    assert result.total == result.facets["level"]["expert"]
+    assert names(result) == sorted(names(result), key=str.lower)
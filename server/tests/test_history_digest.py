@@ -0,0 +1,94 @@
+import pytest
+
+from data.compiled_catalog import ensure_compiled_catalog, get_compiled_catalog
+from data.history_digest import (CHARS_PER_TOKEN, FATIGUE_HALF_LIFE_MS, MAX_DIGEST_TOKENS, MAX_EXERCISES,
+                                 apply_workout_log, get_muscle_fatigue, render_history_digest)
+from models import LogWorkoutRequest, WorkoutSplit
+
+DAY_MS = 24 * 3600 * 1000
+START_MS = 1_750_000_000_000
+BENCH_PRESS = "Barbell_Bench_Press_-_Medium_Grip"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def compiled_catalog():
+    ensure_compiled_catalog()
+
+
+def log(start_ms: int, exercises, split: str = "PUSH") -> LogWorkoutRequest:
+    """A workout log with (exercise_id, weight, reps, completed sets) per exercise."""
+    return LogWorkoutRequest(
+        workoutRoutineId="digest_test",
+        split=split,
+        startTime=start_ms,
+        loggedExercises=[{
+            "exercise_id": exercise_id,
+            "name": exercise_id,
+            "elapsedTime_ms": 0,
+            "status": "completed",
+            "sets": [{"set_number": number, "weight_lbs": weight, "reps": reps, "elapsedTime_ms": 0, "status": "completed"}
+                     for number in range(1, sets + 1)],
+        } for exercise_id, weight, reps, sets in exercises],
+    )
+
+
+def test_backfilled_log_does_not_replace_last():
+    digest = apply_workout_log({}, log(START_MS, [(BENCH_PRESS, 135, 8, 3)]))
+    digest = apply_workout_log(digest, log(START_MS - 7 * DAY_MS, [(BENCH_PRESS, 185, 5, 3)]))
+    entry = digest["exercises"][BENCH_PRESS]
+    assert entry["last"] == [135, 8]
+    assert entry["last_ms"] == START_MS
+    # An older log still counts for the best set
+    assert entry["best"] == [185, 5]
+    # and its session is ordered before the newer one
+    assert [session["ms"] for session in digest["sessions"]["PUSH"]] == [START_MS - 7 * DAY_MS, START_MS]
+
+
+def test_keeps_the_most_recently_trained_exercises():
+    exercise_ids = [exercise.id for exercise in get_compiled_catalog()][:MAX_EXERCISES + 5]
+    digest = {}
+    for i, exercise_id in enumerate(exercise_ids):
+        digest = apply_workout_log(digest, log(START_MS + i * DAY_MS, [(exercise_id, 50, 10, 1)]))
+    assert len(digest["exercises"]) == MAX_EXERCISES
+    assert set(digest["exercises"]) == set(exercise_ids[5:])
+
+
+def test_fatigue_decays_with_half_life():
+    digest = apply_workout_log({}, log(START_MS, [(BENCH_PRESS, 135, 8, 2)]))
+    bench_press = get_compiled_catalog().get(BENCH_PRESS)
+    primary, secondary = bench_press.primary_muscles[0], bench_press.secondary_muscles[0]
+
+    fatigue = get_muscle_fatigue(digest, START_MS)
+    assert fatigue[primary] == pytest.approx(2.0)
+    assert fatigue[secondary] == pytest.approx(1.0)
+    assert get_muscle_fatigue(digest, START_MS + FATIGUE_HALF_LIFE_MS)[primary] == pytest.approx(1.0)
+    assert get_muscle_fatigue(digest, START_MS + 2 * FATIGUE_HALF_LIFE_MS)[primary] == pytest.approx(0.5)
+
+    # A second workout two days later adds to what is left of the first one
+    digest = apply_workout_log(digest, log(START_MS + FATIGUE_HALF_LIFE_MS, [(BENCH_PRESS, 135, 8, 2)]))
+    assert get_muscle_fatigue(digest, START_MS + FATIGUE_HALF_LIFE_MS)[primary] == pytest.approx(3.0)
+
+
+def test_render_stays_within_budget_and_prioritizes_the_requested_split():
+    exercise_ids = [exercise.id for exercise in get_compiled_catalog()][:MAX_EXERCISES]
+    digest = {}
+    for i in range(8):
+        for split in ("PUSH", "PULL", "LEGS"):
+            batch = exercise_ids[i * 5:(i + 1) * 5]
+            digest = apply_workout_log(digest, log(START_MS + i * DAY_MS, [(exercise_id, 100, 8, 3) for exercise_id in batch], split))
+
+    now_ms = START_MS + 8 * DAY_MS
+    rendered = render_history_digest(digest, WorkoutSplit.PULL, now_ms=now_ms)
+    assert len(rendered) <= MAX_DIGEST_TOKENS * CHARS_PER_TOKEN
+    lines = rendered.splitlines()
+    assert lines[0].startswith("Muscle fatigue")
+    # The requested split's sessions, newest first, come before the exercise lines
+    assert all(line.startswith("PULL ") for line in lines[1:4])
+    assert lines[1] > lines[2] > lines[3]
+    assert ": last " in lines[4]
+    # The budget runs out before the other splits' sessions
+    assert not any(line.startswith(("PUSH ", "LEGS ")) for line in lines)
+
+    # A smaller budget drops the lower priority lines first
+    max_tokens = (len(lines[0]) + len(lines[1]) + 2) // CHARS_PER_TOKEN + 1
+    assert render_history_digest(digest, WorkoutSplit.PULL, max_tokens=max_tokens, now_ms=now_ms).splitlines() == lines[:2]
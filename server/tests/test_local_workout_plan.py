@@ -0,0 +1,38 @@
+import asyncio
+from datetime import date, timedelta
+
+from data.queries import get_split_exercises
+from llm.base import LLMClient
+from llm.service import LLMService
+from models import WorkoutSplit
+
+
+class UnavailableLLM(LLMClient):
+    """Fails every call, so the plan is built entirely by the local generator."""
+
+    async def generate_content(self, prompt, system_prompt=None, **kwargs):
+        raise ConnectionError("LLM unavailable")
+
+    async def generate_structured_content(self, prompt, system_prompt=None, **kwargs):
+        raise ConnectionError("LLM unavailable")
+
+    def get_config(self):
+        return {}
+
+
+def test_local_plan_varies_repeated_splits():
+    service = LLMService()
+    service.set_llm_client(UnavailableLLM())
+    splits = [WorkoutSplit.PUSH, WorkoutSplit.PULL, WorkoutSplit.LEGS, WorkoutSplit.PUSH, WorkoutSplit.ABS]
+    start = date(2026, 3, 2)
+    days = [(split, (start + timedelta(days=i)).isoformat()) for i, split in enumerate(splits)]
+    # Lean candidates come from the compiled catalog, no session is needed
+    split_exercises = {split: get_split_exercises(None, split, lean=True) for split in set(splits)}
+
+    workouts = asyncio.run(service.generate_workout_plan(prompt="", days=days, split_exercises=split_exercises))
+
+    assert [workout.date for workout in workouts] == [scheduled_date for _, scheduled_date in days]
+    first_push = {ex.id for ex in workouts[0].routine}
+    second_push = {ex.id for ex in workouts[3].routine}
+    assert first_push and second_push
+    assert not first_push & second_push
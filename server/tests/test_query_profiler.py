@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from data.query_profiler import MAX_CACHED_PLANS, QueryProfiler
+
+
+def test_failed_statement_does_not_leak_its_start_time():
+    engine = create_engine("sqlite://")
+    profiler = QueryProfiler(slow_query_log=None)
+    profiler.install(engine)
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM missing_table"))
+        assert conn.info.get("query_start_time") == []
+
+        token = profiler.start_profile("test")
+        conn.execute(text("SELECT 1"))
+        profile = profiler.finish_profile(token)
+        assert profile.count == 1
+        assert conn.info["query_start_time"] == []
+
+
+def test_explain_cache_is_bounded():
+    engine = create_engine("sqlite://")
+    # Every statement counts as slow, so each one is explained
+    profiler = QueryProfiler(slow_query_ms=0, slow_query_log=None)
+    profiler.install(engine)
+    statement = text("SELECT :n WHERE 1 IN :ids").bindparams(bindparam("ids", expanding=True))
+    with engine.connect() as conn:
+        token = profiler.start_profile("test")
+        for size in range(1, MAX_CACHED_PLANS + 50):
+            conn.execute(statement, {"n": size, "ids": list(range(size))})
+        profiler.finish_profile(token)
+    assert len(profiler._plans) == MAX_CACHED_PLANS
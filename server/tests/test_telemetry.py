@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from data.database import create_database_engine
+from data.schema import TelemetryChunk
+from data.telemetry import RECOVERY_WINDOW_MS, analyze_set_heart_rate, downsample, read_telemetry, save_telemetry_chunk
+from models import TelemetryMetric
+
+np = pytest.importorskip("numpy")
+
+START_MS = 1_700_000_000_000
+HEART_RATE = TelemetryMetric.HEART_RATE
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'telemetry.db'}")
+    TelemetryChunk.__table__.create(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
+
+
+def test_round_trip_across_overlapping_chunks(db):
+    # Two uploads of one session whose samples interleave, the second one at the half seconds
+    first = [START_MS + i * 1000 for i in range(10)]
+    second = [START_MS + 500 + i * 1000 for i in range(10)]
+    save_telemetry_chunk(db, "user", "log_1", HEART_RATE, first, [100 + i for i in range(10)])
+    save_telemetry_chunk(db, "user", "log_1", HEART_RATE, second, [120.25 + i for i in range(10)])
+    save_telemetry_chunk(db, "user", "log_2", HEART_RATE, first, [60.0] * 10)
+
+    times, values = read_telemetry(db, "user", "log_1", HEART_RATE)
+    assert times.tolist() == sorted(first + second)
+    # Stored to 0.1 bpm
+    assert values[:4].tolist() == [100.0, 120.2, 101.0, 121.2]
+
+    # [start, end) windows, whether or not they fall on a sample
+    times, _ = read_telemetry(db, "user", "log_1", HEART_RATE, START_MS + 2000, START_MS + 4000)
+    assert times.tolist() == [START_MS + 2000, START_MS + 2500, START_MS + 3000, START_MS + 3500]
+    times, _ = read_telemetry(db, "user", "log_1", HEART_RATE, START_MS + 20_000)
+    assert times.size == 0
+
+
+def test_uploading_a_chunk_again_replaces_it(db):
+    timestamps = [START_MS + i * 1000 for i in range(5)]
+    save_telemetry_chunk(db, "user", "log_1", HEART_RATE, timestamps, [90] * 5)
+    save_telemetry_chunk(db, "user", "log_1", HEART_RATE, timestamps, [95] * 5)
+    assert db.query(TelemetryChunk).count() == 1
+    assert read_telemetry(db, "user", "log_1", HEART_RATE)[1].tolist() == [95.0] * 5
+
+
+def test_invalid_samples_are_rejected(db):
+    with pytest.raises(ValueError):
+        save_telemetry_chunk(db, "user", "log_1", HEART_RATE, [START_MS + 1000, START_MS], [90, 91])
+    with pytest.raises(ValueError):
+        save_telemetry_chunk(db, "user", "log_1", HEART_RATE, [START_MS], [90, 91])
+
+
+def test_downsample_averages_buckets():
+    times = np.array([0, 1000, 2000, 3000, 9000, 10_000], dtype=np.int64) + START_MS
+    values = np.array([100, 110, 120, 130, 140, 150], dtype=np.float64)
+    starts, means = downsample(times, values, 5000)
+    # The empty bucket at 5 s is left out
+    assert starts.tolist() == [START_MS, START_MS + 5000, START_MS + 10_000]
+    assert means.tolist() == [115.0, 140.0, 150.0]
+
+
+def test_set_heart_rate_and_recovery():
+    # 1 Hz: 100 bpm at rest, 150 during the sets from 10 s to 20 s and from 50.5 s to 60 s, 120 between
+    seconds = np.arange(0, 200)
+    times = START_MS + seconds * 1000
+    values = np.where((seconds >= 10) & (seconds <= 20) | (seconds >= 51) & (seconds <= 60), 150.0,
+                      np.where(seconds < 10, 100.0, 120.0))
+    values[15] = 160.0
+    sets = [
+        {"set_number": 2, "startTime": START_MS + 50_500, "endTime": START_MS + 60_000},
+        {"set_number": 1, "startTime": START_MS + 10_000, "endTime": START_MS + 20_000},
+        {"set_number": 3, "startTime": START_MS + 70_000},
+    ]
+    first, second = analyze_set_heart_rate(times, values, [SimpleNamespace(exercise_id="Barbell_Squat", sets=sets)])
+
+    assert (first.set_number, first.samples) == (1, 11)
+    assert first.maxHeartRate == 160.0
+    assert first.avgHeartRate == round((150 * 10 + 160) / 11, 1)
+    # The rest ends with the last sample before the next set
+    assert (first.recoveryHeartRate, first.heartRateRecovery, first.restSeconds) == (120.0, 40.0, 30.0)
+
+    # Set 3 has no endTime and is left out, so the recovery after set 2 is measured over RECOVERY_WINDOW_MS
+    assert (second.set_number, second.samples) == (2, 10)
+    assert second.restSeconds == RECOVERY_WINDOW_MS / 1000
+    assert second.heartRateRecovery == 30.0
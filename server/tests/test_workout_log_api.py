@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+import time
+
+START_TIME = 1_750_000_000_000
+
+
+def workout_log(routine_id: str, start_time: int = START_TIME) -> dict:
+    return {
+        "workoutRoutineId": routine_id,
+        "split": "PUSH",
+        "startTime": start_time,
+        "endTime": start_time + 1_800_000,
+        "totalDurationSeconds": 1800,
+        "loggedExercises": [{
+            "exercise_id": "Barbell_Bench_Press_-_Medium_Grip",
+            "name": "Barbell Bench Press - Medium Grip",
+            "startTime": start_time,
+            "elapsedTime_ms": 600_000,
+            "status": "completed",
+            "sets": [
+                {"set_number": number, "weight_lbs": 135, "reps": 8, "elapsedTime_ms": 40_000, "status": "completed",
+                 "startTime": start_time + number * 120_000, "endTime": start_time + number * 120_000 + 40_000}
+                for number in (1, 2, 3)
+            ],
+        }],
+    }
+
+
+def wait_until_saved(client, log_id: str, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(f"/api/workout/log/{log_id}/status").json()
+        if status["data"]["status"] == "saved" or time.monotonic() > deadline:
+            return status
+        time.sleep(0.05)
+
+
+def test_log_status_history_export(client):
+    response = client.post("/api/workout/log", json=workout_log("test_routine"))
+    assert response.status_code == 202
+    log_id = response.json()["data"]["loggedWorkoutId"]
+    assert log_id.startswith("log_test_routine_")
+
+    status = client.get(f"/api/workout/log/{log_id}/status")
+    assert status.status_code == 200
+    assert status.json()["success"]
+    assert status.json()["data"]["status"] in ("pending", "saved")
+    assert wait_until_saved(client, log_id)["data"]["status"] == "saved"
+
+    history = client.get("/api/workout/history").json()
+    assert history["success"]
+    logs = {log["id"]: log for log in history["data"]["logs"]}
+    assert len(logs[log_id]["loggedExercises"][0]["sets"]) == 3
+
+    ndjson = client.get("/api/workout/history/export", params={"format": "ndjson"})
+    assert ndjson.status_code == 200
+    lines = [json.loads(line) for line in ndjson.text.splitlines()]
+    exercises = [line for line in lines if line["workoutLogId"] == log_id]
+    assert len(exercises) == 1 and len(exercises[0]["sets"]) == 3
+
+    exported = client.get("/api/workout/history/export", params={"format": "csv"})
+    assert exported.status_code == 200
+    rows = [row for row in csv.DictReader(io.StringIO(exported.text)) if row["workout_log_id"] == log_id]
+    assert len(rows) == 3
+
+
+def test_status_of_unknown_log(client):
+    status = client.get("/api/workout/log/log_missing_0/status")
+    assert status.status_code == 200
+    assert status.json()["data"]["status"] == "unknown"
+
+
+def test_logs_without_idempotency_key_are_all_saved(client):
+    # Manual logs without a start time, the same routine logged twice with different weights
+    manual, heavier = workout_log("repeated_routine"), workout_log("repeated_routine")
+    heavier["loggedExercises"][0]["sets"][0]["weight_lbs"] = 155
+    for log in (manual, heavier):
+        del log["startTime"], log["endTime"]
+    first = client.post("/api/workout/log", json=manual)
+    second = client.post("/api/workout/log", json=heavier)
+    ids = [response.json()["data"]["loggedWorkoutId"] for response in (first, second)]
+    assert ids[0] != ids[1]
+    assert all(wait_until_saved(client, log_id)["data"]["status"] == "saved" for log_id in ids)
+
+
+def test_idempotency_key_replays_and_conflicts(client):
+    headers = {"Idempotency-Key": "replayed-workout"}
+    first = client.post("/api/workout/log", json=workout_log("keyed_routine"), headers=headers)
+    assert first.status_code == 202
+    log_id = first.json()["data"]["loggedWorkoutId"]
+    # A retry of the same workout maps to the same log, while it is queued and once it is saved
+    replay = client.post("/api/workout/log", json=workout_log("keyed_routine"), headers=headers)
+    assert replay.json()["data"]["loggedWorkoutId"] == log_id
+    assert wait_until_saved(client, log_id)["data"]["status"] == "saved"
+    replay = client.post("/api/workout/log", json=workout_log("keyed_routine"), headers=headers)
+    assert replay.status_code == 202
+    assert replay.json()["data"]["loggedWorkoutId"] == log_id
+
+    different = workout_log("keyed_routine")
+    different["loggedExercises"][0]["sets"][0]["weight_lbs"] = 155
+    conflict = client.post("/api/workout/log", json=different, headers=headers)
+    assert conflict.status_code == 409
+    assert conflict.json()["error"]["code"] == "LOG_CONFLICT"
+
+
+def test_export_dates_are_utc_days(client, monkeypatch):
+    # 01:00 UTC on 2025-06-15, still 2025-06-14 in the server's local time zone
+    start_time = 1_749_949_200_000
+    monkeypatch.setenv("TZ", "America/Los_Angeles")
+    time.tzset()
+    try:
+        log_id = client.post("/api/workout/log", json=workout_log("utc_routine", start_time)).json()["data"]["loggedWorkoutId"]
+        assert wait_until_saved(client, log_id)["data"]["status"] == "saved"
+
+        def exported_ids(day: str) -> set:
+            response = client.get("/api/workout/history/export", params={"format": "ndjson", "start": day, "end": day})
+            return {json.loads(line)["workoutLogId"] for line in response.text.splitlines()}
+
+        assert log_id in exported_ids("2025-06-15")
+        assert log_id not in exported_ids("2025-06-14")
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_user_id_header_is_only_trusted_when_enabled(client, monkeypatch):
+    import data.database
+    alice = {"X-User-Id": "alice"}
+    history_ids = lambda headers: {log["id"] for log in client.get("/api/workout/history", headers=headers).json()["data"]["logs"]}
+    monkeypatch.setattr(data.database.server_config, "trust_user_id_header", True)
+    log_id = client.post("/api/workout/log", json=workout_log("alice_routine"), headers=alice).json()["data"]["loggedWorkoutId"]
+    deadline = time.monotonic() + 5
+    while log_id not in history_ids(alice) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert log_id in history_ids(alice)
+    assert log_id not in history_ids({})
+
+    monkeypatch.setattr(data.database.server_config, "trust_user_id_header", False)
+    assert log_id not in history_ids(alice)
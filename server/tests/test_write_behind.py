@@ -0,0 +1,138 @@
+import asyncio
+import glob
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from data.queries import WorkoutLogConflictError
+from data.schema import Base, WorkoutLog
+from data.write_behind import DEAD_LETTER_FILE, SEGMENT_GLOB, WorkoutLogJournal, WriteBehindWorker
+from models import LogWorkoutRequest
+
+FAILURES = {
+    "poison": lambda: IntegrityError("INSERT INTO workout_logs", {}, Exception("bad row")),
+    "crash": lambda: RuntimeError("unexpected"),
+    "locked": lambda: OperationalError("INSERT INTO workout_logs", {}, Exception("database is locked")),
+}
+
+
+class FailingSession(Session):
+    """Fails the commit of logs whose user id names a failure, commits the others."""
+
+    def add(self, instance, *args, **kwargs):
+        if isinstance(instance, WorkoutLog):
+            self.info.setdefault("user_ids", set()).add(instance.user_id)
+        super().add(instance, *args, **kwargs)
+
+    def commit(self):
+        for user_id in self.info.pop("user_ids", set()):
+            if user_id in FAILURES:
+                raise FAILURES[user_id]()
+        super().commit()
+
+
+def make_worker(tmp_path, **kwargs) -> WriteBehindWorker:
+    engine = create_engine(f"sqlite:///{tmp_path / 'logs.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, class_=FailingSession)
+    worker = WriteBehindWorker(lambda user_id: factory(), str(tmp_path / "journal"),
+                               flush_interval=0.01, retry_interval=0.01, **kwargs)
+    worker.saved_ids = lambda: {row.id for row in factory().query(WorkoutLog.id)}
+    return worker
+
+
+def request(routine_id: str) -> LogWorkoutRequest:
+    return LogWorkoutRequest(workoutRoutineId=routine_id, split="PUSH", startTime=1_750_000_000_000, loggedExercises=[])
+
+
+def test_permanent_errors_are_dead_lettered(tmp_path):
+    worker = make_worker(tmp_path)
+
+    async def scenario():
+        await worker.start()
+        ids = [await worker.submit(user_id, request(user_id)) for user_id in ["ok_1", "poison", "crash", "ok_2"]]
+        await asyncio.wait_for(worker.stop(), 5)
+        return ids
+
+    ok_1, poison, crash, ok_2 = asyncio.run(scenario())
+    assert worker.saved_ids() == {ok_1, ok_2}
+    assert worker.journal_status(poison) == "failed"
+    assert worker.journal_status(crash) == "failed"
+    assert os.path.exists(tmp_path / "journal" / DEAD_LETTER_FILE)
+    assert not glob.glob(str(tmp_path / "journal" / SEGMENT_GLOB))
+
+
+def test_reused_ids_are_replays_or_conflicts(tmp_path):
+    worker = make_worker(tmp_path)
+    changed = request("ok").model_copy(update={"notes": "different workout"})
+
+    async def scenario():
+        await worker.start()
+        first = await worker.submit("ok", request("ok"), idempotency_key="key_1")
+        replay = await worker.submit("ok", request("ok"), idempotency_key="key_1")
+        with pytest.raises(WorkoutLogConflictError):
+            await worker.submit("ok", changed, idempotency_key="key_1")
+        await asyncio.wait_for(worker._queue.join(), 5)
+        # Only found at commit time when another process journaled the conflicting log
+        other_process = WorkoutLogJournal(str(tmp_path / "journal"))
+        other_process.append("ok", first, changed)
+        other_process.close()
+        worker.recover()
+        await asyncio.wait_for(worker.stop(), 5)
+        return first, replay
+
+    first, replay = asyncio.run(scenario())
+    assert first == replay
+    assert worker.saved_ids() == {first}
+    with open(tmp_path / "journal" / DEAD_LETTER_FILE) as f:
+        assert "WorkoutLogConflictError" in f.read()
+
+
+def test_transient_errors_are_retried_then_kept_in_the_journal(tmp_path):
+    worker = make_worker(tmp_path, max_attempts=2, replay_interval=3600)
+
+    async def scenario():
+        await worker.start()
+        locked = await worker.submit("locked", request("locked"))
+        ok = await worker.submit("ok", request("ok"))
+        await asyncio.wait_for(worker.stop(), 5)
+        return locked, ok
+
+    locked, ok = asyncio.run(scenario())
+    # Committed in the same transaction as the locked log, so it is kept and replayed with it
+    assert worker.saved_ids() == set()
+    assert worker.journal_status(locked) == "pending"
+    assert worker.journal_status(ok) == "pending"
+    assert len(glob.glob(str(tmp_path / "journal" / SEGMENT_GLOB))) == 1
+
+
+def test_journal_status_sees_other_processes(tmp_path):
+    worker = make_worker(tmp_path)
+    other_process = WorkoutLogJournal(str(tmp_path / "journal"))
+    other_process.append("other", "log_other_1", request("other"))
+    assert worker.status("log_other_1") is None
+    assert worker.journal_status("log_other_1") == "pending"
+    assert worker.journal_status("log_missing_1") is None
+    other_process.close(remove=True)
+
+
+def test_replays_skip_dead_lettered_logs(tmp_path):
+    worker = make_worker(tmp_path)
+    worker._journal = WorkoutLogJournal(str(tmp_path / "journal"))
+    # The same poison log in two orphaned segments, like a kept segment replayed twice
+    for _ in range(2):
+        other_process = WorkoutLogJournal(str(tmp_path / "journal"))
+        other_process.append("poison", "log_poison_1", request("poison"))
+        other_process.append("ok", "log_ok_1", request("ok"))
+        other_process.close()
+        worker.recover()
+    worker._journal.close(remove=True)
+
+    assert worker.saved_ids() == {"log_ok_1"}
+    assert worker.journal_status("log_poison_1") == "failed"
+    with open(tmp_path / "journal" / DEAD_LETTER_FILE) as f:
+        assert len(f.readlines()) == 1
+    assert not glob.glob(str(tmp_path / "journal" / SEGMENT_GLOB))